@@ -0,0 +1,195 @@
+"""
+Completion latency benchmark against a live Ollama server
+
+Compares the LangChain chain (prompt | OllamaLLM | parser), the native
+/api/generate client with the instruction template, and the native client
+with each FIM format on the same prompts. Reports p50/p95 latency, time to
+first token, prompt/output tokens and tokens/sec. Appending "+stop" to a
+variant adds structural stop sequences and early stream termination; gen_tok
+(tokens the model generated) vs kept_tok (tokens left after the block-end
+trim) shows how much generation the stop saves.
+
+Usage (from backend/):
+    python -m benchmarks.bench_completion --model qwen2.5-coder:1.5b --runs 20
+    python -m benchmarks.bench_completion --variants native fim:qwen fim:ollama_suffix
+    python -m benchmarks.bench_completion --max-tokens 256 --variants fim fim+stop native native+stop
+"""
+import argparse
+import asyncio
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+
+from src.agents.code_completion_agent import CodeCompletionAgent
+from src.llm.context_sizing import completion_budget_kind, count_tokens
+from src.llm.early_stop import StructuralStop
+from src.llm.fim_templates import FIM_FORMATS, get_fim_format
+from src.llm.generation import collect_stream
+from src.llm.metrics import percentile
+from src.llm.ollama_client import ollama_client
+
+SAMPLES = [
+    {
+        "language": "python",
+        "prefix": "def fibonacci(n):\n    ",
+        "suffix": "\n\nprint(fibonacci(10))\n",
+    },
+    {
+        "language": "typescript",
+        "prefix": "export function debounce<T extends (...args: any[]) => void>(fn: T, ms: number) {\n  ",
+        "suffix": "\n}\n",
+    },
+    {
+        "language": "python",
+        "prefix": "class Stack:\n    def __init__(self):\n        self.items = []\n\n    def push(self, item):\n        ",
+        "suffix": "\n\n    def pop(self):\n        return self.items.pop()\n",
+    },
+]
+
+
+def prompt_vars(sample: dict) -> dict:
+    return {
+        "language": sample["language"],
+        "prefix": sample["prefix"],
+        "suffix": sample["suffix"],
+    }
+
+
+def structural_stop(sample: dict, raw: bool) -> StructuralStop:
+    kind = completion_budget_kind(sample["prefix"], sample["suffix"])
+    return StructuralStop(sample["prefix"], sample["suffix"], sample["language"], kind, raw=raw)
+
+
+def token_counts(text: str, structure=None) -> dict:
+    """Tokens generated and tokens kept after the block-end trim"""
+    kept = structure.trim(text) if structure else text
+    return {"gen_tokens": count_tokens(text), "kept_tokens": count_tokens(kept)}
+
+
+async def run_langchain(agent: CodeCompletionAgent, llm, sample: dict, early_stop: bool = False) -> dict:
+    structure = structural_stop(sample, raw=False) if early_stop else None
+    stops = structure.stop_sequences() if structure else []
+    chain = agent.prompt_template | (llm.bind(stop=stops) if stops else llm) | StrOutputParser()
+    if structure:
+        chain = structure.wrap(chain)
+    start_time = time.time()
+    output = await collect_stream(chain, prompt_vars(sample))
+    return {
+        "latency_ms": (time.time() - start_time) * 1000,
+        "ttft_ms": output.ttft_ms,
+        **token_counts(output.text, structure),
+    }
+
+
+async def run_native(agent: CodeCompletionAgent, llm, sample: dict, fim=None, early_stop: bool = False) -> dict:
+    options = {"temperature": llm.temperature, "num_predict": llm.num_predict, "num_ctx": llm.num_ctx}
+    structure = structural_stop(sample, raw=fim is not None) if early_stop else None
+    stops = (list(fim.stop) if fim else []) + (structure.stop_sequences() if structure else [])
+    if stops:
+        options["stop"] = stops
+    if fim:
+        stream = ollama_client.native(
+            model=llm.model,
+            options=options,
+            prepare=lambda variables: fim.render(variables["prefix"], variables["suffix"]),
+            **fim.request_fields(sample["prefix"], sample["suffix"]),
+        )
+    else:
+        stream = ollama_client.native(
+            model=llm.model,
+            options=options,
+            prepare=lambda variables: agent.prompt_template.format(**variables),
+        )
+    start_time = time.time()
+    output = await collect_stream(structure.wrap(stream) if structure else stream, prompt_vars(sample))
+    return {
+        "latency_ms": (time.time() - start_time) * 1000,
+        "ttft_ms": output.ttft_ms,
+        # Ollama's stats only arrive on a stream that ran to the end
+        "prompt_tokens": stream.stats.prompt_tokens,
+        "prompt_eval_ms": stream.stats.prompt_eval_ms,
+        "tokens_per_sec": stream.stats.tokens_per_sec,
+        **token_counts(output.text, structure),
+    }
+
+
+def make_variant(name: str, model: str):
+    """Variant name -> coroutine; "fim" uses the model's registered format, "+stop" stops early"""
+    if name.endswith("+stop"):
+        variant = make_variant(name[:-len("+stop")], model)
+        return lambda agent, llm, sample: variant(agent, llm, sample, early_stop=True)
+    if name == "langchain":
+        return run_langchain
+    if name == "native":
+        return run_native
+    if name.startswith("fim"):
+        format_name = name.partition(":")[2]
+        fim = FIM_FORMATS[format_name] if format_name else get_fim_format("ollama", model)
+        if fim is None:
+            raise SystemExit(f"No FIM format registered for {model}; use fim:<format>")
+        return lambda agent, llm, sample, early_stop=False: run_native(
+            agent, llm, sample, fim=fim, early_stop=early_stop
+        )
+    raise SystemExit(f"Unknown variant: {name}")
+
+
+def p50(results: list[dict], key: str):
+    values = [r[key] for r in results if r.get(key) is not None]
+    return percentile(values, 50) if values else "-"
+
+
+def mean(results: list[dict], key: str):
+    values = [r[key] for r in results if r.get(key) is not None]
+    return round(sum(values) / len(values), 1) if values else "-"
+
+
+def summarize(name: str, results: list[dict]):
+    latencies = [r["latency_ms"] for r in results]
+    ttfts = [r["ttft_ms"] for r in results if r["ttft_ms"] is not None]
+    print(
+        f"{name:<22} runs={len(results):<4} "
+        f"p50={percentile(latencies, 50)}ms p95={percentile(latencies, 95)}ms "
+        f"ttft_p50={percentile(ttfts, 50)}ms ttft_p95={percentile(ttfts, 95)}ms "
+        f"prompt_tok={p50(results, 'prompt_tokens')} prompt_eval={p50(results, 'prompt_eval_ms')}ms "
+        f"gen_tok={mean(results, 'gen_tokens')} kept_tok={mean(results, 'kept_tokens')} "
+        f"tok/s={p50(results, 'tokens_per_sec')}"
+    )
+
+
+async def main(args):
+    await ollama_client.start()
+    await ollama_client.verify_connection()
+    agent = CodeCompletionAgent()
+    llm = ollama_client.get_llm(model=args.model, temperature=0.2, num_predict=args.max_tokens)
+
+    # Load the model once so no variant pays the cold start
+    await ollama_client.warm_model(llm.model)
+
+    variants = {name: make_variant(name, llm.model) for name in args.variants}
+    results: dict[str, list[dict]] = {name: [] for name in variants}
+
+    # Interleave variants so drift (thermal, other load) hits all of them equally
+    for run in range(args.runs):
+        sample = SAMPLES[run % len(SAMPLES)]
+        for name, variant in variants.items():
+            results[name].append(await variant(agent, llm, sample))
+
+    print(f"model={llm.model} max_tokens={args.max_tokens}")
+    for name, variant_results in results.items():
+        summarize(name, variant_results)
+
+    await ollama_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Completion latency by client and prompt format")
+    parser.add_argument("--model", default=None, help="Ollama model (default: OLLAMA_DEFAULT_MODEL)")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument(
+        "--variants",
+        nargs="+",
+        default=["langchain", "native", "fim"],
+        help="langchain, native, fim (model's format) or fim:<format>; append +stop for early stop",
+    )
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,144 @@
+"""
+Offline load test of the FastAPI stack against the mock provider
+
+Runs the app in-process (no network, no Ollama, no API keys) with
+DEFAULT_PROVIDER=mock and fires concurrent requests at an endpoint.
+With --zero-model-time the mock answers instantly, so the reported
+latency is pure framework overhead (routing, chain, graph, caches).
+
+Usage (from backend/):
+    python -m benchmarks.bench_server --endpoint complete --requests 500 --concurrency 20
+    python -m benchmarks.bench_server --endpoint agent --zero-model-time
+    python -m benchmarks.bench_server --endpoint complete --cache
+    python -m benchmarks.bench_server --endpoint complete-stream  # also reports time to first text
+
+Every request sends the same payload, so the response cache is off
+unless --cache is given (then all but the first request are hits).
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+PAYLOADS = {
+    "complete": (
+        "/api/v1/complete",
+        {
+            "prefix": "def add(a, b):\n    ",
+            "suffix": "\n",
+            "language": "python",
+            "filepath": "bench.py",
+            "cursor_line": 1,
+            "cursor_column": 4,
+        },
+    ),
+    "complete-stream": (
+        "/api/v1/complete/stream?format=ndjson",
+        {
+            "prefix": "def add(a, b):\n    ",
+            "suffix": "\n",
+            "language": "python",
+            "filepath": "bench.py",
+            "cursor_line": 1,
+            "cursor_column": 4,
+        },
+    ),
+    "chat": (
+        "/api/v1/chat/mock",
+        {"messages": [{"role": "user", "content": "What does a list comprehension do?"}]},
+    ),
+    "agent": (
+        "/api/v1/agent/process",
+        {"query": "Explain this function", "code": "def add(a, b):\n    return a + b\n", "file": "bench.py"},
+    ),
+    "explain": (
+        "/api/v1/agent/explain",
+        {"code": "def add(a, b):\n    return a + b\n", "language": "python"},
+    ),
+}
+
+
+def configure_mock(args):
+    """Must run before src is imported: settings are read at import time"""
+    os.environ["DEFAULT_PROVIDER"] = "mock"
+    os.environ["OLLAMA_WARMUP_ON_STARTUP"] = "false"
+    os.environ["MOCK_TTFT_MS"] = "0" if args.zero_model_time else str(args.ttft_ms)
+    os.environ["MOCK_TOKENS_PER_SEC"] = "0" if args.zero_model_time else str(args.tokens_per_sec)
+    os.environ["MOCK_JITTER"] = "0" if args.zero_model_time else str(args.jitter)
+    os.environ["MOCK_ERROR_RATE"] = str(args.error_rate)
+    os.environ["ENABLE_CACHE"] = "true" if args.cache else "false"
+
+
+async def main(args):
+    configure_mock(args)
+
+    import httpx
+    from src.llm.metrics import percentile
+    from src.main import app
+
+    path, payload = PAYLOADS[args.endpoint]
+    latencies: list[float] = []
+    first_frames: list[float] = []  # Streaming endpoints: time to first visible text
+    statuses: dict[int, int] = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await app.router.startup()
+
+        async def one():
+            async with semaphore:
+                start_time = time.perf_counter()
+                if "/stream" in path:
+                    first_frame = None
+                    async with client.stream("POST", path, json=payload, timeout=None) as response:
+                        async for line in response.aiter_lines():
+                            if first_frame is None and '"delta"' in line:
+                                first_frame = (time.perf_counter() - start_time) * 1000
+                    if first_frame is not None:
+                        first_frames.append(first_frame)
+                else:
+                    response = await client.post(path, json=payload, timeout=None)
+                latencies.append((time.perf_counter() - start_time) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        wall_s = time.perf_counter() - wall_start
+
+        metrics = (await client.get("/api/v1/metrics")).json()
+        await app.router.shutdown()
+
+    model_time = "0 (framework overhead only)" if args.zero_model_time else (
+        f"ttft={args.ttft_ms}ms, {args.tokens_per_sec} tok/s, jitter={args.jitter}"
+    )
+    print(f"endpoint={path} requests={args.requests} concurrency={args.concurrency}")
+    print(f"mock model time: {model_time}, cache={'on' if args.cache else 'off'}")
+    print(
+        f"throughput={args.requests / wall_s:.1f} req/s "
+        f"p50={percentile(latencies, 50):.1f}ms p95={percentile(latencies, 95):.1f}ms "
+        f"p99={percentile(latencies, 99):.1f}ms max={max(latencies):.1f}ms"
+    )
+    if first_frames:
+        print(
+            f"first visible text: p50={percentile(first_frames, 50):.1f}ms "
+            f"p95={percentile(first_frames, 95):.1f}ms"
+        )
+    print(f"status codes: {statuses}")
+    if args.show_metrics:
+        print(metrics)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline FastAPI load test with the mock provider")
+    parser.add_argument("--endpoint", choices=sorted(PAYLOADS), default="complete")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--ttft-ms", type=float, default=50)
+    parser.add_argument("--tokens-per-sec", type=float, default=50)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--zero-model-time", action="store_true", help="Mock answers instantly")
+    parser.add_argument("--cache", action="store_true", help="Serve repeats from the response cache")
+    parser.add_argument("--show-metrics", action="store_true", help="Print /api/v1/metrics afterwards")
+    asyncio.run(main(parser.parse_args()))
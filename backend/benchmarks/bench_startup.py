@@ -0,0 +1,66 @@
+"""
+Cold-start cost of the backend: import time, slowest imports and RSS
+
+Imports src.main in a fresh interpreter with -X importtime and reports the
+total import time, the modules with the highest cumulative import time and
+which heavy SDKs were loaded eagerly.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --runs 5 --top 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = (
+    "import json, time; t = time.perf_counter(); import src.main; "
+    "from src.utils.startup import startup_report; "
+    "report = startup_report.to_dict(); "
+    "report['import_ms'] = round((time.perf_counter() - t) * 1000, 1); "
+    "print(json.dumps(report))"
+)
+
+
+def run_once(env: dict) -> tuple[dict, list[tuple[int, str]]]:
+    """One cold import; returns the startup report and (cumulative us, module) pairs"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        capture_output=True, text=True, env=env, check=True
+    )
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    imports = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        imports.append((int(cumulative), module.rstrip()))
+    return report, imports
+
+
+def main(args):
+    env = {**os.environ, "DEFAULT_PROVIDER": args.provider}
+    import_ms = []
+    report, imports = {}, []
+    for _ in range(args.runs):
+        report, imports = run_once(env)
+        import_ms.append(report["import_ms"])
+
+    print(f"import src.main: median {statistics.median(import_ms):.0f}ms "
+          f"(min {min(import_ms):.0f}ms, {args.runs} runs)")
+    print(f"RSS after import: {report['rss_mb']} MB")
+    print(f"Heavy modules loaded eagerly: {report['heavy_modules_loaded'] or 'none'}")
+    print(f"\nTop {args.top} imports by cumulative time (last run):")
+    top_level = [(us, mod) for us, mod in imports if not mod.startswith("  ")]
+    for us, module in sorted(top_level, reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f}ms  {module.strip()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--provider", default="ollama", help="DEFAULT_PROVIDER for the import")
+    main(parser.parse_args())
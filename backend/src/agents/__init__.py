@@ -1,27 +1,56 @@
-from .debug_agent import debug_agent
-from .documentation_agent import documentation_agent
-from .explain_agent import explain_agent
-from .refactor_agent import refactor_agent
-from .supervisor import supervisor
-from .code_completion_agent import completion_agent  # Your existing agent
-
-# Agent registry for easy access
-AGENT_REGISTRY = {
-    "debug": debug_agent,
-    "documentation": documentation_agent,
-    "explain": explain_agent,
-    "refactor": refactor_agent,
-    "completion": completion_agent,
-    "supervisor": supervisor
+import importlib
+
+# Agents are imported on first access so that importing one agent (e.g. the
+# completion agent on the hot path) does not load all of them, LangGraph and
+# tree-sitter at startup
+_AGENT_MODULES = {
+    "debug_agent": ".debug_agent",
+    "documentation_agent": ".documentation_agent",
+    "explain_agent": ".explain_agent",
+    "refactor_agent": ".refactor_agent",
+    "supervisor": ".supervisor",
+    "completion_agent": ".code_completion_agent"
+}
+
+# Registry name -> agent attribute
+_REGISTRY_NAMES = {
+    "debug": "debug_agent",
+    "documentation": "documentation_agent",
+    "explain": "explain_agent",
+    "refactor": "refactor_agent",
+    "completion": "completion_agent",
+    "supervisor": "supervisor"
 }
 
+
+def _load(name: str):
+    """Import the module defining an agent and return the agent"""
+    # Resolved through the module, not the package namespace: importing
+    # src.agents.debug_agent binds the submodule to the same name
+    module = importlib.import_module(_AGENT_MODULES[name], __name__)
+    return getattr(module, name)
+
+
+def __getattr__(name: str):
+    if name in _AGENT_MODULES:
+        agent = _load(name)
+        globals()[name] = agent
+        return agent
+    if name == "AGENT_REGISTRY":
+        registry = {key: _load(attr) for key, attr in _REGISTRY_NAMES.items()}
+        globals()[name] = registry
+        return registry
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_agent(agent_name: str):
     """Get agent by name"""
-    return AGENT_REGISTRY.get(agent_name)
+    attr = _REGISTRY_NAMES.get(agent_name)
+    return _load(attr) if attr else None
 
 __all__ = [
     "debug_agent",
-    "documentation_agent", 
+    "documentation_agent",
     "explain_agent",
     "refactor_agent",
     "completion_agent",
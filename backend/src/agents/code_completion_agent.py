@@ -1,15 +1,36 @@
-from typing import Optional
+from typing import AsyncIterator, Callable, Optional
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+import asyncio
+import contextvars
+import itertools
 import logging
 import time
-from ..config import settings
+import uuid
+from ..config import settings, PROVIDER_MODELS
 
-from ..llm.llm_manager import llm_manager, ProviderType
+from ..llm.llm_manager import ProviderType
+from ..llm.provider_chain import ChainResult, TaskKind, TierType, provider_chain
+from ..llm.completion_cache import completion_cache_key
+from ..llm.completion_upgrades import completion_upgrades
+from ..llm.context_sizing import BudgetKind, completion_budget_kind, size_request
+from ..llm.early_stop import StructuralStop, early_stop_stats
+from ..llm.fim_templates import FIMFormat, get_fim_format
+from ..llm.generation import ChunkTap, IncrementalText, collect_stream
+from ..llm.ollama_client import ollama_client
+from ..llm.prompt_sessions import prompt_sessions
+from ..llm.shared_cache import shared_cache
+from ..llm.singleflight import flight_key, singleflight
+from ..llm.typeahead import typeahead_index
 from ..models.schemas import CompletionRequest, CompletionResponse
+from ..utils.cancellation import document_requests
+from ..utils.deadline import deadline_scope
 
 logger = logging.getLogger(__name__)
 
+# CompletionResponse fields that describe the text (the rest is per request)
+CACHED_FIELDS = {"completion", "confidence", "model_used", "latency_ms"}
+
 class CodeCompletionAgent:
     def _build_enhanced_prompt(
         self,
@@ -94,6 +115,103 @@ YOUR COMPLETION (code only, no formatting):"""
             template=template
         )
 
+    def _build_runnable(
+        self,
+        llm,
+        prompt_vars: dict,
+        finished: Optional[dict] = None,
+        kind: Optional[BudgetKind] = None
+    ):
+        """
+        Streamable runnable taking the template variables
+        
+        Ollama code models with a registered FIM format get their native
+        fill-in-the-middle prompt over /api/generate. With
+        USE_NATIVE_OLLAMA_CLIENT, other Ollama models also skip LangChain but
+        keep the instruction template. Everything else uses the
+        prompt | llm | parser chain. With a completion kind, generation gets
+        structural stop sequences and ends as soon as the line or block is
+        complete.
+        
+        Args:
+            llm: LLM chosen by the provider chain
+            prompt_vars: language, prefix, suffix
+            finished: Receives {model: (prompt, stats)} when a native call completes
+            kind: "line" or "block" to stop early, None to generate up to max_tokens
+        """
+        fim = self._fim_for(llm)
+        structure = self._structural_stop(prompt_vars, kind, raw=fim is not None) if kind else None
+        stops = structure.stop_sequences() if structure and settings.ENABLE_EARLY_STOP else []
+        
+        if getattr(llm, "_llm_type", None) == "ollama-llm":
+            options = {
+                "temperature": llm.temperature,
+                "num_predict": llm.num_predict,
+                "num_ctx": llm.num_ctx
+            }
+            if fim:
+                prompt = fim.render(prompt_vars["prefix"], prompt_vars["suffix"])
+                extra = fim.request_fields(prompt_vars["prefix"], prompt_vars["suffix"])
+                if fim.stop or stops:
+                    options["stop"] = list(fim.stop) + stops
+            elif settings.USE_NATIVE_OLLAMA_CLIENT:
+                prompt = self.prompt_template.format(**prompt_vars)
+                extra = {}
+                if stops:
+                    options["stop"] = stops
+            else:
+                return self._chain(llm, stops, structure)
+            
+            def on_done(stream):
+                if finished is not None:
+                    finished[llm.model] = (prompt, stream.stats)
+            
+            runnable = ollama_client.native(
+                model=llm.model,
+                options=options,
+                prepare=lambda _: prompt,
+                on_done=on_done,
+                **extra
+            )
+            return structure.wrap(runnable) if structure else runnable
+        return self._chain(llm, stops, structure)
+    
+    @staticmethod
+    def _document_key(request: CompletionRequest) -> Optional[str]:
+        """Key for per-document state (prompt session, type-ahead, upgrades)"""
+        return request.document_key or request.filepath or None
+    
+    @staticmethod
+    def _fim_for(llm) -> Optional[FIMFormat]:
+        """FIM format the runnable for llm will use (None = instruction prompt)"""
+        if getattr(llm, "_llm_type", None) == "ollama-llm":
+            return get_fim_format("ollama", llm.model)
+        return None
+    
+    def _chain(self, llm, stops: list[str], structure: Optional[StructuralStop]):
+        """prompt | llm | parser, with stop sequences and early stop if given"""
+        chain = self.prompt_template | (llm.bind(stop=stops) if stops else llm) | self.output_parser
+        return structure.wrap(chain) if structure else chain
+    
+    def _structural_stop(self, prompt_vars: dict, kind: BudgetKind, raw: bool) -> StructuralStop:
+        return StructuralStop(
+            prompt_vars["prefix"],
+            prompt_vars["suffix"],
+            prompt_vars["language"],
+            kind,
+            raw=raw
+        )
+
+    def _clean_fim_completion(self, text: str, fim: FIMFormat) -> str:
+        """
+        Clean FIM output
+        
+        FIM models continue exactly at the cursor, so indentation is kept
+        as generated; only leaked special tokens and trailing blank space
+        are removed.
+        """
+        return fim.clean(text).rstrip()
+
     def _clean_completion(self, text: str, prefix: str) -> str:
         """
         Clean up LLM output and preserve indentation
@@ -188,7 +306,8 @@ YOUR COMPLETION (code only, no formatting):"""
         self,
         request: CompletionRequest,
         provider: Optional[ProviderType] = None,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        on_text: Optional[Callable[[int, str], None]] = None
     ) -> CompletionResponse:
         """
         Generate code completion
@@ -197,6 +316,9 @@ YOUR COMPLETION (code only, no formatting):"""
             request: Completion request with code context
             provider: Override default provider
             model: Override default model
+            on_text: Called with (attempt, text) as cleaned text becomes
+                stable during generation; attempt changes when a fallback
+                hop restarts the generation. Disables hedging.
             
         Returns:
             CompletionResponse with generated code
@@ -224,9 +346,61 @@ YOUR COMPLETION (code only, no formatting):"""
             ext = '.' + request.filepath.split('.')[-1] if '.' in request.filepath else ''
             language = ext_to_lang.get(ext, 'python')
         
-        # Select provider and model
+        # Re-triggered completions at the same spot are served from the
+        # cache (L1 in-process, L2 shared with the other replicas)
+        cache_key = None
+        if settings.ENABLE_CACHE:
+            cache_key = completion_cache_key(
+                language,
+                provider or self.provider,
+                model or self.model,
+                request.prefix,
+                request.suffix
+            )
+            if request.bypass_cache:
+                shared_cache.bypass("completion")
+            else:
+                cached = await shared_cache.get("completion", cache_key)
+                if cached is not None:
+                    logger.debug(f"⚡ Completion cache hit ({(time.time() - start_time) * 1e6:.0f}µs)")
+                    return CompletionResponse(**{
+                        **cached,
+                        "latency_ms": int((time.time() - start_time) * 1000),
+                        "cached": True,
+                        "request_id": request.request_id
+                    })
+        
+        # Typing through the suggestion on screen: the rest of it is the answer
+        session_key = self._document_key(request)
+        if not request.bypass_cache:
+            hit = typeahead_index.lookup(
+                session_key,
+                request.prefix,
+                request.suffix,
+                provider or self.provider,
+                model or self.model
+            )
+            if hit is not None:
+                logger.debug(f"⚡ Type-ahead reuse after {hit.typed_chars} typed chars")
+                return CompletionResponse(
+                    completion=hit.completion,
+                    confidence=hit.confidence,
+                    model_used=hit.model_used,
+                    latency_ms=int((time.time() - start_time) * 1000),
+                    request_id=request.request_id,
+                    cached=True
+                )
+        
+        # Select provider and model; without an override, stay on the
+        # local model that served this document last so its KV cache is
+        # warm, unless it no longer fits the latency budget
+        latency_budget_ms = settings.LATENCY_BUDGETS_MS.get("completion")
         selected_provider = provider or self.provider
         selected_model = model or self.model
+        if selected_provider is None and selected_model is None:
+            affinity = prompt_sessions.affinity(session_key, latency_budget_ms)
+            if affinity:
+                selected_provider, selected_model = affinity
         
         logger.info(
             f"Generating completion: provider={selected_provider}, "
@@ -234,61 +408,373 @@ YOUR COMPLETION (code only, no formatting):"""
         )
         
         try:
-            # Get LLM instance
-            llm = llm_manager.get_llm(
+            # Stable parts first: keep the prompt start byte-identical to the
+            # previous request for this document
+            prefix = prompt_sessions.anchor_prefix(session_key, request.prefix)
+            cleaned_completion, result, fim = await self._generate(
+                request,
+                language,
+                prefix,
                 provider=selected_provider,
                 model=selected_model,
-                temperature=0.1,  # Low temperature for code
-                max_tokens=512
+                task="completion",
+                tier="fast",
+                latency_budget_ms=latency_budget_ms,
+                session_key=session_key,
+                on_text=on_text
             )
             
-            # Build chain: Prompt -> LLM -> Parser
-            chain = self.prompt_template | llm | self.output_parser
-            
-            # Generate completion
-            raw_completion = await chain.ainvoke({
-                "language": language,
-                "prefix": request.prefix,
-                "suffix": request.suffix
-            })
-            
-            # Clean up output
-            cleaned_completion = self._clean_completion(raw_completion, request.prefix)
-            
             # Calculate metrics
             latency_ms = int((time.time() - start_time) * 1000)
             confidence = self._calculate_confidence(cleaned_completion, request)
             
-            # Determine which model was actually used
-            model_used = selected_model or llm_manager.get_model_for_tier(
-                "fast", 
-                selected_provider
-            )
-            
             logger.info(
                 f"Completion generated: {len(cleaned_completion)} chars, "
-                f"{latency_ms}ms, confidence={confidence:.2f}"
+                f"{latency_ms}ms, confidence={confidence:.2f}, hop={result.hop}, "
+                f"prompt={fim.name if fim else 'instruction'}"
+                + (" (truncated)" if result.output.truncated else "")
             )
             
-            return CompletionResponse(
+            response = CompletionResponse(
                 completion=cleaned_completion,
                 confidence=confidence,
-                model_used=f"{selected_provider}:{model_used}",
-                latency_ms=latency_ms
+                model_used=f"{result.provider}:{result.model}",
+                latency_ms=latency_ms,
+                truncated=result.output.truncated
             )
+            self._cache_response(cache_key, response)
+            if not response.truncated:
+                typeahead_index.record(
+                    session_key,
+                    request.prefix,
+                    request.suffix,
+                    cleaned_completion,
+                    provider or self.provider,
+                    model or self.model,
+                    response.model_used,
+                    confidence
+                )
+            
+            request_id, upgrade_pending = self._start_upgrade(
+                request,
+                language,
+                prefix,
+                provider=selected_provider,
+                pinned_model=model or self.model,
+                draft=cleaned_completion,
+                draft_result=result,
+                cache_key=cache_key
+            )
+            response.request_id = request_id
+            response.upgrade_pending = upgrade_pending
+            return response
         
         except Exception as e:
             logger.error(f"Completion failed: {e}", exc_info=True)
+            raise
+    
+    async def stream(
+        self,
+        request: CompletionRequest,
+        provider: Optional[ProviderType] = None,
+        model: Optional[str] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Generate a completion as a stream of frames
+        
+        Text is cleaned and trimmed incrementally with the same logic as
+        complete(), so deltas only carry text the final completion keeps.
+        Closing the stream (client disconnect) cancels the generation, and
+        so does a newer request with the same document_key
+        (RequestSupersededError).
+        
+        Yields:
+            {"type": "delta", "text"} as stable text arrives
+            {"type": "reset"} when a fallback hop restarts the generation
+                (discard the deltas so far)
+            {"type": "done", **CompletionResponse, "ttft_ms"}; its
+                completion is authoritative
+        """
+        start_time = time.time()
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(
+            document_requests.run(
+                request.document_key,
+                self.complete(
+                    request,
+                    provider=provider,
+                    model=model,
+                    on_text=lambda attempt, text: queue.put_nowait((attempt, text))
+                )
+            )
+        )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        current_attempt = None
+        ttft_ms = None
+        try:
+            while (item := await queue.get()) is not None:
+                attempt, text = item
+                if current_attempt is not None and attempt != current_attempt:
+                    yield {"type": "reset"}
+                current_attempt = attempt
+                if ttft_ms is None:
+                    ttft_ms = int((time.time() - start_time) * 1000)
+                yield {"type": "delta", "text": text}
             
-            # If cloud fails and fallback enabled, try local
-            if (selected_provider != "ollama" and 
-                hasattr(settings, 'ENABLE_CLOUD_FALLBACK') and 
-                settings.ENABLE_CLOUD_FALLBACK):
-                
-                logger.info("Falling back to local Ollama...")
-                return await self.complete(request, provider="ollama")
+            response = await task
+            if current_attempt is None and response.completion:
+                # Served without generating (cache, type-ahead)
+                ttft_ms = int((time.time() - start_time) * 1000)
+                yield {"type": "delta", "text": response.completion}
+            yield {"type": "done", **response.model_dump(), "ttft_ms": ttft_ms}
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    def _cache_response(self, cache_key: Optional[str], response: CompletionResponse):
+        """Cache a complete, non-empty completion (its text, not the request bookkeeping)"""
+        if cache_key is None or response.truncated or not response.completion:
+            return
+        shared_cache.set("completion", cache_key, response.model_dump(include=CACHED_FIELDS))
+    
+    async def _generate(
+        self,
+        request: CompletionRequest,
+        language: str,
+        prefix: str,
+        provider: Optional[ProviderType],
+        model: Optional[str],
+        task: TaskKind,
+        tier: TierType,
+        latency_budget_ms: Optional[float],
+        session_key: Optional[str] = None,
+        on_text: Optional[Callable[[int, str], None]] = None
+    ) -> tuple[str, ChainResult, Optional[FIMFormat]]:
+        """
+        Run one completion through the provider chain and clean it
+        
+        Args:
+            request: Completion request
+            language: Detected language
+            prefix: Prefix to send (anchored)
+            provider: Provider override
+            model: Model override
+            task: Provider-chain task kind (SLO)
+            tier: Tier used without a model override or measured estimates
+            latency_budget_ms: Budget for tier selection, None to use tier as is
+            session_key: Document key to record the prompt session under (None to skip)
+            on_text: Receives (attempt, text) as cleaned text becomes stable
+            
+        Returns:
+            (cleaned completion, chain result, FIM format used or None)
+        """
+        # Prompt -> LLM -> Parser, run through the provider chain
+        prompt_vars = {
+            "language": language,
+            "prefix": prefix,
+            "suffix": request.suffix
+        }
+        finished: dict = {}
+        kind = completion_budget_kind(request.prefix, request.suffix)
+        attempts = itertools.count()
+        
+        def build(llm, acquire):
+            # Identical concurrent requests (several windows, reloads)
+            # share one generation, and only its leader takes a provider slot
+            runnable = singleflight.wrap(
+                self._build_runnable(llm, prompt_vars, finished, kind),
+                flight_key(llm, prompt_vars, task="completion"),
+                acquire=acquire
+            )
+            if on_text is None:
+                return runnable
+            attempt = next(attempts)
+            view = self._incremental_view(request, prompt_vars, kind, self._fim_for(llm))
             
+            def tap(text: str):
+                delta = view.feed(text)
+                if delta:
+                    on_text(attempt, delta)
+            return ChunkTap(runnable, tap)
+        
+        # num_ctx bucket from the measured prompt; output budget by whether
+        # this looks like a single-line or block completion. FIM models are
+        # sent the (much shorter) FIM prompt, so they are sized from that.
+        instruction_size = size_request(self.prompt_template.format(**prompt_vars), kind)
+        fim_sizes: dict[str, dict] = {}
+        
+        def size_hop(hop_provider: str, hop_model: str) -> dict:
+            fim = get_fim_format(hop_provider, hop_model)
+            if fim is None:
+                return instruction_size
+            if fim.name not in fim_sizes:
+                prompt = fim.render(prompt_vars["prefix"], prompt_vars["suffix"])
+                if fim.use_ollama_suffix:
+                    prompt += prompt_vars["suffix"]  # Ollama's template adds it
+                fim_sizes[fim.name] = size_request(prompt, kind)
+            return fim_sizes[fim.name]
+        
+        llm_kwargs = {
+            "task": task,
+            "provider": provider,
+            "model": model,
+            "tier": tier,
+            "latency_budget_ms": latency_budget_ms,
+            "temperature": 0.1,  # Low temperature for code
+            "size_hop": size_hop,
+            "coalesced": True,
+            **instruction_size
+        }
+        # A stream can only show one generation, so it is never hedged
+        if settings.ENABLE_HEDGING and task == "completion" and on_text is None:
+            result = await provider_chain.run_hedged(
+                build,
+                prompt_vars,
+                **llm_kwargs
+            )
+        else:
+            result = await provider_chain.run(
+                lambda llm, acquire: collect_stream(build(llm, acquire), prompt_vars),
+                **llm_kwargs
+            )
+        generated = result.output.text
+        
+        if session_key:
+            prompt_sessions.record(session_key, result.provider, result.model, prefix)
+            if result.model in finished:
+                prompt_sessions.record_native(session_key, *finished[result.model])
+        
+        # Clean up output; the last streamed chunk may run past the block end
+        fim = get_fim_format(result.provider, result.model)
+        raw_completion = generated
+        if settings.ENABLE_EARLY_STOP:
+            raw_completion = self._structural_stop(prompt_vars, kind, raw=fim is not None).trim(generated)
+        early_stop_stats.record(generated, raw_completion)
+        return self._clean_output(raw_completion, fim, request.prefix), result, fim
+    
+    def _clean_output(self, text: str, fim: Optional[FIMFormat], prefix: str) -> str:
+        if fim:
+            return self._clean_fim_completion(text, fim)
+        return self._clean_completion(text, prefix)
+    
+    def _incremental_view(
+        self,
+        request: CompletionRequest,
+        prompt_vars: dict,
+        kind: BudgetKind,
+        fim: Optional[FIMFormat]
+    ) -> IncrementalText:
+        """Streamed raw text -> stable cleaned text, as the final cleanup would produce it"""
+        structure = self._structural_stop(prompt_vars, kind, raw=fim is not None)
+        
+        def clean(raw: str) -> str:
+            if settings.ENABLE_EARLY_STOP:
+                raw = structure.trim(raw)
+            return self._clean_output(raw, fim, request.prefix)
+        
+        if fim:
+            return IncrementalText(clean, markers=fim.special_tokens + fim.stop)
+        # Instruction answers may open with a preamble or fence line
+        return IncrementalText(clean, markers=("```",), hold_first_line=True)
+    
+    def _start_upgrade(
+        self,
+        request: CompletionRequest,
+        language: str,
+        prefix: str,
+        provider: Optional[ProviderType],
+        pinned_model: Optional[str],
+        draft: str,
+        draft_result: ChainResult,
+        cache_key: Optional[str] = None
+    ) -> tuple[Optional[str], bool]:
+        """
+        Start the background quality upgrade of a progressive request
+        
+        Skipped when the request is not progressive, the model was pinned,
+        the draft already came from the upgrade tier, or
+        PROGRESSIVE_MAX_PENDING upgrades are running (at most one fewer than
+        the provider's concurrency, so drafts keep a slot).
+        
+        Returns:
+            (request id to fetch the upgrade with, whether an upgrade is pending)
+        """
+        progressive = request.progressive
+        if progressive is None:
+            progressive = settings.ENABLE_PROGRESSIVE_COMPLETION
+        if not progressive:
+            return request.request_id, False
+        
+        request_id = request.request_id or uuid.uuid4().hex
+        upgrade_tier = settings.PROGRESSIVE_UPGRADE_TIER
+        upgrade_model = PROVIDER_MODELS.get(draft_result.provider, {}).get(upgrade_tier)
+        if pinned_model or draft_result.model == upgrade_model:
+            return request_id, False
+        if not completion_upgrades.has_capacity(draft_result.provider):
+            logger.debug("Progressive upgrade skipped: too many pending")
+            return request_id, False
+        
+        slot = completion_upgrades.create(
+            request_id,
+            self._document_key(request),
+            draft,
+            f"{draft_result.provider}:{draft_result.model}"
+        )
+        # Fresh context: the upgrade must not inherit the draft's request deadline
+        slot.task = asyncio.create_task(
+            self._run_upgrade(request_id, request, language, prefix, provider, upgrade_tier, cache_key),
+            context=contextvars.Context()
+        )
+        return request_id, True
+    
+    async def _run_upgrade(
+        self,
+        request_id: str,
+        request: CompletionRequest,
+        language: str,
+        prefix: str,
+        provider: Optional[ProviderType],
+        tier: TierType,
+        cache_key: Optional[str] = None
+    ):
+        """
+        Generate the quality-tier completion and store it in the request's slot
+        
+        The upgrade also replaces the cached draft, so a re-triggered
+        completion at the same spot gets the better text.
+        """
+        try:
+            with deadline_scope(settings.PROGRESSIVE_UPGRADE_TIMEOUT_SECONDS):
+                completion, result, _ = await self._generate(
+                    request,
+                    language,
+                    prefix,
+                    provider=provider,
+                    model=None,
+                    task="completion_upgrade",
+                    tier=tier,
+                    latency_budget_ms=None
+                )
+            if result.output.truncated:
+                completion_upgrades.fail(request_id, "upgrade deadline expired")
+            else:
+                model_used = f"{result.provider}:{result.model}"
+                confidence = self._calculate_confidence(completion, request)
+                completion_upgrades.resolve(request_id, completion, model_used)
+                self._cache_response(cache_key, CompletionResponse(
+                    completion=completion,
+                    confidence=confidence,
+                    model_used=model_used,
+                    latency_ms=result.latency_ms
+                ))
+                typeahead_index.replace(
+                    self._document_key(request), request.prefix, request.suffix, completion, model_used, confidence
+                )
+        except asyncio.CancelledError:
             raise
+        except Exception as e:
+            logger.warning(f"⚠️ Progressive upgrade {request_id[:8]} failed: {e}")
+            completion_upgrades.fail(request_id, str(e))
 
 
 # Global agent instance
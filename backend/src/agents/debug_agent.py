@@ -1,8 +1,13 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from ..llm.llm_manager import llm_manager
+from ..config import settings
+from ..llm.provider_chain import provider_chain
+from ..llm.context_sizing import size_request
+from ..llm.generation import collect_stream
+from ..llm.singleflight import flight_key, singleflight
 from ..tools.ast_parser_tool import ast_parser
 from ..tools.file_context_tool import FileContextTool
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,7 +18,7 @@ class DebugAgent:
     Inspired by Cursor's error analysis capabilities
     """
     
-    def __init__(self, provider: str = "groq", model: str = "llama-3.3-70b-versatile"):
+    def __init__(self, provider: Optional[str] = None, model: Optional[str] = None):
         self.provider = provider
         self.model = model
         self.tools = {
@@ -103,19 +108,28 @@ Keep it brief and actionable. Focus on the root cause and exact fix."""
         
         user_input = "\n".join(context_parts)
         
-        # Get LLM
-        llm = llm_manager.get_llm(
-            provider=self.provider,
-            model=self.model,
-            temperature=0.2
-        )
-        
-        # Build chain
-        chain = self.prompt | llm | StrOutputParser()
-        
-        # Generate response
+        # Generate response (provider chain falls back on failure)
         try:
-            response = await chain.ainvoke({"user_input": user_input})
+            result = await provider_chain.run(
+                lambda llm, acquire: collect_stream(
+                    singleflight.wrap(
+                        self.prompt | llm | StrOutputParser(),
+                        flight_key(llm, user_input, task="debug"),
+                        acquire=acquire
+                    ),
+                    {"user_input": user_input}
+                ),
+                task="agent",
+                coalesced=True,
+                provider=self.provider,
+                model=self.model,
+                tier="balanced",
+                latency_budget_ms=settings.LATENCY_BUDGETS_MS.get("agent"),
+                temperature=0.2,
+                **size_request(self.prompt.format(user_input=user_input), "debug")
+            )
+            response = result.output.text
+            state["truncated"] = result.output.truncated
             
             state["response"] = response
             state["confidence"] = 0.9
@@ -1,7 +1,12 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from ..llm.llm_manager import llm_manager
+from ..config import settings
+from ..llm.provider_chain import provider_chain
+from ..llm.context_sizing import size_request
+from ..llm.generation import collect_stream
+from ..llm.singleflight import flight_key, singleflight
 from ..tools.ast_parser_tool import ast_parser
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,7 +17,7 @@ class DocumentationAgent:
     Creates docstrings, README sections, and code explanations
     """
     
-    def __init__(self, provider: str = "groq", model: str = "llama-3.3-70b-versatile"):
+    def __init__(self, provider: Optional[str] = None, model: Optional[str] = None):
         self.provider = provider
         self.model = model
         
@@ -110,19 +115,28 @@ Do NOT include the function signature or body. ONLY the docstring."""
         
         user_input = "\n".join(context_parts)
         
-        # Get LLM
-        llm = llm_manager.get_llm(
-            provider=self.provider,
-            model=self.model,
-            temperature=0.3
-        )
-        
-        # Build chain
-        chain = self.prompt | llm | StrOutputParser()
-        
-        # Generate documentation
+        # Generate documentation (provider chain falls back on failure)
         try:
-            response = await chain.ainvoke({"user_input": user_input})
+            result = await provider_chain.run(
+                lambda llm, acquire: collect_stream(
+                    singleflight.wrap(
+                        self.prompt | llm | StrOutputParser(),
+                        flight_key(llm, user_input, task="documentation"),
+                        acquire=acquire
+                    ),
+                    {"user_input": user_input}
+                ),
+                task="agent",
+                coalesced=True,
+                provider=self.provider,
+                model=self.model,
+                tier="balanced",
+                latency_budget_ms=settings.LATENCY_BUDGETS_MS.get("agent"),
+                temperature=0.3,
+                **size_request(self.prompt.format(user_input=user_input), "documentation")
+            )
+            response = result.output.text
+            state["truncated"] = result.output.truncated
             
             state["response"] = response
             state["confidence"] = 0.85
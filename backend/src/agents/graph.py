@@ -1,9 +1,12 @@
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, Annotated, Literal
+from typing import TypedDict, Annotated, Literal, Optional
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from operator import add
+import asyncio
 import logging
 
+from ..config import settings
+from ..utils.deadline import deadline_scope
 from .supervisor import supervisor
 from .debug_agent import debug_agent
 from .documentation_agent import documentation_agent
@@ -51,6 +54,7 @@ class AgentState(TypedDict):
     # Output
     response: str
     confidence: float
+    truncated: bool  # Deadline hit; response is partial
 
 
 class LocoAgentGraph:
@@ -173,6 +177,7 @@ class LocoAgentGraph:
         if result:
             state["response"] = result.completion
             state["confidence"] = result.confidence
+            state["truncated"] = result.truncated
         else:
             state["response"] = "Completion generation failed"
             state["confidence"] = 0.0
@@ -185,7 +190,9 @@ class LocoAgentGraph:
         logger.info("💬 General agent processing...")
         state["executed_agent"] = "general"
         
-        from ..llm.llm_manager import llm_manager
+        from ..llm.provider_chain import provider_chain
+        from ..llm.generation import collect_stream
+        from ..llm.context_sizing import size_request
         from langchain_core.prompts import ChatPromptTemplate
         from langchain_core.output_parsers import StrOutputParser
         
@@ -194,12 +201,17 @@ class LocoAgentGraph:
             ("user", "{query}")
         ])
         
-        llm = llm_manager.get_llm(provider="groq", temperature=0.5)
-        chain = prompt | llm | StrOutputParser()
-        
         try:
-            response = await chain.ainvoke({"query": state.get("user_query", "")})
-            state["response"] = response
+            result = await provider_chain.run(
+                lambda llm: collect_stream(prompt | llm | StrOutputParser(), {"query": state.get("user_query", "")}),
+                task="agent",
+                tier="fast",
+                latency_budget_ms=settings.LATENCY_BUDGETS_MS.get("agent"),
+                temperature=0.5,
+                **size_request(prompt.format(query=state.get("user_query", "")), "agent")
+            )
+            state["response"] = result.output.text
+            state["truncated"] = result.output.truncated
             state["confidence"] = 0.7
         except Exception as e:
             logger.error(f"General agent failed: {e}")
@@ -215,24 +227,46 @@ class LocoAgentGraph:
         logger.info(f"📍 Routing to: {next_agent}")
         return next_agent
     
-    async def run(self, initial_state: AgentState) -> AgentState:
+    async def run(
+        self,
+        initial_state: AgentState,
+        timeout_seconds: Optional[float] = None
+    ) -> AgentState:
         """
         Run the multi-agent workflow
         
         Args:
             initial_state: Initial state with user query
+            timeout_seconds: Deadline for the whole workflow (can only shorten
+                a deadline already set by the caller)
             
         Returns:
-            Final state with response
+            Final state with response (truncated=True if the deadline cut it short)
         """
         logger.info("🚀 Starting multi-agent workflow...")
         
         try:
-            # Run graph
-            final_state = await self.graph.ainvoke(initial_state)
+            with deadline_scope(timeout_seconds) as deadline:
+                timeout = (
+                    deadline.remaining() + settings.DEADLINE_GRACE_SECONDS
+                    if deadline is not None else None
+                )
+                # Agents return partial output themselves; this only catches
+                # work that ignores the deadline
+                async with asyncio.timeout(timeout):
+                    final_state = await self.graph.ainvoke(initial_state)
             
             logger.info(f"✅ Workflow complete. Agent: {final_state.get('next_agent')}")
             return final_state
+        
+        except TimeoutError:
+            logger.warning("⏱ Workflow deadline expired")
+            return {
+                **initial_state,
+                "response": "Request timed out before an agent could respond.",
+                "confidence": 0.0,
+                "truncated": True
+            }
             
         except Exception as e:
             logger.error(f"❌ Workflow failed: {e}", exc_info=True)
@@ -43,3 +43,4 @@ class AgentState(TypedDict):
     # Final output
     response: str
     confidence: float
+    truncated: bool  # Deadline hit; response is partial
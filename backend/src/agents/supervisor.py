@@ -1,7 +1,10 @@
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from ..llm.llm_manager import llm_manager
-from typing import Literal
+from ..llm.provider_chain import provider_chain
+from ..llm.generation import collect_stream
+from ..llm.shared_cache import cache_key, shared_cache
+from ..config import settings
+from typing import Literal, Optional
 import logging
 import re
 
@@ -15,7 +18,7 @@ class SupervisorAgent:
     Implements multi-agent coordination pattern from LangGraph
     """
     
-    def __init__(self, provider: str = "groq", model: str = "llama-3.3-70b-versatile"):
+    def __init__(self, provider: Optional[str] = None, model: Optional[str] = None):
         self.provider = provider
         self.model = model
         
@@ -130,20 +133,29 @@ No explanation needed, just the agent name."""
         
         user_input = "\n".join(context_parts)
         
-        # Get fast LLM for routing
+        # The same phrasing routes the same way; reuse decisions across replicas
+        routing_key = cache_key(user_input, self.provider, self.model) if settings.ENABLE_CACHE else None
+        if routing_key:
+            agent_name = await shared_cache.get("routing", routing_key)
+            if agent_name is not None:
+                state["task_type"] = agent_name
+                state["next_agent"] = agent_name
+                state["routing_reason"] = f"LLM routed to {agent_name} (cached)"
+                logger.info(f"Routed to agent: {agent_name} (cached)")
+                return state
+        
+        # Get routing decision from a fast LLM (provider chain falls back on failure)
         try:
-            llm = llm_manager.get_llm(
+            result = await provider_chain.run(
+                lambda llm: collect_stream(self.prompt | llm | StrOutputParser(), {"user_input": user_input}),
+                task="agent",
                 provider=self.provider,
                 model=self.model,
+                tier="balanced",
                 temperature=0.0,
                 max_tokens=10
             )
-            
-            # Build chain
-            chain = self.prompt | llm | StrOutputParser()
-            
-            # Get routing decision
-            response = await chain.ainvoke({"user_input": user_input})
+            response = result.output.text
             
             # Extract agent name
             agent_name = response.strip().lower()
@@ -162,6 +174,8 @@ No explanation needed, just the agent name."""
             state["task_type"] = agent_name
             state["next_agent"] = agent_name
             state["routing_reason"] = f"LLM routed to {agent_name}"
+            if routing_key:
+                shared_cache.set("routing", routing_key, agent_name)
             
             logger.info(f"Routed to agent: {agent_name} (LLM-based)")
             
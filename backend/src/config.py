@@ -1,4 +1,4 @@
-from typing import Optional, Dict, Any, Literal
+from typing import Optional, Dict, Any, Literal, List
 from pydantic_settings import BaseSettings
 
 
@@ -13,6 +13,17 @@ class Settings(BaseSettings):
     # Ollama (Local)
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_DEFAULT_MODEL: str = "qwen2.5-coder:7b"
+    OLLAMA_MAX_CONNECTIONS: int = 20
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OLLAMA_KEEPALIVE_EXPIRY: float = 60.0  # Seconds an idle pooled connection stays open
+    OLLAMA_KEEP_ALIVE: str = "30m"  # How long Ollama keeps a model resident after a request
+    OLLAMA_WARMUP_ON_STARTUP: bool = True
+    OLLAMA_WARMUP_TIERS: List[str] = ["fast", "balanced", "quality"]
+    OLLAMA_REWARM_INTERVAL_SECONDS: int = 600  # Re-ping idle models this often (0 = off)
+    OLLAMA_INVENTORY_TTL_SECONDS: int = 30  # Background /api/tags refresh interval
+    USE_NATIVE_OLLAMA_CLIENT: bool = False  # Completions call /api/generate directly, skipping LangChain
+    ENABLE_FIM: bool = True  # Native fill-in-the-middle prompts for known code models
+    FIM_FORMAT_OVERRIDES: Dict[str, str] = {}  # model -> format name ("instruction" disables FIM)
     
     # Cloud API Keys
     GROQ_API_KEY: Optional[str] = None
@@ -22,21 +33,140 @@ class Settings(BaseSettings):
     GITHUB_TOKEN: Optional[str] = None
     
     # Model Selection Strategy
-    DEFAULT_PROVIDER: Literal["ollama", "groq", "gemini", "openai"] = "ollama"
+    DEFAULT_PROVIDER: Literal["ollama", "groq", "gemini", "openai", "mock"] = "ollama"
     USE_LOCAL_FIRST: bool = True  # Try local before cloud
     ENABLE_CLOUD_FALLBACK: bool = False
     USE_LOCAL_ONLY: bool = True
     MAX_LOCAL_CONTEXT: int = 4096
+    PROVIDER_ORDER: List[str] = ["ollama", "groq", "gemini", "openai"]
+    
+    # Mock provider (DEFAULT_PROVIDER=mock: offline benchmarks and load tests)
+    MOCK_TTFT_MS: float = 50.0
+    MOCK_TOKENS_PER_SEC: float = 50.0
+    MOCK_JITTER: float = 0.1  # +/- fraction applied to every delay
+    MOCK_ERROR_RATE: float = 0.0  # Fraction of requests that fail mid-stream
+    MOCK_SEED: int = 42
+    MOCK_RESPONSE: Optional[str] = None  # Template ({model}, {prompt_chars}); canned text if unset
+    
+    # Provider chain health (skip hops that break the task SLO)
+    TASK_LATENCY_SLO_MS: Dict[str, int] = {
+        "completion": 2000, "completion_upgrade": 15000, "chat": 20000, "agent": 30000
+    }
+    PROVIDER_MAX_ERROR_RATE: float = 0.5
+    # Latency budgets: pick the best model expected to answer within these
+    LATENCY_BUDGETS_MS: Dict[str, int] = {"completion": 800, "chat": 15000, "agent": 20000}
+    METRICS_WINDOW: int = 100  # Samples kept per provider/model
+    METRICS_MIN_SAMPLES: int = 5  # Samples needed before a hop can be skipped
+    METRICS_MAX_AGE_SECONDS: int = 300
+    
+    # Background health probes (1-token generations while a provider is idle)
+    ENABLE_HEALTH_PROBES: bool = True
+    HEALTH_PROBE_INTERVAL_SECONDS: int = 60
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 10.0
+    HEALTH_PROBE_TIERS: List[str] = ["fast"]  # Probing unloaded big local models would load them
+    HEALTH_PROBE_EWMA_ALPHA: float = 0.3
+    HEALTH_PROBE_DOWN_AFTER: int = 2  # Consecutive failed probes before a model is skipped
+    HEALTH_MIN_AVAILABILITY: float = 0.5
+    
+    # Circuit breakers (per provider/model)
+    BREAKER_FAILURE_THRESHOLD: int = 3  # Consecutive failures before opening
+    BREAKER_RECOVERY_SECONDS: float = 30.0  # Open time before a half-open probe
+    BREAKER_PROBE_TIMEOUT_SECONDS: float = 10.0
+    
+    # Hedged requests (opt-in, latency-critical paths such as /api/v1/complete)
+    ENABLE_HEDGING: bool = False
+    HEDGE_ALTERNATE: Optional[str] = None  # "provider:model"; defaults to the next chain hop
+    HEDGE_DEFAULT_DELAY_MS: int = 500  # Used until TTFT samples exist
+    HEDGE_MIN_DELAY_MS: int = 150
+    HEDGE_MAX_DELAY_MS: int = 3000
+    
+    # Prompt sessions (Ollama KV-cache reuse across completions in one document)
+    ENABLE_PROMPT_SESSIONS: bool = True
+    PROMPT_SESSION_TTL_SECONDS: int = 300
+    PROMPT_SESSION_MAX: int = 256
+    PROMPT_SESSION_MAX_ANCHOR_LINES: int = 32  # Leading lines kept beyond the client window
+    
+    # Progressive completion (fast draft now, quality-tier upgrade in the background)
+    ENABLE_PROGRESSIVE_COMPLETION: bool = False  # Default when a request doesn't say
+    PROGRESSIVE_UPGRADE_TIER: Literal["balanced", "quality"] = "quality"
+    PROGRESSIVE_UPGRADE_TIMEOUT_SECONDS: float = 20.0
+    PROGRESSIVE_MAX_PENDING: int = 1  # Upgrades share the GPU with drafts; also capped below PROVIDER_CONCURRENCY
+    PROGRESSIVE_MAX_SLOTS: int = 256
+    PROGRESSIVE_SLOT_TTL_SECONDS: int = 60
     
     # Performance
-    MAX_CONCURRENT_REQUESTS: int = 5
-    TIMEOUT_SECONDS: int = 30
+    MAX_CONCURRENT_REQUESTS: int = 5  # Default per-provider concurrency limit
+    ENABLE_COALESCING: bool = True  # Identical concurrent requests share one generation
+    PROVIDER_CONCURRENCY: Dict[str, int] = {"ollama": 2}  # A local model serves few requests at once
+    PROVIDER_RATE_LIMITS: Dict[str, Dict[str, int]] = {
+        "groq": {"rpm": 30, "tpm": 6000}
+    }
+    RATE_LIMIT_QUEUE_TIMEOUT_MS: int = 2000  # Max wait for capacity before failing fast
+    RATE_LIMIT_MAX_QUEUE: int = 20  # Waiting requests per provider before rejecting
+    TIMEOUT_SECONDS: int = 30  # Default request deadline
+    ENDPOINT_DEADLINES: Dict[str, float] = {
+        "complete": 1.5,
+        "chat": 60,
+        "agent": 60,
+        "debug": 30,
+        "explain": 30,
+        "refactor": 45,
+        "documentation": 60
+    }
+    DEADLINE_GRACE_SECONDS: float = 0.25  # Hard-cancel margin for non-streaming calls
     MAX_TOKENS: int = 1024
     TEMPERATURE: float = 0.1
+    LLM_POOL_SIZE: int = 32  # Max pooled LLM instances (LRU evicted)
+    
+    # Context sizing (num_ctx buckets and output budgets per task)
+    TOKENIZER_ENCODING: str = "cl100k_base"
+    CONTEXT_TOKEN_MARGIN: float = 1.15  # Local model tokenizers differ from tiktoken
+    NUM_CTX_BUCKETS: List[int] = [2048, 4096, 8192, 16384, 32768]
+    OUTPUT_TOKEN_BUDGETS: Dict[str, int] = {
+        "line": 64,
+        "block": 256,
+        "chat": 2048,
+        "agent": 1024,
+        "debug": 1024,
+        "explain": 1024,
+        "refactor": 2048,
+        "documentation": 2048
+    }
+    MIN_OUTPUT_TOKENS: int = 32
+    # Structural stops: end completions when the line/block is complete
+    ENABLE_EARLY_STOP: bool = True
+    MAX_STOP_SEQUENCES: int = 4  # OpenAI-compatible APIs reject more
+    
+    # Cancellation: a newer request for a document cancels the older one
+    ENABLE_SUPERSESSION: bool = True
+    SUPERSEDE_ATTACH_TIMEOUT_MS: int = 50  # Max wait for the newer request to join a generation before cancelling the older
+    DISCONNECT_POLL_INTERVAL_MS: int = 100
     
     # Caching
     ENABLE_CACHE: bool = True
-    REDIS_URL: Optional[str] = None
+    REDIS_URL: Optional[str] = None  # Shared L2 across replicas; L1 (in-process) only if unset
+    REDIS_TIMEOUT_MS: int = 50
+    REDIS_RETRY_SECONDS: int = 30  # After a Redis error, use L1 only this long
+    CACHE_TTL_SECONDS: Dict[str, int] = {
+        "completion": 300,
+        "agent": 1800,
+        "routing": 3600
+    }
+    CACHE_L1_MAX_BYTES: Dict[str, int] = {
+        "completion": 32 * 1024 * 1024,
+        "agent": 16 * 1024 * 1024,
+        "routing": 1024 * 1024
+    }
+    CACHE_COMPRESS_MIN_BYTES: int = 1024  # Larger payloads are zstd-compressed
+    COMPLETION_CACHE_PREFIX_CHARS: int = 2000  # Prefix tail that is part of the key
+    COMPLETION_CACHE_SUFFIX_CHARS: int = 500  # Suffix head that is part of the key
+    # Type-ahead reuse: typing through a suggestion gets the rest of it
+    ENABLE_TYPEAHEAD_REUSE: bool = True
+    TYPEAHEAD_ANCHOR_LINES: int = 8  # Prefix tail that must match the earlier request...
+    TYPEAHEAD_ANCHOR_CHARS: int = 512  # ...at most this long
+    TYPEAHEAD_ENTRIES_PER_DOCUMENT: int = 4
+    TYPEAHEAD_MAX_DOCUMENTS: int = 256
+    TYPEAHEAD_TTL_SECONDS: int = 120
     
     class Config:
         env_file = ".env"
@@ -62,6 +192,11 @@ PROVIDER_MODELS: Dict[str, Dict[str, Any]] = {
         "fast": "gpt-4o-mini",
         "balanced": "gpt-4o",
         "quality": "gpt-4o"
+    },
+    "mock": {
+        "fast": "mock-fast",
+        "balanced": "mock-balanced",
+        "quality": "mock-quality"
     }
 }
 
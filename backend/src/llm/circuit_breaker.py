@@ -0,0 +1,113 @@
+from typing import Literal, Optional
+import logging
+import time
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one (provider, model)
+
+    closed    -> requests flow; consecutive failures are counted
+    open      -> requests are skipped without paying connect/timeout cost
+    half_open -> recovery timeout elapsed; a single cheap probe decides
+                 whether to close again or re-open
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        failure_threshold: int = settings.BREAKER_FAILURE_THRESHOLD,
+        recovery_seconds: float = settings.BREAKER_RECOVERY_SECONDS
+    ):
+        self.provider = provider
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state: BreakerState = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.times_opened = 0
+
+    def allow_request(self) -> bool:
+        """True if user traffic may be sent to this provider/model"""
+        return self.state == "closed"
+
+    def probe_due(self) -> bool:
+        """True if the breaker is open and the recovery timeout has elapsed"""
+        return (
+            self.state == "open"
+            and self.opened_at is not None
+            and time.time() - self.opened_at >= self.recovery_seconds
+        )
+
+    def start_probe(self):
+        """Move to half-open while a probe request is in flight"""
+        self.state = "half_open"
+
+    def record_success(self):
+        """A request or probe succeeded"""
+        if self.state != "closed":
+            logger.info(f"🟢 Circuit closed: {self.provider}:{self.model}")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self, error: str):
+        """A request or probe failed"""
+        self.consecutive_failures += 1
+        self.last_error = error[:200]
+
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning(
+                    f"🔴 Circuit open: {self.provider}:{self.model} "
+                    f"after {self.consecutive_failures} failure(s): {self.last_error}"
+                )
+            self.state = "open"
+            self.opened_at = time.time()
+
+    def to_dict(self) -> dict:
+        retry_in = None
+        if self.state == "open" and self.opened_at is not None:
+            retry_in = max(0.0, round(self.recovery_seconds - (time.time() - self.opened_at), 1))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "probe_in": retry_in,
+            "last_error": self.last_error
+        }
+
+
+class CircuitBreakerRegistry:
+    """Lazily created breakers keyed by (provider, model)"""
+
+    def __init__(self):
+        self._breakers: dict[tuple[str, str], CircuitBreaker] = {}
+
+    def get(self, provider: str, model: str) -> CircuitBreaker:
+        """Returns the breaker for a provider/model"""
+        key = (provider, model)
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(provider, model)
+        return self._breakers[key]
+
+    def get_stats(self) -> dict:
+        """Returns breaker state as {"provider:model": {...}}"""
+        return {
+            f"{provider}:{model}": breaker.to_dict()
+            for (provider, model), breaker in self._breakers.items()
+        }
+
+
+# Global singleton
+circuit_breakers = CircuitBreakerRegistry()
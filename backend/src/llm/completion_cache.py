@@ -0,0 +1,40 @@
+from typing import Optional
+
+from ..config import settings
+from .shared_cache import cache_key
+
+
+def _normalize(text: str) -> str:
+    """Line endings unified and trailing whitespace of complete lines dropped"""
+    lines = text.replace("\r\n", "\n").split("\n")
+    # The last line is where the cursor is: its whitespace is significant
+    return "\n".join([line.rstrip() for line in lines[:-1]] + lines[-1:])
+
+
+def completion_cache_key(
+    language: str,
+    provider: Optional[str],
+    model: Optional[str],
+    prefix: str,
+    suffix: str,
+    **params
+) -> str:
+    """
+    Cache key for a completion request
+
+    Only the text near the cursor is part of the key: the last
+    COMPLETION_CACHE_PREFIX_CHARS of the prefix and the first
+    COMPLETION_CACHE_SUFFIX_CHARS of the suffix, normalized so CRLF files
+    and trailing-whitespace edits hit the same entry.
+
+    Args:
+        language: Document language
+        provider: Requested provider (None = routed)
+        model: Requested model (None = routed)
+        prefix: Code before the cursor
+        suffix: Code after the cursor
+        **params: Anything else that changes the output
+    """
+    prefix_tail = _normalize(prefix[-settings.COMPLETION_CACHE_PREFIX_CHARS:])
+    suffix_head = _normalize(suffix[:settings.COMPLETION_CACHE_SUFFIX_CHARS]).rstrip()
+    return cache_key(language, provider, model, prefix_tail, suffix_head, params)
@@ -0,0 +1,238 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Literal, Optional
+import asyncio
+import logging
+import time
+
+from ..config import settings
+from .metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+UpgradeStatus = Literal["pending", "ready", "unchanged", "failed", "superseded"]
+
+
+@dataclass
+class UpgradeSlot:
+    """Background quality completion for one progressive request"""
+    request_id: str
+    document: Optional[str]
+    draft: str
+    draft_model: str
+    status: UpgradeStatus = "pending"
+    completion: Optional[str] = None
+    model_used: Optional[str] = None
+    error: Optional[str] = None
+    arrival_ms: Optional[int] = None  # Draft returned -> upgrade ready
+    delivered: bool = False
+    created_at: float = field(default_factory=time.time)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+    _ready: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def to_dict(self) -> dict:
+        return {
+            "request_id": self.request_id,
+            "status": self.status,
+            "completion": self.completion,
+            "model_used": self.model_used,
+            "draft_model": self.draft_model,
+            "arrival_ms": self.arrival_ms,
+            "error": self.error
+        }
+
+
+class CompletionUpgradeStore:
+    """
+    Retrieval slots for progressive completions, keyed by request id
+
+    The endpoint answers with the fast-tier draft and a quality-tier
+    generation keeps running in the background; its result lands in the
+    request's slot, where the client fetches (or long-polls) it. A newer
+    progressive request for the same document supersedes and cancels the
+    older upgrade: the user has moved on and the GPU time is better spent
+    on the new draft. Slots expire after PROGRESSIVE_SLOT_TTL_SECONDS.
+    """
+
+    def __init__(
+        self,
+        max_slots: int = settings.PROGRESSIVE_MAX_SLOTS,
+        ttl_seconds: int = settings.PROGRESSIVE_SLOT_TTL_SECONDS,
+        max_pending: int = settings.PROGRESSIVE_MAX_PENDING
+    ):
+        self.max_slots = max_slots
+        self.ttl_seconds = ttl_seconds
+        self.max_pending = max_pending
+        self._slots: OrderedDict[str, UpgradeSlot] = OrderedDict()
+        self._latest: dict[str, str] = {}  # document -> newest request id
+        self._arrivals: deque[int] = deque(maxlen=settings.METRICS_WINDOW)
+        self.started = 0
+        self.skipped = 0
+        self.ready = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.superseded = 0
+        self.delivered = 0
+        self.replaced = 0
+
+    def pending_count(self) -> int:
+        return sum(1 for slot in self._slots.values() if slot.status == "pending")
+
+    def has_capacity(self, provider: Optional[str] = None) -> bool:
+        """
+        False while PROGRESSIVE_MAX_PENDING upgrades are already running
+
+        Args:
+            provider: Provider the upgrade will run on; pending upgrades are
+                also kept below its PROVIDER_CONCURRENCY, so drafts always
+                have a slot that no upgrade holds
+        """
+        limit = self.max_pending
+        if provider is not None:
+            concurrency = settings.PROVIDER_CONCURRENCY.get(provider, settings.MAX_CONCURRENT_REQUESTS)
+            limit = min(limit, concurrency - 1)
+        if self.pending_count() < limit:
+            return True
+        self.skipped += 1
+        return False
+
+    def create(
+        self,
+        request_id: str,
+        document: Optional[str],
+        draft: str,
+        draft_model: str
+    ) -> UpgradeSlot:
+        """
+        Open a slot for a request whose draft was just returned
+
+        Args:
+            request_id: Id the client fetches the upgrade with
+            document: Document key; older pending upgrades for it are superseded
+            draft: Cleaned draft completion sent to the client
+            draft_model: provider:model of the draft
+        """
+        self._evict()
+        if document:
+            previous = self._latest.get(document)
+            if previous and previous != request_id:
+                self.supersede(previous)
+            self._latest[document] = request_id
+
+        slot = UpgradeSlot(request_id=request_id, document=document, draft=draft, draft_model=draft_model)
+        self._slots[request_id] = slot
+        self.started += 1
+        while len(self._slots) > self.max_slots:
+            _, dropped = self._slots.popitem(last=False)
+            self._cancel(dropped)
+        return slot
+
+    def resolve(self, request_id: str, completion: str, model_used: str):
+        """Store a finished upgrade ("unchanged" when it equals the draft)"""
+        slot = self._slots.get(request_id)
+        if slot is None or slot.status != "pending":
+            return
+        slot.completion = completion
+        slot.model_used = model_used
+        slot.arrival_ms = int((time.time() - slot.created_at) * 1000)
+        self._arrivals.append(slot.arrival_ms)
+        if completion.strip() == slot.draft.strip():
+            slot.status = "unchanged"
+            self.unchanged += 1
+        else:
+            slot.status = "ready"
+            self.ready += 1
+        slot._ready.set()
+        logger.debug(f"⬆️ Upgrade {request_id[:8]} {slot.status} after {slot.arrival_ms}ms ({model_used})")
+
+    def fail(self, request_id: str, error: str):
+        slot = self._slots.get(request_id)
+        if slot is None or slot.status != "pending":
+            return
+        slot.status = "failed"
+        slot.error = error
+        self.failed += 1
+        slot._ready.set()
+
+    def supersede(self, request_id: str):
+        """Drop the upgrade of a request the user has moved past"""
+        slot = self._slots.get(request_id)
+        if slot is None or slot.status != "pending":
+            return
+        slot.status = "superseded"
+        self.superseded += 1
+        self._cancel(slot)
+        slot._ready.set()
+
+    async def fetch(self, request_id: str, wait_ms: int = 0) -> Optional[UpgradeSlot]:
+        """
+        Slot for a request, optionally waiting for a pending upgrade
+
+        Args:
+            request_id: Request id returned with the draft
+            wait_ms: Long-poll up to this long while the upgrade is pending
+
+        Returns:
+            The slot, None if unknown or expired
+        """
+        slot = self._slots.get(request_id)
+        if slot is None or self._expired(slot):
+            return None
+        if slot.status == "pending" and wait_ms > 0:
+            try:
+                await asyncio.wait_for(slot._ready.wait(), wait_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+        if slot.status == "ready" and not slot.delivered:
+            # The client received a completion that differs from its draft
+            slot.delivered = True
+            self.delivered += 1
+            self.replaced += 1
+        elif slot.status == "unchanged" and not slot.delivered:
+            slot.delivered = True
+            self.delivered += 1
+        return slot
+
+    def _expired(self, slot: UpgradeSlot) -> bool:
+        return time.time() - slot.created_at > self.ttl_seconds
+
+    def _cancel(self, slot: UpgradeSlot):
+        if slot.task is not None and not slot.task.done():
+            slot.task.cancel()
+        if slot.document and self._latest.get(slot.document) == slot.request_id:
+            del self._latest[slot.document]
+
+    def _evict(self):
+        """Drop expired slots (oldest first)"""
+        while self._slots:
+            request_id, slot = next(iter(self._slots.items()))
+            if not self._expired(slot):
+                break
+            del self._slots[request_id]
+            if slot.status == "pending":
+                slot.status = "superseded"
+                self.superseded += 1
+                self._cancel(slot)
+
+    def get_stats(self) -> dict:
+        arrivals = list(self._arrivals)
+        finished = self.ready + self.unchanged
+        return {
+            "slots": len(self._slots),
+            "pending": self.pending_count(),
+            "started": self.started,
+            "skipped_at_capacity": self.skipped,
+            "ready": self.ready,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "superseded": self.superseded,
+            "delivered": self.delivered,
+            # Upgrades that differed from the draft and reached the client
+            "replacement_rate": round(self.replaced / finished, 3) if finished else None,
+            "arrival_ms_p50": percentile(arrivals, 50) if arrivals else None,
+            "arrival_ms_p90": percentile(arrivals, 90) if arrivals else None
+        }
+
+
+# Global singleton
+completion_upgrades = CompletionUpgradeStore()
@@ -0,0 +1,110 @@
+from functools import lru_cache
+from typing import Literal
+import logging
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+BudgetKind = Literal["line", "block", "chat", "agent", "debug", "explain", "refactor", "documentation"]
+
+BLOCK_OPENERS = (":", "{", "(", "[", "=>", "->")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktoken encoding, None if it cannot be loaded (e.g. offline first run)"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"⚠️ tiktoken unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count of text
+
+    Uses tiktoken; local code models tokenize differently, so callers add
+    CONTEXT_TOKEN_MARGIN on top. Falls back to ~3 chars/token.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 3 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def completion_budget_kind(prefix: str, suffix: str) -> BudgetKind:
+    """
+    "line" when the cursor is inside or at the end of a line of code,
+    "block" on an empty line or right after a block opener
+    """
+    current_line = prefix.rsplit("\n", 1)[-1]
+    rest_of_line = suffix.split("\n", 1)[0]
+    if not current_line.strip():
+        return "block"
+    if rest_of_line.strip():
+        return "line"
+    return "block" if current_line.rstrip().endswith(BLOCK_OPENERS) else "line"
+
+
+def choose_num_ctx(needed_tokens: int) -> int:
+    """Smallest NUM_CTX_BUCKETS entry that fits, capped at MAX_LOCAL_CONTEXT"""
+    for bucket in sorted(settings.NUM_CTX_BUCKETS):
+        if bucket >= needed_tokens and bucket <= settings.MAX_LOCAL_CONTEXT:
+            return bucket
+    return settings.MAX_LOCAL_CONTEXT
+
+
+def size_request(prompt: str, kind: BudgetKind, overhead: int = 0) -> dict:
+    """
+    num_ctx and max_tokens for one request
+
+    The output budget comes from OUTPUT_TOKEN_BUDGETS for the task kind.
+    num_ctx is the smallest bucket holding prompt + output, so only a few
+    distinct sizes exist and Ollama does not reload the model for each
+    request. The output budget is the task's full one: cloud hops have
+    large fixed context windows, and the provider chain shrinks it for
+    Ollama hops with fit_local_output().
+
+    Args:
+        prompt: Prompt text (or the variable part of it)
+        kind: Task kind selecting the output budget
+        overhead: Tokens of fixed template text not included in prompt
+
+    Returns:
+        {"num_ctx": ..., "max_tokens": ..., "prompt_tokens": ...} for provider_chain.run
+    """
+    measured_tokens = count_tokens(prompt) + overhead
+    prompt_tokens = int(measured_tokens * settings.CONTEXT_TOKEN_MARGIN)
+    max_tokens = settings.OUTPUT_TOKEN_BUDGETS.get(kind, settings.MAX_TOKENS)
+    num_ctx = choose_num_ctx(prompt_tokens + max_tokens)
+    return {"num_ctx": num_ctx, "max_tokens": max_tokens, "prompt_tokens": measured_tokens}
+
+
+def fit_local_output(prompt_tokens: int, max_tokens: int, num_ctx: int) -> int:
+    """
+    Output budget of an Ollama hop: what num_ctx leaves beside the prompt
+
+    When the prompt is too big for num_ctx the output budget shrinks first
+    (it is the only part that can fit without truncating the prompt).
+
+    Args:
+        prompt_tokens: Measured prompt tokens (size_request()["prompt_tokens"])
+        max_tokens: The task's output budget
+        num_ctx: Context window the hop runs with
+
+    Returns:
+        max_tokens for the hop
+    """
+    needed_tokens = int(prompt_tokens * settings.CONTEXT_TOKEN_MARGIN)
+    if needed_tokens + max_tokens <= num_ctx:
+        return max_tokens
+    fitted = max(settings.MIN_OUTPUT_TOKENS, num_ctx - needed_tokens)
+    if needed_tokens + fitted > num_ctx:
+        logger.warning(
+            f"⚠️ Prompt (~{needed_tokens} tokens) exceeds num_ctx={num_ctx}; "
+            f"local models will truncate it"
+        )
+    return min(max_tokens, fitted)
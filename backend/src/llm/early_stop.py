@@ -0,0 +1,271 @@
+from typing import Any, AsyncIterator, Optional
+import logging
+
+from ..config import settings
+from .context_sizing import BudgetKind, count_tokens
+from .generation import chunk_text
+
+logger = logging.getLogger(__name__)
+
+OPENING_BRACKETS = "([{"
+CLOSING_BRACKETS = ")]}"
+# Line endings that open a block or a multi-line statement
+HEADER_ENDINGS = (":", "{", "(", "[", "=>")
+# Lines at the header's indent that continue the same statement
+BLOCK_CONTINUATIONS = ("else", "elif", "except", "finally", "catch")
+HASH_COMMENT_LANGUAGES = {"python", "ruby", "shell", "bash", "perl", "r", "yaml"}
+
+
+class BlockTracker:
+    """
+    Incremental bracket/indent tracker that finds where a completion is done
+
+    Fed the streamed text, it looks at each finished line and reports the
+    offset (in the completion text) to cut at:
+
+    - "line" completions end at the first newline outside brackets and
+      strings (a docstring or template literal runs to its closing quote)
+    - "block" completions end before the first line dedented below the
+      block (or at/below the header the completion itself opened), after
+      the bracket closing a block the completion opened, before two blank
+      lines, and before a closing code fence
+
+    Strings and comments are skipped when counting brackets. line_start is
+    the text already on the cursor line, so a raw (FIM) continuation is
+    measured from the real start of the line.
+    """
+
+    def __init__(self, kind: BudgetKind, language: str = "", line_start: str = ""):
+        self.kind = kind
+        self.hash_comments = language in HASH_COMMENT_LANGUAGES
+        self.depth = 0
+        self.cut: Optional[int] = None
+        self._buffer = line_start
+        self._offset = -len(line_start)  # Completion offset of the buffer start
+        self._in_string: Optional[str] = None
+        self._header_indent: Optional[int] = None
+        self._base_indent: Optional[int] = None
+        self._content_lines = 0
+        self._blank_run = 0
+
+    def feed(self, text: str) -> Optional[int]:
+        """
+        Add streamed text
+
+        Returns:
+            Offset in the completion where it is complete, None to keep going
+        """
+        if self.cut is not None:
+            return self.cut
+        self._buffer += text
+        while self.cut is None and "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            start = self._offset
+            self._offset += len(line) + 1
+            self.cut = self._finish_line(line, start, start + len(line))
+        return self.cut
+
+    def _finish_line(self, line: str, start: int, end: int) -> Optional[int]:
+        stripped = line.strip()
+        in_string = self._in_string is not None
+
+        if not in_string and stripped.startswith("```"):
+            # Opening fence of an instruction model's answer, or the closing one
+            return max(0, start) if self._content_lines else None
+
+        if not stripped and not in_string:
+            self._blank_run += 1
+            if self.kind != "line" and self._blank_run >= 2 and self.depth <= 0 and self._content_lines:
+                return max(0, start)
+            return None
+        self._blank_run = 0
+
+        indent = len(line.expandtabs(4)) - len(line.expandtabs(4).lstrip())
+        depth_before = self.depth
+        self._scan(line)
+        self._content_lines += 1
+
+        if self._content_lines == 1:
+            if stripped.endswith(HEADER_ENDINGS) or self.depth > depth_before:
+                self._header_indent = indent
+            else:
+                self._base_indent = indent
+            if self.kind == "line" and self.depth <= 0 and self._in_string is None:
+                return end
+            return None
+
+        if self.kind == "line":
+            # Ends with the line that closes every bracket and string left open
+            return end if self.depth <= 0 and self._in_string is None else None
+        if in_string:
+            return None  # Inside a multi-line string / docstring
+
+        if depth_before <= 0:
+            if self._header_indent is not None:
+                if indent == self._header_indent and stripped.startswith(BLOCK_CONTINUATIONS):
+                    return None
+                dedented = indent <= self._header_indent
+            else:
+                dedented = indent < self._base_indent
+            return max(0, start) if dedented else None
+
+        if self.depth <= 0 and self._header_indent is not None and indent <= self._header_indent:
+            return end  # Closed the block the completion opened
+        return None
+
+    def _scan(self, line: str):
+        """Update bracket depth and open-string state for one line"""
+        i = 0
+        while i < len(line):
+            if self._in_string is not None:
+                if line.startswith(self._in_string, i):
+                    i += len(self._in_string)
+                    self._in_string = None
+                elif line[i] == "\\":
+                    i += 2
+                else:
+                    i += 1
+                continue
+
+            char = line[i]
+            if (char == "#" and self.hash_comments) or (line.startswith("//", i) and not self.hash_comments):
+                break
+            if line.startswith('"""', i) or line.startswith("'''", i):
+                self._in_string = line[i:i + 3]
+                i += 3
+                continue
+            if char in "\"'`":
+                self._in_string = char
+            elif char in OPENING_BRACKETS:
+                self.depth += 1
+            elif char in CLOSING_BRACKETS:
+                self.depth -= 1
+            i += 1
+
+        # Only triple quotes and template literals span lines
+        if self._in_string in ("'", '"'):
+            self._in_string = None
+
+
+class StructuralStop:
+    """
+    Where a completion should end, for one request and prompt style
+
+    Args:
+        prefix: Code before the cursor (as sent)
+        suffix: Code after the cursor
+        language: Language of the document
+        kind: "line" or "block" (context_sizing.completion_budget_kind)
+        raw: True for FIM prompts, whose output continues the cursor line
+            verbatim; False for instruction prompts, where the model may
+            wrap code in fences and restart the line
+    """
+
+    def __init__(self, prefix: str, suffix: str, language: str, kind: BudgetKind, raw: bool):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.language = language
+        self.kind = kind
+        self.raw = raw
+
+    def stop_sequences(self) -> list[str]:
+        """
+        Server-side stop sequences, at most MAX_STOP_SEQUENCES
+
+        The first non-blank line after the cursor stops a model that starts
+        repeating the suffix. Raw block continuations also stop at two blank
+        lines; instruction answers may open with a fence line, so they only
+        stop at the closing fence. Line completions get no newline stop: a
+        statement may legitimately span lines inside brackets, which only
+        the tracker can tell.
+        """
+        stops = []
+        suffix_lines = self.suffix.split("\n")[1:]
+        next_line = next((line for line in suffix_lines if line.strip()), None)
+        if next_line is not None:
+            stops.append("\n" + next_line.rstrip())
+        if not self.raw:
+            stops.append("\n```")
+        elif self.kind != "line":
+            stops.append("\n\n\n")
+        return stops[:settings.MAX_STOP_SEQUENCES]
+
+    def tracker(self) -> BlockTracker:
+        line_start = self.prefix.rsplit("\n", 1)[-1] if self.raw else ""
+        return BlockTracker(self.kind, self.language, line_start)
+
+    def trim(self, text: str) -> str:
+        """text cut where the tracker says the completion is complete"""
+        cut = self.tracker().feed(text)
+        return text if cut is None else text[:cut]
+
+    def wrap(self, runnable: Any) -> Any:
+        """Runnable-like view of runnable whose stream ends when the block is complete"""
+        if not settings.ENABLE_EARLY_STOP:
+            return runnable
+        return EarlyStopRunnable(runnable, self)
+
+
+class EarlyStopRunnable:
+    """
+    astream()-only wrapper that closes the stream once the completion is done
+
+    Closing the stream makes Ollama stop generating (and cancels a
+    coalesced flight). Chunks are passed through as they arrive, so the
+    last one may run past the cut; StructuralStop.trim() removes that.
+    """
+
+    def __init__(self, runnable: Any, structure: StructuralStop):
+        self._runnable = runnable
+        self._structure = structure
+
+    async def astream(self, inputs: Any) -> AsyncIterator[Any]:
+        tracker = self._structure.tracker()
+        stream = self._runnable.astream(inputs)
+        try:
+            async for chunk in stream:
+                yield chunk
+                if tracker.feed(chunk_text(chunk)) is not None:
+                    early_stop_stats.early_stops += 1
+                    return
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+class EarlyStopStats:
+    """Output tokens per completion and how often generation was cut short"""
+
+    def __init__(self):
+        self.completions = 0
+        self.early_stops = 0
+        self.trimmed = 0
+        self.output_tokens = 0
+
+    def record(self, generated: str, kept: str):
+        """
+        Count one finished completion
+
+        Args:
+            generated: Text the model produced
+            kept: Text left after the structural trim
+        """
+        self.completions += 1
+        self.output_tokens += count_tokens(generated) if generated else 0
+        if len(kept) < len(generated):
+            self.trimmed += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "completions": self.completions,
+            "early_stops": self.early_stops,
+            "trimmed": self.trimmed,
+            "avg_output_tokens": (
+                round(self.output_tokens / self.completions, 1) if self.completions else None
+            )
+        }
+
+
+# Global singleton
+early_stop_stats = EarlyStopStats()
@@ -0,0 +1,101 @@
+from dataclasses import dataclass, field
+from typing import Optional
+import re
+
+from ..config import settings
+
+
+@dataclass(frozen=True)
+class FIMFormat:
+    """
+    Fill-in-the-middle prompt format for a code model
+
+    Native formats are sent with raw=True so Ollama skips the chat template
+    and the model sees its own FIM tokens. The "ollama_suffix" format sends
+    prefix as prompt and suffix in Ollama's `suffix` field instead, letting
+    the model's Modelfile template build the FIM prompt.
+    """
+    name: str
+    template: str = ""  # Uses {prefix} and {suffix}
+    stop: tuple[str, ...] = ()
+    use_ollama_suffix: bool = False
+    special_tokens: tuple[str, ...] = field(default=(), repr=False)
+
+    def render(self, prefix: str, suffix: str) -> str:
+        """FIM prompt for the given code around the cursor"""
+        if self.use_ollama_suffix:
+            return prefix
+        # str.replace, not str.format: source code is full of braces
+        return self.template.replace("{prefix}", prefix).replace("{suffix}", suffix)
+
+    def request_fields(self, prefix: str, suffix: str) -> dict:
+        """Extra /api/generate fields (raw mode or suffix)"""
+        if self.use_ollama_suffix:
+            return {"suffix": suffix}
+        return {"raw": True}
+
+    def clean(self, text: str) -> str:
+        """Drop FIM tokens a model leaks before hitting a stop sequence"""
+        for token in self.special_tokens + self.stop:
+            text = text.replace(token, "")
+        return text
+
+
+QWEN_FIM = FIMFormat(
+    name="qwen",
+    template="<|fim_prefix|>{prefix}<|fim_suffix|>{suffix}<|fim_middle|>",
+    stop=("<|endoftext|>", "<|fim_pad|>", "<|file_sep|>", "<|repo_name|>", "<|im_end|>"),
+    special_tokens=("<|fim_prefix|>", "<|fim_suffix|>", "<|fim_middle|>")
+)
+
+DEEPSEEK_FIM = FIMFormat(
+    name="deepseek",
+    template="<｜fim▁begin｜>{prefix}<｜fim▁hole｜>{suffix}<｜fim▁end｜>",
+    stop=("<｜end▁of▁sentence｜>", "<|EOT|>"),
+    special_tokens=("<｜fim▁begin｜>", "<｜fim▁hole｜>", "<｜fim▁end｜>")
+)
+
+CODESTRAL_FIM = FIMFormat(
+    name="codestral",
+    template="[SUFFIX]{suffix}[PREFIX]{prefix}",  # Suffix first
+    stop=("</s>", "[INST]", "[/INST]"),
+    special_tokens=("[SUFFIX]", "[PREFIX]", "[MIDDLE]")
+)
+
+OLLAMA_SUFFIX_FIM = FIMFormat(name="ollama_suffix", use_ollama_suffix=True)
+
+FIM_FORMATS: dict[str, FIMFormat] = {
+    fmt.name: fmt for fmt in (QWEN_FIM, DEEPSEEK_FIM, CODESTRAL_FIM, OLLAMA_SUFFIX_FIM)
+}
+
+# Ollama model name (without tag) -> format; first match wins
+MODEL_FIM_PATTERNS: list[tuple[re.Pattern, str]] = [
+    (re.compile(r"^qwen2\.5-coder"), "qwen"),
+    (re.compile(r"^deepseek-coder"), "deepseek"),  # v1 and v2 share FIM tokens
+    (re.compile(r"^codestral"), "codestral"),
+]
+
+
+def get_fim_format(provider: Optional[str], model: Optional[str]) -> Optional[FIMFormat]:
+    """
+    FIM format for a provider/model, None to use the instruction template
+
+    Only Ollama models are matched: cloud providers expose chat endpoints
+    that do not accept raw FIM prompts.
+
+    Args:
+        provider: Provider name
+        model: Model name, e.g. "qwen2.5-coder:7b"
+    """
+    if not settings.ENABLE_FIM or provider != "ollama" or not model:
+        return None
+
+    override = settings.FIM_FORMAT_OVERRIDES.get(model)
+    if override is not None:
+        return FIM_FORMATS.get(override)  # "instruction" (or unknown) -> None
+
+    name = model.split("/")[-1].split(":")[0].lower()
+    for pattern, format_name in MODEL_FIM_PATTERNS:
+        if pattern.match(name):
+            return FIM_FORMATS[format_name]
+    return None
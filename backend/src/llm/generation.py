@@ -0,0 +1,128 @@
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+import asyncio
+import time
+
+from ..utils.deadline import remaining_seconds
+from ..utils.error_handler import DeadlineExceededError
+
+
+@dataclass
+class GenerationOutput:
+    """Text produced by a streamed generation"""
+    text: str
+    truncated: bool = False  # Deadline hit before the model finished
+    ttft_ms: Optional[int] = None
+    chunks: int = 0
+
+
+def chunk_text(chunk: Any) -> str:
+    """Text of a streamed chunk (str from OllamaLLM/parsers, message chunk from chat models)"""
+    if isinstance(chunk, str):
+        return chunk
+    content = getattr(chunk, "content", None)
+    return content if isinstance(content, str) else str(chunk)
+
+
+async def collect_stream(runnable: Any, inputs: Any) -> GenerationOutput:
+    """
+    Stream a runnable into a string, honoring the current request deadline
+
+    When the deadline expires the generation is cancelled (closing the HTTP
+    stream, which makes Ollama stop generating) and whatever text arrived so
+    far is returned with truncated=True.
+
+    Args:
+        runnable: LLM or chain with astream()
+        inputs: Runnable input
+
+    Returns:
+        GenerationOutput with the (possibly partial) text
+
+    Raises:
+        DeadlineExceededError: Deadline expired before the first token
+    """
+    parts: list[str] = []
+    ttft_ms = None
+    start_time = time.time()
+
+    try:
+        async with asyncio.timeout(remaining_seconds()):
+            async for chunk in runnable.astream(inputs):
+                if ttft_ms is None:
+                    ttft_ms = int((time.time() - start_time) * 1000)
+                parts.append(chunk_text(chunk))
+    except TimeoutError:
+        if not parts:
+            raise DeadlineExceededError("Deadline expired before the model produced any output")
+        return GenerationOutput("".join(parts), truncated=True, ttft_ms=ttft_ms, chunks=len(parts))
+
+    return GenerationOutput("".join(parts), ttft_ms=ttft_ms, chunks=len(parts))
+
+
+class ChunkTap:
+    """astream()-only wrapper that passes each chunk's text to a callback as it streams"""
+
+    def __init__(self, runnable: Any, on_text: Callable[[str], None]):
+        self._runnable = runnable
+        self._on_text = on_text
+
+    async def astream(self, inputs: Any) -> AsyncIterator[Any]:
+        stream = self._runnable.astream(inputs)
+        try:
+            async for chunk in stream:
+                self._on_text(chunk_text(chunk))
+                yield chunk
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+class IncrementalText:
+    """
+    Stable deltas of a cleaned, growing text
+
+    clean() is re-applied to the whole raw text on every feed, so it can be
+    any cleaning function. Only text extending what was already released
+    is returned, minus trailing whitespace (clean may strip it) and any
+    tail that could be the start of a marker clean would remove. With
+    hold_first_line, nothing is released until the first line is complete
+    (preambles like "Here's the code:" are only recognizable then).
+
+    Args:
+        clean: Raw text -> cleaned text
+        markers: Strings clean() removes (FIM tokens, code fences)
+        hold_first_line: Wait for the first newline before releasing text
+    """
+
+    def __init__(self, clean: Callable[[str], str], markers: Iterable[str] = (), hold_first_line: bool = False):
+        self._clean = clean
+        self._markers = tuple(markers)
+        self._hold_first_line = hold_first_line
+        self._parts: list[str] = []
+        self.released = ""
+
+    def feed(self, text: str) -> str:
+        """Add raw text; returns newly released cleaned text ("" if none)"""
+        self._parts.append(text)
+        raw = "".join(self._parts)
+        if self._hold_first_line and "\n" not in raw:
+            return ""
+        stable = self._clean(raw).rstrip()
+        stable = stable[:len(stable) - self._marker_overlap(stable)].rstrip()
+        if len(stable) <= len(self.released) or not stable.startswith(self.released):
+            return ""
+        delta = stable[len(self.released):]
+        self.released = stable
+        return delta
+
+    def _marker_overlap(self, text: str) -> int:
+        """Length of the longest tail of text that is a proper prefix of a marker"""
+        longest = 0
+        for marker in self._markers:
+            for size in range(min(len(marker) - 1, len(text)), longest, -1):
+                if text.endswith(marker[:size]):
+                    longest = size
+                    break
+        return longest
@@ -0,0 +1,217 @@
+from dataclasses import dataclass
+from typing import Optional
+import asyncio
+import logging
+import time
+
+from ..config import settings, PROVIDER_MODELS
+from ..utils.error_handler import RateLimitExceededError
+from .metrics import provider_metrics
+from .ollama_client import ollama_client
+from .rate_limiter import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeHealth:
+    """EWMA latency and availability of one provider/model from probes"""
+    provider: str
+    model: str
+    ewma_latency_ms: Optional[float] = None
+    availability: Optional[float] = None  # EWMA of 1 (ok) / 0 (failed)
+    probes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    last_probe_at: Optional[float] = None
+    last_error: Optional[str] = None
+
+    def record(self, ok: bool, latency_ms: Optional[float] = None, error: Optional[str] = None):
+        alpha = settings.HEALTH_PROBE_EWMA_ALPHA
+        self.probes += 1
+        self.last_probe_at = time.time()
+        value = 1.0 if ok else 0.0
+        self.availability = value if self.availability is None else alpha * value + (1 - alpha) * self.availability
+        if ok:
+            self.consecutive_failures = 0
+            if latency_ms is not None:
+                self.ewma_latency_ms = (
+                    latency_ms if self.ewma_latency_ms is None
+                    else alpha * latency_ms + (1 - alpha) * self.ewma_latency_ms
+                )
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = error
+
+    def is_fresh(self) -> bool:
+        """Probed recently enough to describe the provider right now"""
+        return (
+            self.last_probe_at is not None
+            and time.time() - self.last_probe_at <= 3 * settings.HEALTH_PROBE_INTERVAL_SECONDS
+        )
+
+
+class HealthProber:
+    """
+    Background probes of each configured provider/model
+
+    Every HEALTH_PROBE_INTERVAL_SECONDS a 1-token generation is sent to the
+    HEALTH_PROBE_TIERS models of every provider with credentials (Ollama:
+    only models that are pulled, so a probe never triggers a download).
+    Latency and success feed EWMAs used by routing and tier selection.
+
+    Probes back off while real traffic flows: a model is not probed if it
+    served a request within the last interval (the rolling metrics are
+    fresher than any probe) or its provider has requests in flight. Probes
+    never queue for a rate-limit slot.
+    """
+
+    def __init__(self):
+        self._health: dict[tuple[str, str], ProbeHealth] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.rounds = 0
+        self.backed_off = 0
+
+    def get(self, provider: str, model: str) -> Optional[ProbeHealth]:
+        return self._health.get((provider, model))
+
+    def targets(self) -> list[tuple[str, str]]:
+        """(provider, model) pairs to probe"""
+        # Imported here: llm_manager -> tier_selector -> health_prober
+        from .llm_manager import llm_manager
+        available = llm_manager.list_available_providers()
+        targets = []
+        for provider, models in PROVIDER_MODELS.items():
+            if provider == "mock" or not available.get(provider):
+                continue
+            for tier in settings.HEALTH_PROBE_TIERS:
+                model = models.get(tier)
+                if not model or (provider, model) in targets:
+                    continue
+                if provider == "ollama" and not ollama_client.is_model_available(model):
+                    continue
+                targets.append((provider, model))
+        return targets
+
+    def _has_traffic(self, provider: str, model: str) -> bool:
+        """Real requests recently or right now make a probe redundant"""
+        if rate_limiter.get(provider).in_flight > 0:
+            return True
+        outcomes = provider_metrics.get(provider, model).outcomes
+        return bool(outcomes) and time.time() - outcomes[-1][0] < settings.HEALTH_PROBE_INTERVAL_SECONDS
+
+    async def probe(self, provider: str, model: str) -> Optional[ProbeHealth]:
+        """
+        Send one probe generation and update the model's EWMAs
+
+        Returns:
+            Updated health, None if the probe was skipped (no free rate-limit slot)
+        """
+        from .llm_manager import llm_manager
+        health = self._health.setdefault((provider, model), ProbeHealth(provider, model))
+        kwargs = {}
+        if provider == "ollama":
+            # Ollama reloads a model when num_ctx changes: probe with the one
+            # real traffic uses, or every idle-period probe costs two reloads
+            kwargs["num_ctx"] = ollama_client.last_num_ctx(model)
+        llm = llm_manager.get_llm(provider=provider, model=model, temperature=0.0, max_tokens=1, **kwargs)
+        start_time = time.time()
+        try:
+            async with rate_limiter.slot(provider, tokens=1, timeout_ms=100):
+                await asyncio.wait_for(llm.ainvoke("ping"), settings.HEALTH_PROBE_TIMEOUT_SECONDS)
+        except RateLimitExceededError:
+            return None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            health.record(False, error=str(e) or type(e).__name__)
+            logger.warning(f"⚠️ Health probe {provider}:{model} failed: {health.last_error}")
+            return health
+        health.record(True, latency_ms=(time.time() - start_time) * 1000)
+        return health
+
+    async def probe_all(self):
+        """One round: probe every idle target concurrently"""
+        self.rounds += 1
+        due = []
+        for provider, model in self.targets():
+            if self._has_traffic(provider, model):
+                self.backed_off += 1
+            else:
+                due.append(self.probe(provider, model))
+        if due:
+            await asyncio.gather(*due)
+
+    async def _probe_loop(self, interval: int):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.warning(f"⚠️ Health probe round failed: {e}")
+            await asyncio.sleep(interval)
+
+    async def start(self):
+        """Start the background prober"""
+        if self._task is None and settings.ENABLE_HEALTH_PROBES:
+            self._task = asyncio.create_task(self._probe_loop(settings.HEALTH_PROBE_INTERVAL_SECONDS))
+
+    async def stop(self):
+        """Cancel the background prober"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def is_down(self, provider: str, model: str) -> bool:
+        """
+        Recent probes failed and no real request succeeded since
+
+        Needs HEALTH_PROBE_DOWN_AFTER consecutive failures or availability
+        below HEALTH_MIN_AVAILABILITY.
+        """
+        health = self.get(provider, model)
+        if health is None or not health.is_fresh() or health.consecutive_failures == 0:
+            return False
+        outcomes = provider_metrics.get(provider, model).outcomes
+        if outcomes and outcomes[-1][1] and outcomes[-1][0] > health.last_probe_at:
+            return False
+        return (
+            health.consecutive_failures >= settings.HEALTH_PROBE_DOWN_AFTER
+            or health.availability < settings.HEALTH_MIN_AVAILABILITY
+        )
+
+    def latency_ms(self, provider: str, model: str) -> Optional[float]:
+        """Fresh EWMA probe latency (~TTFT of a tiny prompt), None if unknown"""
+        health = self.get(provider, model)
+        if health is None or not health.is_fresh():
+            return None
+        return health.ewma_latency_ms
+
+    def get_stats(self) -> dict:
+        now = time.time()
+        return {
+            "running": self._task is not None,
+            "rounds": self.rounds,
+            "backed_off": self.backed_off,
+            "models": {
+                f"{h.provider}:{h.model}": {
+                    "status": "down" if self.is_down(h.provider, h.model) else "up",
+                    "ewma_latency_ms": round(h.ewma_latency_ms, 1) if h.ewma_latency_ms is not None else None,
+                    "availability": round(h.availability, 3) if h.availability is not None else None,
+                    "probes": h.probes,
+                    "failures": h.failures,
+                    "last_probe_age_s": round(now - h.last_probe_at, 1) if h.last_probe_at else None,
+                    "last_error": h.last_error
+                }
+                for h in self._health.values()
+            }
+        }
+
+
+# Global singleton
+health_prober = HealthProber()
@@ -0,0 +1,215 @@
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+import asyncio
+import logging
+import time
+
+from ..utils.deadline import remaining_seconds
+from ..utils.error_handler import DeadlineExceededError, ModelNotFoundError
+from .generation import chunk_text
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class HedgedResult:
+    """Winner of a hedged request"""
+    output: str
+    provider: str
+    model: str
+    hedged: bool  # Whether a second request was launched
+    ttft_ms: Optional[int]
+    latency_ms: int
+    truncated: bool = False  # Deadline hit; output is the longest partial stream
+
+
+class HedgeStats:
+    """Counters for tuning hedged requests"""
+
+    def __init__(self):
+        self.requests = 0
+        self.hedged = 0
+        self.alternate_wins = 0
+        self.wasted_tokens = 0
+
+    def get_stats(self) -> dict:
+        """Returns hedge rate, alternate win rate and wasted tokens"""
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "alternate_wins": self.alternate_wins,
+            "wasted_tokens": self.wasted_tokens,
+            "hedge_rate": round(self.hedged / self.requests, 4) if self.requests else 0.0,
+            "win_rate": round(self.alternate_wins / self.hedged, 4) if self.hedged else 0.0
+        }
+
+
+class _StreamAttempt:
+    """One streamed generation; tracks first token and chunk count"""
+
+    def __init__(self, runnable: Any, inputs: Any, provider: str, model: str, slot: Any):
+        self.provider = provider
+        self.model = model
+        self.first_token = asyncio.Event()
+        self.ttft_ms: Optional[int] = None
+        self.parts: list[str] = []
+        self._start_time = time.time()
+        self.task = asyncio.create_task(self._consume(runnable, inputs, slot))
+
+    @property
+    def chunks(self) -> int:
+        return len(self.parts)
+
+    def elapsed_ms(self) -> int:
+        return int((time.time() - self._start_time) * 1000)
+
+    async def _consume(self, runnable: Any, inputs: Any, slot: Any) -> str:
+        async with slot:
+            async for chunk in runnable.astream(inputs):
+                if not self.first_token.is_set():
+                    self.ttft_ms = self.elapsed_ms()
+                    self.first_token.set()
+                self.parts.append(chunk_text(chunk))
+        return "".join(self.parts)
+
+
+async def hedged_stream(
+    primary: tuple[Any, str, str],
+    alternate: Optional[tuple[Callable[[], Any], str, str]],
+    inputs: Any,
+    threshold_ms: float,
+    stats: HedgeStats,
+    acquire: Optional[Callable[[str, str], Any]] = None,
+    on_ttft: Optional[Callable[[str, str, int], None]] = None,
+    on_failure: Optional[Callable[[str, str, BaseException], None]] = None
+) -> HedgedResult:
+    """
+    Stream the primary runnable; if no first token arrives within threshold_ms
+    (or the primary fails), start the alternate. First to finish wins and the
+    other is cancelled.
+
+    Args:
+        primary: (runnable, provider, model)
+        alternate: (build, provider, model) or None to disable hedging; build()
+            returns the alternate runnable and is only called if the hedge fires
+        inputs: Runnable input
+        threshold_ms: Time to wait for the primary's first token
+        stats: Counters to update
+        acquire: Optional (provider, model) -> async context manager holding a rate-limit slot
+        on_ttft: Called with (provider, model, ttft_ms) for attempts that did not
+            win. One cancelled before its first token reports the time it
+            waited, a lower bound, so stalls still raise the p95.
+        on_failure: Called with (provider, model, error) for each attempt that
+            failed, or was still pending when the deadline expired
+
+    Returns:
+        HedgedResult from the winning attempt
+    """
+    start_time = time.time()
+    stats.requests += 1
+    acquire = acquire or (lambda provider, model: nullcontext())
+    on_ttft = on_ttft or (lambda provider, model, ttft_ms: None)
+    on_failure = on_failure or (lambda provider, model, error: None)
+    runnable, provider, model = primary
+    attempts = [_StreamAttempt(runnable, inputs, provider, model, acquire(provider, model))]
+    pending = {attempts[0].task: attempts[0]}
+    last_error: Optional[BaseException] = None
+    winner: Optional[_StreamAttempt] = None
+
+    try:
+        if alternate is not None:
+            first_token_wait = asyncio.create_task(attempts[0].first_token.wait())
+            await asyncio.wait(
+                {attempts[0].task, first_token_wait},
+                timeout=threshold_ms / 1000,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            first_token_wait.cancel()
+
+            primary_ok = attempts[0].first_token.is_set() or (
+                attempts[0].task.done() and attempts[0].task.exception() is None
+            )
+            if not primary_ok:
+                if attempts[0].task.done():
+                    # Settle the failed primary now, not in a race with the alternate
+                    del pending[attempts[0].task]
+                    last_error = attempts[0].task.exception()
+                    logger.warning(f"Hedged attempt {attempts[0].provider}:{attempts[0].model} failed: {last_error}")
+                    on_failure(attempts[0].provider, attempts[0].model, last_error)
+                build, provider, model = alternate
+                try:
+                    runnable = build()
+                except ModelNotFoundError as e:
+                    # e.g. HEDGE_ALTERNATE names a provider without credentials
+                    logger.warning(f"Hedge alternate {provider}:{model} unavailable, primary only: {e}")
+                    runnable = None
+                if runnable is not None:
+                    stats.hedged += 1
+                    logger.info(
+                        f"Hedging {attempts[0].provider}:{attempts[0].model} -> {provider}:{model} "
+                        f"after {threshold_ms:.0f}ms"
+                    )
+                    attempts.append(_StreamAttempt(runnable, inputs, provider, model, acquire(provider, model)))
+                    pending[attempts[1].task] = attempts[1]
+
+        while pending:
+            done, _ = await asyncio.wait(
+                pending.keys(),
+                timeout=remaining_seconds(),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                # Deadline expired: return the longest partial stream, cancel the rest
+                best = max(pending.values(), key=lambda attempt: attempt.chunks)
+                if not best.parts:
+                    break
+                winner = best
+                return HedgedResult(
+                    output="".join(best.parts),
+                    provider=best.provider,
+                    model=best.model,
+                    hedged=len(attempts) > 1,
+                    ttft_ms=best.ttft_ms,
+                    latency_ms=int((time.time() - start_time) * 1000),
+                    truncated=True
+                )
+            for task in done:
+                attempt = pending.pop(task)
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    logger.warning(f"Hedged attempt {attempt.provider}:{attempt.model} failed: {last_error}")
+                    on_failure(attempt.provider, attempt.model, last_error)
+                    if attempt.ttft_ms is not None:
+                        on_ttft(attempt.provider, attempt.model, attempt.ttft_ms)
+                    continue
+
+                winner = attempt
+                if attempt is not attempts[0]:
+                    stats.alternate_wins += 1
+                return HedgedResult(
+                    output=task.result(),
+                    provider=attempt.provider,
+                    model=attempt.model,
+                    hedged=len(attempts) > 1,
+                    ttft_ms=attempt.ttft_ms,
+                    latency_ms=int((time.time() - start_time) * 1000)
+                )
+    finally:
+        # Cancel the loser (or everything, if we were cancelled) and count
+        # what it generated for nothing
+        for task, attempt in pending.items():
+            task.cancel()
+            stats.wasted_tokens += attempt.chunks
+            if attempt is winner:
+                continue
+            if attempt.ttft_ms is not None:
+                on_ttft(attempt.provider, attempt.model, attempt.ttft_ms)
+            elif winner is not None:
+                on_ttft(attempt.provider, attempt.model, attempt.elapsed_ms())
+
+    # Anything still pending ran out of time
+    deadline_error = DeadlineExceededError("Deadline expired before the model produced any output")
+    for attempt in pending.values():
+        on_failure(attempt.provider, attempt.model, deadline_error)
+    raise last_error or deadline_error
@@ -1,26 +1,39 @@
-from typing import Optional, Literal, Union
-from langchain_ollama import OllamaLLM
-from langchain_groq import ChatGroq
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_openai import ChatOpenAI
+from typing import TYPE_CHECKING, Any, Callable, Optional, Literal, Union
 from langchain_core.language_models import BaseLanguageModel
+import functools
 import logging
 
 from ..config import settings, PROVIDER_MODELS
 from ..utils.error_handler import ModelNotFoundError
+from .llm_pool import LLMPool, make_pool_key
+from .mock_llm import MockLLM
+from .ollama_client import ollama_client
+from .hedging import HedgeStats, HedgedResult, hedged_stream
+from .metrics import provider_metrics, percentile
+from .rate_limiter import rate_limiter
+from .tier_selector import tier_selector
+
+if TYPE_CHECKING:
+    # Provider SDKs are imported on first use of each provider (cold start)
+    from langchain_ollama import OllamaLLM
+    from langchain_groq import ChatGroq
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_openai import ChatOpenAI
 
 logger = logging.getLogger(__name__)
 
-ProviderType = Literal["ollama", "groq", "gemini", "openai"]
+ProviderType = Literal["ollama", "groq", "gemini", "openai", "mock"]
 
 class LLMManager:
     """
     Unified manager for multiple LLM providers
-    Supports Ollama (local), Groq, Gemini, and OpenAI
+    Supports Ollama (local), Groq, Gemini, OpenAI and an offline mock
     """
     
     def __init__(self):
         self.default_provider = settings.DEFAULT_PROVIDER
+        self.pool = LLMPool(max_size=settings.LLM_POOL_SIZE)
+        self.hedge_stats = HedgeStats()
         self._validate_api_keys()
     
     def _validate_api_keys(self):
@@ -43,6 +56,9 @@ class LLMManager:
         """
         Get configured LLM from any provider
         
+        Instances are pooled per (provider, model, temperature, max_tokens, kwargs)
+        so repeated calls reuse the same client and HTTP connection pool.
+        
         Args:
             provider: Which provider to use (ollama/groq/gemini/openai)
             model: Specific model name (optional, uses defaults)
@@ -51,7 +67,7 @@ class LLMManager:
             **kwargs: Provider-specific parameters
             
         Returns:
-            Configured LangChain LLM instance
+            Configured (possibly shared) LangChain LLM instance
             
         Raises:
             ModelNotFoundError: If provider/model not available
@@ -60,18 +76,126 @@ class LLMManager:
         temperature = temperature if temperature is not None else settings.TEMPERATURE
         max_tokens = max_tokens if max_tokens is not None else settings.MAX_TOKENS
         
-        logger.info(f"Creating LLM: provider={provider}, model={model}")
-        
         if provider == "ollama":
-            return self._get_ollama_llm(model, temperature, max_tokens, **kwargs)
+            factory = self._get_ollama_llm
         elif provider == "groq":
-            return self._get_groq_llm(model, temperature, max_tokens, **kwargs)
+            factory = self._get_groq_llm
         elif provider == "gemini":
-            return self._get_gemini_llm(model, temperature, max_tokens, **kwargs)
+            factory = self._get_gemini_llm
         elif provider == "openai":
-            return self._get_openai_llm(model, temperature, max_tokens, **kwargs)
+            factory = self._get_openai_llm
+        elif provider == "mock":
+            factory = self._get_mock_llm
         else:
             raise ModelNotFoundError(f"Unknown provider: {provider}")
+        
+        if provider == "ollama":
+            ollama_client.mark_used(
+                model or PROVIDER_MODELS["ollama"]["fast"],
+                num_ctx=kwargs.get("num_ctx", settings.MAX_LOCAL_CONTEXT)
+            )
+        else:
+            kwargs.pop("num_ctx", None)  # Ollama-only; cloud context windows are fixed
+        
+        key = make_pool_key(provider, model, temperature, max_tokens, **kwargs)
+        
+        def create():
+            logger.info(f"Creating LLM: provider={provider}, model={model}")
+            return factory(model, temperature, max_tokens, **kwargs)
+        
+        return self.pool.get_or_create(key, create)
+    
+    def get_pool_stats(self) -> dict:
+        """Returns LLM instance pool size and hit/miss counters"""
+        return self.pool.get_stats()
+    
+    def get_hedge_threshold_ms(self, provider: str, model: str) -> float:
+        """Hedge delay: observed p95 time-to-first-token, clamped to configured bounds"""
+        p95_ttft = percentile(provider_metrics.get(provider, model).recent_ttfts(), 95)
+        if p95_ttft is None:
+            return settings.HEDGE_DEFAULT_DELAY_MS
+        return min(max(p95_ttft, settings.HEDGE_MIN_DELAY_MS), settings.HEDGE_MAX_DELAY_MS)
+    
+    async def hedged_invoke(
+        self,
+        build: Callable[[BaseLanguageModel], Any],
+        inputs: Any,
+        primary: tuple[str, str],
+        alternate: Optional[tuple[str, str]] = None,
+        threshold_ms: Optional[float] = None,
+        alternate_kwargs: Optional[dict] = None,
+        slot_tokens: Optional[dict[tuple[str, str], int]] = None,
+        coalesced: bool = False,
+        on_ttft: Optional[Callable[[str, str, int], None]] = None,
+        on_failure: Optional[Callable[[str, str, BaseException], None]] = None,
+        **kwargs
+    ) -> HedgedResult:
+        """
+        Run a streaming runnable with a hedged backup request
+        
+        If the primary hasn't produced a first token within threshold_ms,
+        the same runnable is started on the alternate provider/model. The
+        first to finish wins; the other is cancelled.
+        
+        Args:
+            build: Callable that turns an LLM into a runnable (e.g. prompt | llm | parser)
+            inputs: Runnable input
+            primary: (provider, model) to try first
+            alternate: (provider, model) to hedge to, None to disable hedging
+            threshold_ms: Hedge delay, defaults to get_hedge_threshold_ms(primary)
+            alternate_kwargs: get_llm kwargs for the alternate, defaults to kwargs
+            slot_tokens: (provider, model) -> tokens/min charge (prompt + output),
+                defaults to max_tokens
+            coalesced: build(llm, acquire) takes the rate-limit slot itself,
+                see provider_chain.run
+            on_ttft, on_failure: Per-attempt callbacks, see hedged_stream
+            **kwargs: Passed to get_llm (temperature, max_tokens, ...)
+            
+        Returns:
+            HedgedResult with the winning output and which provider served it
+        """
+        if threshold_ms is None:
+            threshold_ms = self.get_hedge_threshold_ms(*primary)
+        
+        alternate_kwargs = kwargs if alternate_kwargs is None else alternate_kwargs
+        slot_tokens = dict(slot_tokens or {})
+        slot_tokens.setdefault(primary, kwargs.get("max_tokens") or settings.MAX_TOKENS)
+        if alternate is not None:
+            slot_tokens.setdefault(alternate, alternate_kwargs.get("max_tokens") or settings.MAX_TOKENS)
+        
+        def acquire(provider: str, model: str):
+            return functools.partial(rate_limiter.slot, provider, tokens=slot_tokens[(provider, model)])
+        
+        def build_for(provider: str, model: str, llm_kwargs: dict):
+            llm = self.get_llm(provider=provider, model=model, **llm_kwargs)
+            if not coalesced:
+                return build(llm)
+            return build(llm, acquire(provider, model))
+        
+        primary_runnable = build_for(*primary, kwargs)
+        alternate_attempt = None
+        if alternate is not None:
+            # Built only if the hedge fires: an alternate without credentials
+            # must not fail a primary that answers in time
+            alternate_attempt = (
+                lambda: build_for(*alternate, alternate_kwargs),
+                *alternate
+            )
+        
+        return await hedged_stream(
+            (primary_runnable, *primary),
+            alternate_attempt,
+            inputs,
+            threshold_ms,
+            self.hedge_stats,
+            acquire=None if coalesced else (lambda provider, model: acquire(provider, model)()),
+            on_ttft=on_ttft,
+            on_failure=on_failure
+        )
+    
+    def get_hedge_stats(self) -> dict:
+        """Returns hedge rate, win rate and wasted tokens"""
+        return self.hedge_stats.get_stats()
     
     def _get_ollama_llm(
         self, 
@@ -79,16 +203,22 @@ class LLMManager:
         temperature: float,
         max_tokens: int,
         **kwargs
-    ) -> OllamaLLM:
-        """Create Ollama LLM instance"""
+    ) -> "OllamaLLM":
+        """Create Ollama LLM instance on the shared Ollama connection pool"""
         model_name = model or PROVIDER_MODELS["ollama"]["fast"]
+        num_ctx = kwargs.pop("num_ctx", settings.MAX_LOCAL_CONTEXT)
+        keep_alive = kwargs.pop("keep_alive", settings.OLLAMA_KEEP_ALIVE)
+        
+        from langchain_ollama import OllamaLLM
         
         return OllamaLLM(
             base_url=settings.OLLAMA_BASE_URL,
             model=model_name,
             temperature=temperature,
             num_predict=max_tokens,
-            num_ctx=kwargs.get("num_ctx", 4096),
+            num_ctx=num_ctx,
+            keep_alive=keep_alive,
+            async_client_kwargs=ollama_client.get_async_client_kwargs(),
             **kwargs
         )
     
@@ -98,7 +228,7 @@ class LLMManager:
         temperature: float,
         max_tokens: int,
         **kwargs
-    ) -> ChatGroq:
+    ) -> "ChatGroq":
         """Create Groq LLM instance"""
         if not settings.GROQ_API_KEY:
             raise ModelNotFoundError(
@@ -107,6 +237,8 @@ class LLMManager:
         
         model_name = model or PROVIDER_MODELS["groq"]["fast"]
         
+        from langchain_groq import ChatGroq
+        
         return ChatGroq(
             groq_api_key=settings.GROQ_API_KEY,
             model_name=model_name,
@@ -121,7 +253,7 @@ class LLMManager:
         temperature: float,
         max_tokens: int,
         **kwargs
-    ) -> ChatGoogleGenerativeAI:
+    ) -> "ChatGoogleGenerativeAI":
         """Create Gemini LLM instance"""
         if not settings.GOOGLE_API_KEY:
             raise ModelNotFoundError(
@@ -130,6 +262,8 @@ class LLMManager:
         
         model_name = model or PROVIDER_MODELS["gemini"]["fast"]
         
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        
         return ChatGoogleGenerativeAI(
             google_api_key=settings.GOOGLE_API_KEY,
             model=model_name,
@@ -144,7 +278,7 @@ class LLMManager:
         temperature: float,
         max_tokens: int,
         **kwargs
-    ) -> ChatOpenAI:
+    ) -> "ChatOpenAI":
         """Create OpenAI LLM instance"""
         if not settings.OPENAI_API_KEY:
             raise ModelNotFoundError(
@@ -153,6 +287,8 @@ class LLMManager:
         
         model_name = model or PROVIDER_MODELS["openai"]["fast"]
         
+        from langchain_openai import ChatOpenAI
+        
         return ChatOpenAI(
             openai_api_key=settings.OPENAI_API_KEY,
             model_name=model_name,
@@ -161,14 +297,33 @@ class LLMManager:
             **kwargs
         )
     
+    def _get_mock_llm(
+        self,
+        model: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        **kwargs
+    ) -> MockLLM:
+        """Create offline mock LLM (timings from MOCK_* settings unless overridden)"""
+        return MockLLM(
+            model=model or PROVIDER_MODELS["mock"]["fast"],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+    
     def list_available_providers(self) -> dict:
-        """Returns which providers are currently available"""
-        print(bool(settings.GROQ_API_KEY))   
+        """
+        Returns which providers are configured (credentials present)
+        
+        Says nothing about current health; see health_prober for that.
+        """
         return {
             "ollama": True,  # Assume always available if running
             "groq": bool(settings.GROQ_API_KEY),
             "gemini": bool(settings.GOOGLE_API_KEY),
-            "openai": bool(settings.OPENAI_API_KEY)
+            "openai": bool(settings.OPENAI_API_KEY),
+            "mock": True  # Offline; only used when requested or as DEFAULT_PROVIDER
         }
     
     def get_model_for_tier(
@@ -189,6 +344,30 @@ class LLMManager:
         provider = provider or self.default_provider
         return PROVIDER_MODELS[provider][tier]
 
+    def get_model_for_budget(
+        self,
+        budget_ms: float,
+        provider: Optional[ProviderType] = None,
+        prompt_tokens: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        default_tier: Literal["fast", "balanced", "quality"] = "fast"
+    ) -> str:
+        """
+        Get the best-quality model expected to answer within a latency budget
+        
+        Args:
+            budget_ms: Latency budget, e.g. 800 for inline completion
+            provider: Which provider to use
+            prompt_tokens: Prompt size
+            max_tokens: Output budget
+            default_tier: Tier used until rolling metrics exist
+            
+        Returns:
+            Model name (see TierSelector)
+        """
+        provider = provider or self.default_provider
+        return tier_selector.select_model(provider, budget_ms, prompt_tokens, max_tokens, default_tier)
+
 
 # Global singleton
 llm_manager = LLMManager()
@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value: Any) -> Hashable:
+    """Turn kwargs values (dicts, lists, sets) into a hashable form for pool keys"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(v) for v in value))
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return repr(value)
+
+
+def make_pool_key(
+    provider: str,
+    model: Optional[str],
+    temperature: float,
+    max_tokens: int,
+    **kwargs
+) -> tuple:
+    """Build the pool key for an LLM configuration"""
+    return (provider, model, float(temperature), int(max_tokens), _freeze(kwargs))
+
+
+class LLMPool:
+    """
+    Bounded LRU pool of ready-to-use LLM instances
+    Reusing an instance also reuses its underlying HTTP client and connection pool
+    """
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self._instances: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, key: tuple, factory: Callable[[], Any]) -> Any:
+        """
+        Return pooled instance for key, creating it with factory on a miss
+
+        Args:
+            key: Pool key from make_pool_key
+            factory: Zero-arg callable that builds the LLM instance
+
+        Returns:
+            Pooled LLM instance
+        """
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is not None:
+                self._instances.move_to_end(key)
+                self.hits += 1
+                return instance
+            self.misses += 1
+
+        # Build outside the lock - construction can be slow (client setup, validation)
+        instance = factory()
+
+        with self._lock:
+            existing = self._instances.get(key)
+            if existing is not None:
+                # Another caller raced us; keep the first instance
+                self._instances.move_to_end(key)
+                return existing
+
+            self._instances[key] = instance
+            while len(self._instances) > self.max_size:
+                evicted_key, _ = self._instances.popitem(last=False)
+                self.evictions += 1
+                logger.debug(f"Evicted pooled LLM: {evicted_key[:2]}")
+
+        return instance
+
+    def clear(self):
+        """Drop all pooled instances"""
+        with self._lock:
+            self._instances.clear()
+
+    def get_stats(self) -> dict:
+        """Returns pool size and hit/miss counters"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._instances),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
@@ -0,0 +1,164 @@
+from collections import deque
+from typing import Optional
+import threading
+import time
+
+from ..config import settings
+
+
+def percentile(values: list[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of values (None if empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class ModelStats:
+    """
+    Rolling window of recent outcomes for one (provider, model)
+    Samples older than METRICS_MAX_AGE_SECONDS are ignored so that a
+    provider that was slow a while ago gets another chance.
+    """
+
+    def __init__(self, window: int):
+        self.latencies: deque = deque(maxlen=window)  # (timestamp, latency_ms)
+        self.ttfts: deque = deque(maxlen=window)  # (timestamp, ttft_ms)
+        self.outcomes: deque = deque(maxlen=window)  # (timestamp, ok)
+        self.throughputs: deque = deque(maxlen=window)  # (timestamp, output tokens/sec)
+        self.prefill_rates: deque = deque(maxlen=window)  # (timestamp, TTFT ms per prompt token)
+        self.output_tokens: deque = deque(maxlen=window)  # (timestamp, output tokens)
+        self.total_requests = 0
+        self.total_errors = 0
+        self.last_error: Optional[str] = None
+
+    def _recent(self, samples: deque) -> list:
+        cutoff = time.time() - settings.METRICS_MAX_AGE_SECONDS
+        return [value for ts, value in samples if ts >= cutoff]
+
+    def recent_latencies(self) -> list[float]:
+        return self._recent(self.latencies)
+
+    def recent_ttfts(self) -> list[float]:
+        return self._recent(self.ttfts)
+
+    def recent_throughputs(self) -> list[float]:
+        return self._recent(self.throughputs)
+
+    def recent_prefill_rates(self) -> list[float]:
+        return self._recent(self.prefill_rates)
+
+    def recent_output_tokens(self) -> list[float]:
+        return self._recent(self.output_tokens)
+
+    def sample_count(self) -> int:
+        return len(self._recent(self.outcomes))
+
+    def error_rate(self) -> float:
+        outcomes = self._recent(self.outcomes)
+        if not outcomes:
+            return 0.0
+        return outcomes.count(False) / len(outcomes)
+
+    def to_dict(self) -> dict:
+        latencies = self.recent_latencies()
+        ttfts = self.recent_ttfts()
+        return {
+            "samples": self.sample_count(),
+            "p50_latency_ms": percentile(latencies, 50),
+            "p95_latency_ms": percentile(latencies, 95),
+            "p95_ttft_ms": percentile(ttfts, 95),
+            "p50_tokens_per_sec": percentile(self.recent_throughputs(), 50),
+            "error_rate": round(self.error_rate(), 4),
+            "total_requests": self.total_requests,
+            "total_errors": self.total_errors,
+            "last_error": self.last_error
+        }
+
+
+class ProviderMetrics:
+    """Rolling latency / error-rate tracker keyed by (provider, model)"""
+
+    def __init__(self, window: int = settings.METRICS_WINDOW):
+        self.window = window
+        self._stats: dict[tuple[str, str], ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, model: str) -> ModelStats:
+        """Returns (creating if needed) the stats for a provider/model"""
+        key = (provider, model)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = ModelStats(self.window)
+            return self._stats[key]
+
+    def record_success(
+        self,
+        provider: str,
+        model: str,
+        latency_ms: float,
+        ttft_ms: Optional[float] = None,
+        output_tokens: Optional[int] = None,
+        prompt_tokens: Optional[int] = None
+    ):
+        """
+        Record a successful call
+
+        Args:
+            provider: Provider name
+            model: Model name
+            latency_ms: Total latency
+            ttft_ms: Time to first token (streamed calls)
+            output_tokens: Tokens generated, for tokens/sec
+            prompt_tokens: Prompt size, for TTFT per prompt token
+        """
+        stats = self.get(provider, model)
+        now = time.time()
+        stats.latencies.append((now, latency_ms))
+        if ttft_ms is not None:
+            stats.ttfts.append((now, ttft_ms))
+            if prompt_tokens:
+                stats.prefill_rates.append((now, ttft_ms / prompt_tokens))
+        if output_tokens:
+            stats.output_tokens.append((now, output_tokens))
+            decode_ms = latency_ms - (ttft_ms or 0)
+            if output_tokens > 1 and decode_ms > 0:
+                stats.throughputs.append((now, (output_tokens - 1) / (decode_ms / 1000)))
+        stats.outcomes.append((now, True))
+        stats.total_requests += 1
+
+    def record_ttft(self, provider: str, model: str, ttft_ms: float):
+        """
+        Record a time to first token from a call that didn't complete
+
+        E.g. a hedged primary that lost the race: its TTFT still counts
+        towards the p95 the hedge delay is derived from.
+        """
+        self.get(provider, model).ttfts.append((time.time(), ttft_ms))
+
+    def record_failure(self, provider: str, model: str, error: str):
+        """Record a failed call"""
+        stats = self.get(provider, model)
+        stats.outcomes.append((time.time(), False))
+        stats.total_requests += 1
+        stats.total_errors += 1
+        stats.last_error = error[:200]
+
+    def p95_latency(self, provider: str, model: str) -> Optional[float]:
+        """p95 latency in ms over the recent window (None without data)"""
+        return percentile(self.get(provider, model).recent_latencies(), 95)
+
+    def error_rate(self, provider: str, model: str) -> float:
+        """Fraction of recent calls that failed"""
+        return self.get(provider, model).error_rate()
+
+    def get_stats(self) -> dict:
+        """Returns all tracked stats as {"provider:model": {...}}"""
+        with self._lock:
+            items = list(self._stats.items())
+        return {f"{provider}:{model}": stats.to_dict() for (provider, model), stats in items}
+
+
+# Global singleton
+provider_metrics = ProviderMetrics()
@@ -0,0 +1,171 @@
+from typing import Any, AsyncIterator, Iterator, List, Optional
+import asyncio
+import random
+import re
+import time
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from pydantic import PrivateAttr
+
+from ..config import settings
+from ..utils.error_handler import MockProviderError
+
+# Canned responses by request shape, picked by detect_kind()
+CANNED_RESPONSES = {
+    "completion": "return a + b",
+    "routing": "explain",
+    "code": (
+        "def process(items):\n"
+        "    results = []\n"
+        "    for item in items:\n"
+        "        if item is None:\n"
+        "            continue\n"
+        "        results.append(item)\n"
+        "    return results\n"
+    ),
+    "text": (
+        "This code iterates over the input, skips missing values and collects "
+        "the rest into a new list, which it returns. The loop runs once per item, "
+        "so the cost grows linearly with the input size."
+    ),
+}
+
+_TOKEN_RE = re.compile(r"\s*\S+|\s+")
+
+
+def detect_kind(prompt: str) -> str:
+    """Rough request shape so each endpoint gets a plausible canned answer"""
+    if "Respond with ONLY the agent name" in prompt:
+        return "routing"
+    if "<CURSOR>" in prompt:
+        return "completion"
+    if re.search(r"refactor|fix|document|docstring", prompt, re.IGNORECASE):
+        return "code"
+    return "text"
+
+
+class MockLLM(LLM):
+    """
+    Deterministic offline LLM for benchmarks and load tests
+
+    Streams canned (or MOCK_RESPONSE-templated) text with a configurable
+    time to first token, tokens/sec, jitter and injected failures. The
+    random sequence is seeded, so a run is reproducible for a given
+    request order.
+    """
+
+    model: str = "mock-fast"
+    temperature: float = 0.1
+    max_tokens: int = 1024
+    ttft_ms: float = settings.MOCK_TTFT_MS
+    tokens_per_sec: float = settings.MOCK_TOKENS_PER_SEC
+    jitter: float = settings.MOCK_JITTER
+    error_rate: float = settings.MOCK_ERROR_RATE
+    seed: int = settings.MOCK_SEED
+    response: Optional[str] = settings.MOCK_RESPONSE
+
+    _rng: random.Random = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock-llm"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {
+            "model": self.model,
+            "ttft_ms": self.ttft_ms,
+            "tokens_per_sec": self.tokens_per_sec
+        }
+
+    def _response_tokens(self, prompt: str) -> list[str]:
+        if self.response is not None:
+            text = self.response.format(model=self.model, prompt_chars=len(prompt))
+        else:
+            text = CANNED_RESPONSES[detect_kind(prompt)]
+        return _TOKEN_RE.findall(text)[:self.max_tokens]
+
+    def _delay(self, seconds: float) -> float:
+        """seconds +/- jitter (fraction), never negative"""
+        if self.jitter:
+            seconds *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, seconds)
+
+    def _plan(self, prompt: str) -> tuple[list[str], float, float, Optional[int]]:
+        """Tokens, TTFT, per-token delay and the index to fail at (None = no failure)"""
+        tokens = self._response_tokens(prompt)
+        ttft = self._delay(self.ttft_ms / 1000)
+        per_token = 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        fail_at = None
+        if self.error_rate and self._rng.random() < self.error_rate:
+            fail_at = self._rng.randrange(len(tokens) + 1)
+        return tokens, ttft, per_token, fail_at
+
+    def _fail(self):
+        raise MockProviderError(f"Injected failure from mock provider ({self.model})")
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> Iterator[GenerationChunk]:
+        tokens, ttft, per_token, fail_at = self._plan(prompt)
+        time.sleep(ttft)
+        for i, token in enumerate(tokens):
+            if i == fail_at:
+                self._fail()
+            if i:
+                time.sleep(self._delay(per_token))
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+        if fail_at == len(tokens):
+            self._fail()
+
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> AsyncIterator[GenerationChunk]:
+        tokens, ttft, per_token, fail_at = self._plan(prompt)
+        await asyncio.sleep(ttft)
+        for i, token in enumerate(tokens):
+            if i == fail_at:
+                self._fail()
+            if i:
+                await asyncio.sleep(self._delay(per_token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+            yield GenerationChunk(text=token)
+        if fail_at == len(tokens):
+            self._fail()
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> str:
+        return "".join(chunk.text for chunk in self._stream(prompt, stop, run_manager, **kwargs))
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any
+    ) -> str:
+        parts = []
+        async for chunk in self._astream(prompt, stop, run_manager, **kwargs):
+            parts.append(chunk.text)
+        return "".join(parts)
@@ -1,16 +1,96 @@
-from langchain_ollama import OllamaLLM
-from typing import Optional, AsyncGenerator
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from typing import TYPE_CHECKING, Any, Callable, Optional, AsyncGenerator
+import asyncio
 import httpx
 import logging
-from ..config import settings
-from ..utils.error_handler import OllamaConnectionError, ModelNotFoundError
+import orjson
+import time
+from ..config import settings, OLLAMA_MODELS
+from ..utils.error_handler import OllamaConnectionError, OllamaGenerationError, ModelNotFoundError
+from .context_sizing import choose_num_ctx
+from .metrics import percentile
+
+if TYPE_CHECKING:
+    from langchain_ollama import OllamaLLM
 
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class NativeGenerationStats:
+    """Timing reported for one native /api/generate or /api/chat call"""
+    model: str
+    ttft_ms: Optional[int] = None
+    total_ms: Optional[int] = None
+    load_ms: Optional[int] = None
+    prompt_tokens: int = 0
+    prompt_eval_ms: Optional[int] = None
+    output_tokens: int = 0
+    eval_ms: Optional[int] = None
+    tokens_per_sec: Optional[float] = None
+    done_reason: Optional[str] = None
+    context: Optional[list[int]] = field(default=None, repr=False)  # KV-cache handle from /api/generate
+    
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data.pop("context")
+        return data
+
+
+class NativeOllamaStream:
+    """
+    Runnable-like wrapper over a native Ollama call
+    Exposes astream() so collect_stream() can drive it, and keeps the
+    call's timing in .stats once the stream finishes.
+    """
+    
+    def __init__(
+        self,
+        client: "OllamaClient",
+        endpoint: str,
+        model: str,
+        prepare: Optional[Callable[[Any], Any]] = None,
+        on_done: Optional[Callable[["NativeOllamaStream"], None]] = None,
+        **payload
+    ):
+        self._client = client
+        self._endpoint = endpoint
+        self._model = model
+        self._prepare = prepare
+        self._on_done = on_done
+        self._payload = payload
+        self.stats = NativeGenerationStats(model=model)
+        self.parts: list[str] = []
+    
+    @property
+    def text(self) -> str:
+        """Text streamed so far"""
+        return "".join(self.parts)
+    
+    async def astream(self, inputs: Any) -> AsyncGenerator[str, None]:
+        if self._prepare is not None:
+            inputs = self._prepare(inputs)
+        if self._endpoint == "chat":
+            stream = self._client.stream_chat(inputs, model=self._model, stats=self.stats, **self._payload)
+        else:
+            stream = self._client.stream_generate(inputs, model=self._model, stats=self.stats, **self._payload)
+        
+        async for chunk in stream:
+            self.parts.append(chunk)
+            yield chunk
+        
+        # Only reached when the model finished (not on cancellation)
+        if self._on_done is not None:
+            self._on_done(self)
+
 class OllamaClient:
     """
     Manages Ollama connections and LLM instances
     Handles model verification, streaming, and error recovery
+    
+    Owns one long-lived keep-alive HTTP/1.1 connection pool that is shared by
+    health checks and by every OllamaLLM generation the backend makes.
     """
     
     def __init__(
@@ -21,6 +101,88 @@ class OllamaClient:
         self.base_url = base_url
         self.default_model = default_model
         self._available_models = []
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._warm_models: dict[str, dict] = {}
+        self._last_used: dict[str, float] = {}
+        self._last_num_ctx: dict[str, int] = {}
+        self._rewarm_task: Optional[asyncio.Task] = None
+        self._inventory_refreshed_at: Optional[float] = None
+        self._inventory_error: Optional[str] = None
+        self._inventory_reachable: Optional[bool] = None  # Last refresh outcome, for change-only logs
+        self._inventory_task: Optional[asyncio.Task] = None
+        self._native_calls: deque = deque(maxlen=settings.METRICS_WINDOW)
+    
+    async def start(self):
+        """Create the shared connection pool (called on FastAPI startup)"""
+        if self._http_client is not None:
+            return
+        
+        limits = httpx.Limits(
+            max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY
+        )
+        self._transport = httpx.AsyncHTTPTransport(limits=limits, http1=True, http2=False)
+        self._http_client = httpx.AsyncClient(
+            base_url=self.base_url,
+            transport=self._transport,
+            timeout=httpx.Timeout(settings.TIMEOUT_SECONDS, connect=5.0)
+        )
+        logger.info(
+            f"Ollama connection pool ready "
+            f"(max={settings.OLLAMA_MAX_CONNECTIONS}, "
+            f"keepalive={settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS})"
+        )
+    
+    async def close(self):
+        """Close the shared connection pool (called on FastAPI shutdown)"""
+        await self.stop_keep_warm()
+        await self.stop_inventory_refresh()
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._http_client = None
+        self._transport = None
+    
+    async def get_http_client(self) -> httpx.AsyncClient:
+        """Returns the shared client, creating the pool on first use"""
+        if self._http_client is None:
+            await self.start()
+        return self._http_client
+    
+    @property
+    def transport(self) -> Optional[httpx.AsyncHTTPTransport]:
+        """Shared transport for LangChain/ollama clients, None until started"""
+        return self._transport
+    
+    def get_async_client_kwargs(self) -> dict:
+        """kwargs that make an ollama.AsyncClient reuse the shared connection pool"""
+        if self._transport is None:
+            return {}
+        return {"transport": self._transport}
+        
+    async def _fetch_inventory(self):
+        """GET /api/tags into the cached inventory (OllamaConnectionError on failure)"""
+        client = await self.get_http_client()
+        
+        try:
+            response = await client.get("/api/tags", timeout=5.0)
+            response.raise_for_status()
+            models_data = response.json()
+        except httpx.ConnectError:
+            self._inventory_error = "Ollama server not running"
+            raise OllamaConnectionError(
+                "Ollama server not running. Start with: ollama serve"
+            )
+        except Exception as e:
+            self._inventory_error = str(e)
+            raise OllamaConnectionError(f"Failed to connect to Ollama: {str(e)}")
+        
+        self._available_models = [
+            model["name"] for model in models_data.get("models", [])
+        ]
+        self._inventory_refreshed_at = time.time()
+        self._inventory_error = None
         
     async def verify_connection(self) -> bool:
         """
@@ -33,29 +195,233 @@ class OllamaClient:
             OllamaConnectionError: If connection fails
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=5.0
-                )
-                response.raise_for_status()
-                
-                models_data = response.json()
-                self._available_models = [
-                    model["name"] for model in models_data.get("models", [])
-                ]
-                
+            await self._fetch_inventory()
+        except OllamaConnectionError as e:
+            logger.error(f"Ollama connection error: {e}")
+            raise
+        
+        logger.info(f"✓ Ollama connected. Models: {self._available_models}")
+        return True
+    
+    async def refresh_inventory(self) -> bool:
+        """
+        Re-read the model inventory, logging only when something changed
+        
+        Used by the background refresher: Ollama coming up or going away, and
+        models being pulled or removed, are logged once rather than every
+        OLLAMA_INVENTORY_TTL_SECONDS.
+        
+        Returns:
+            bool: True if Ollama answered
+        """
+        previous_models = self._available_models
+        try:
+            await self._fetch_inventory()
+            reachable = True
+        except OllamaConnectionError:
+            reachable = False  # Error is recorded on the snapshot; keep the last model list
+        
+        if reachable != self._inventory_reachable:
+            if reachable:
                 logger.info(f"✓ Ollama connected. Models: {self._available_models}")
-                return True
-                
-        except httpx.ConnectError:
-            logger.error("Ollama server not running")
-            raise OllamaConnectionError(
-                "Ollama server not running. Start with: ollama serve"
+            else:
+                logger.warning(f"⚠️ Ollama unreachable: {self._inventory_error}")
+        elif reachable and self._available_models != previous_models:
+            logger.info(f"Ollama models changed: {self._available_models}")
+        self._inventory_reachable = reachable
+        return reachable
+    
+    async def _inventory_refresh_loop(self, interval: int):
+        """Keep the cached model inventory fresh without blocking requests"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh_inventory()
+    
+    async def start_inventory_refresh(self):
+        """Load the model inventory now, then refresh it in the background"""
+        if self._inventory_task is None:
+            await self.refresh_inventory()
+            self._inventory_task = asyncio.create_task(
+                self._inventory_refresh_loop(settings.OLLAMA_INVENTORY_TTL_SECONDS)
+            )
+    
+    async def stop_inventory_refresh(self):
+        """Cancel the background /api/tags refresher"""
+        if self._inventory_task is None:
+            return
+        self._inventory_task.cancel()
+        try:
+            await self._inventory_task
+        except asyncio.CancelledError:
+            pass
+        self._inventory_task = None
+    
+    def is_inventory_stale(self) -> bool:
+        """True if the cached inventory is missing or older than two refresh intervals"""
+        if self._inventory_refreshed_at is None:
+            return True
+        age = time.time() - self._inventory_refreshed_at
+        return age > 2 * settings.OLLAMA_INVENTORY_TTL_SECONDS
+    
+    def get_inventory_snapshot(self) -> dict:
+        """
+        Cached model inventory with staleness info (no network call)
+        
+        Returns:
+            dict: models, refreshed_at, age_seconds, stale, reachable, error
+        """
+        refreshed_at = self._inventory_refreshed_at
+        age = time.time() - refreshed_at if refreshed_at is not None else None
+        return {
+            "models": list(self._available_models),
+            "refreshed_at": refreshed_at,
+            "age_seconds": round(age, 2) if age is not None else None,
+            "stale": self.is_inventory_stale(),
+            "reachable": refreshed_at is not None and self._inventory_error is None,
+            "error": self._inventory_error
+        }
+    
+    def get_warmup_models(self) -> list[str]:
+        """Model names for the tiers listed in OLLAMA_WARMUP_TIERS (deduplicated)"""
+        models = []
+        for tier in settings.OLLAMA_WARMUP_TIERS:
+            model_name = OLLAMA_MODELS.get(tier, {}).get("name")
+            if model_name and model_name not in models:
+                models.append(model_name)
+        return models
+    
+    async def warm_model(self, model_name: str) -> dict:
+        """
+        Load a model into memory and pin it with keep_alive
+        
+        An empty-prompt /api/generate call makes Ollama load the model
+        without generating any tokens.
+        
+        Args:
+            model_name: Ollama model to load
+            
+        Returns:
+            dict: Warm-up result with load time in ms
+        """
+        client = await self.get_http_client()
+        start_time = time.time()
+        
+        try:
+            response = await client.post(
+                "/api/generate",
+                json={"model": model_name, "keep_alive": settings.OLLAMA_KEEP_ALIVE},
+                timeout=httpx.Timeout(None, connect=5.0)  # Big models can take minutes to load
             )
+            response.raise_for_status()
+            data = response.json()
+            
+            result = {
+                "ok": True,
+                "load_ms": int(data.get("load_duration", 0) / 1_000_000),
+                "total_ms": int((time.time() - start_time) * 1000),
+                "warmed_at": time.time()
+            }
+            logger.info(f"🔥 Warmed {model_name}: load {result['load_ms']}ms")
+            
         except Exception as e:
-            logger.error(f"Ollama connection error: {e}")
-            raise OllamaConnectionError(f"Failed to connect to Ollama: {str(e)}")
+            result = {
+                "ok": False,
+                "error": str(e),
+                "total_ms": int((time.time() - start_time) * 1000),
+                "warmed_at": time.time()
+            }
+            logger.warning(f"⚠ Warm-up failed for {model_name}: {e}")
+        
+        self._warm_models[model_name] = result
+        return result
+    
+    async def warm_up(self) -> dict:
+        """
+        Load every configured tier model, one at a time
+        
+        Loading sequentially avoids several large models competing for RAM.
+        Models that are known to be missing locally are skipped.
+        
+        Returns:
+            dict: Per-model warm-up results
+        """
+        results = {}
+        for model_name in self.get_warmup_models():
+            if self._available_models and not self.is_model_available(model_name):
+                logger.info(f"Skipping warm-up for {model_name} (not pulled)")
+                continue
+            results[model_name] = await self.warm_model(model_name)
+        return results
+    
+    def mark_used(self, model_name: str, num_ctx: Optional[int] = None):
+        """Record that a model just served traffic (no re-warm needed), and with which num_ctx"""
+        self._last_used[model_name] = time.time()
+        if num_ctx:
+            self._last_num_ctx[model_name] = num_ctx
+    
+    def last_num_ctx(self, model_name: str) -> int:
+        """
+        num_ctx real traffic last used with a model (smallest bucket if none yet)
+        
+        Ollama reloads a loaded model whenever num_ctx changes, so background
+        requests (health probes) must match it.
+        """
+        return self._last_num_ctx.get(model_name) or choose_num_ctx(0)
+    
+    async def _rewarm_idle(self, interval: int):
+        """Re-ping warmed models idle for a full interval, and retry failed warm-ups"""
+        now = time.time()
+        for model_name, state in list(self._warm_models.items()):
+            last_activity = max(
+                self._last_used.get(model_name, 0.0),
+                state.get("warmed_at", 0.0)
+            )
+            if not state.get("ok") or now - last_activity >= interval:
+                await self.warm_model(model_name)
+    
+    async def _keep_warm_loop(self, interval: int):
+        """Keep warmed models resident until stopped"""
+        while True:
+            await asyncio.sleep(interval)
+            await self._rewarm_idle(interval)
+    
+    async def start_keep_warm(self):
+        """
+        Warm configured models and keep them resident in the background
+        
+        Safe to call before Ollama is up: warm-up waits for the first
+        successful inventory refresh, so a backend started ahead of
+        `ollama serve` still gets warm models.
+        """
+        if self._rewarm_task is not None:
+            return
+        
+        async def run():
+            while not self._inventory_reachable and not await self.refresh_inventory():
+                await asyncio.sleep(settings.OLLAMA_INVENTORY_TTL_SECONDS)
+            await self.warm_up()
+            if settings.OLLAMA_REWARM_INTERVAL_SECONDS > 0:
+                await self._keep_warm_loop(settings.OLLAMA_REWARM_INTERVAL_SECONDS)
+        
+        self._rewarm_task = asyncio.create_task(run())
+    
+    async def stop_keep_warm(self):
+        """Cancel the warm-up / re-warm background task"""
+        if self._rewarm_task is None:
+            return
+        self._rewarm_task.cancel()
+        try:
+            await self._rewarm_task
+        except asyncio.CancelledError:
+            pass
+        self._rewarm_task = None
+    
+    def get_warmup_stats(self) -> dict:
+        """Returns per-model warm-up results and load times"""
+        return {
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "models": dict(self._warm_models)
+        }
     
     def get_available_models(self) -> list[str]:
         """Returns list of available Ollama models"""
@@ -71,7 +437,7 @@ class OllamaClient:
         temperature: float = 0.1,
         num_ctx: int = 4096,
         num_predict: int = 1024
-    ) -> OllamaLLM:
+    ) -> "OllamaLLM":
         """
         Returns configured LangChain Ollama LLM instance
         
@@ -89,7 +455,10 @@ class OllamaClient:
         """
         model_name = model or self.default_model
         
-        if self._available_models and not self.is_model_available(model_name):
+        # Validate against the cached inventory; a stale snapshot may miss a
+        # freshly pulled model, so only reject when the snapshot is current
+        if (self._available_models and not self.is_inventory_stale()
+                and not self.is_model_available(model_name)):
             raise ModelNotFoundError(
                 f"Model '{model_name}' not found. "
                 f"Available: {self._available_models}. "
@@ -97,6 +466,9 @@ class OllamaClient:
             )
         
         logger.info(f"Creating LLM with model: {model_name}")
+        self.mark_used(model_name)
+        
+        from langchain_ollama import OllamaLLM
         
         return OllamaLLM(
             base_url=self.base_url,
@@ -104,6 +476,8 @@ class OllamaClient:
             temperature=temperature,
             num_ctx=num_ctx,
             num_predict=num_predict,
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            async_client_kwargs=self.get_async_client_kwargs(),
         )
     
     async def generate_completion(
@@ -160,6 +534,163 @@ class OllamaClient:
         except Exception as e:
             logger.error(f"Streaming failed: {e}")
             raise
+    
+    async def _stream_ndjson(
+        self,
+        path: str,
+        payload: dict,
+        stats: NativeGenerationStats
+    ) -> AsyncGenerator[dict, None]:
+        """
+        POST to an Ollama streaming endpoint and yield each NDJSON object
+        
+        Fills stats from the final (done) object and records the call.
+        """
+        client = await self.get_http_client()
+        start_time = time.time()
+        
+        try:
+            async with client.stream("POST", path, json=payload, timeout=httpx.Timeout(None, connect=5.0)) as response:
+                if response.status_code == 404:
+                    raise ModelNotFoundError(
+                        f"Model '{payload['model']}' not found. Pull with: ollama pull {payload['model']}"
+                    )
+                response.raise_for_status()
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = orjson.loads(line)
+                    if "error" in data:
+                        raise OllamaGenerationError(f"Ollama generation failed: {data['error']}")
+                    if stats.ttft_ms is None and (data.get("response") or data.get("message", {}).get("content")):
+                        stats.ttft_ms = int((time.time() - start_time) * 1000)
+                    if data.get("done"):
+                        self._fill_stats(stats, data, start_time)
+                    yield data
+        
+        except httpx.ConnectError:
+            raise OllamaConnectionError("Ollama server not running. Start with: ollama serve")
+    
+    def _fill_stats(self, stats: NativeGenerationStats, data: dict, start_time: float):
+        """Copy Ollama's final-chunk timings (nanoseconds) into stats"""
+        stats.total_ms = int((time.time() - start_time) * 1000)
+        stats.load_ms = int(data.get("load_duration", 0) / 1_000_000)
+        stats.prompt_tokens = data.get("prompt_eval_count", 0)
+        stats.prompt_eval_ms = int(data.get("prompt_eval_duration", 0) / 1_000_000)
+        stats.output_tokens = data.get("eval_count", 0)
+        stats.eval_ms = int(data.get("eval_duration", 0) / 1_000_000)
+        if stats.eval_ms:
+            stats.tokens_per_sec = round(stats.output_tokens / (stats.eval_ms / 1000), 2)
+        stats.done_reason = data.get("done_reason")
+        stats.context = data.get("context")
+        self._native_calls.append(stats)
+        self.mark_used(stats.model)
+    
+    def _build_payload(self, model: Optional[str], options: Optional[dict], **extra) -> dict:
+        payload = {
+            "model": model or self.default_model,
+            "stream": True,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "options": options or {}
+        }
+        payload.update({key: value for key, value in extra.items() if value is not None})
+        return payload
+    
+    async def stream_generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        options: Optional[dict] = None,
+        stats: Optional[NativeGenerationStats] = None,
+        **extra
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream tokens from /api/generate without going through LangChain
+        
+        Args:
+            prompt: Prompt text
+            model: Model name (defaults to OLLAMA_DEFAULT_MODEL)
+            options: Ollama options (temperature, num_predict, num_ctx, stop, ...)
+            stats: Filled with TTFT, token counts and tokens/sec when the stream ends
+            **extra: Other /api/generate fields (suffix, system, raw, context, ...)
+            
+        Yields:
+            str: Token chunks as they arrive
+        """
+        payload = self._build_payload(model, options, prompt=prompt, **extra)
+        stats = stats or NativeGenerationStats(model=payload["model"])
+        
+        async for data in self._stream_ndjson("/api/generate", payload, stats):
+            if data.get("response"):
+                yield data["response"]
+    
+    async def stream_chat(
+        self,
+        messages: list[dict],
+        model: Optional[str] = None,
+        options: Optional[dict] = None,
+        stats: Optional[NativeGenerationStats] = None,
+        **extra
+    ) -> AsyncGenerator[str, None]:
+        """
+        Stream tokens from /api/chat without going through LangChain
+        
+        Args:
+            messages: [{"role": ..., "content": ...}, ...]
+            model: Model name (defaults to OLLAMA_DEFAULT_MODEL)
+            options: Ollama options (temperature, num_predict, num_ctx, stop, ...)
+            stats: Filled with TTFT, token counts and tokens/sec when the stream ends
+            **extra: Other /api/chat fields
+            
+        Yields:
+            str: Token chunks as they arrive
+        """
+        payload = self._build_payload(model, options, messages=messages, **extra)
+        stats = stats or NativeGenerationStats(model=payload["model"])
+        
+        async for data in self._stream_ndjson("/api/chat", payload, stats):
+            content = data.get("message", {}).get("content")
+            if content:
+                yield content
+    
+    def native(
+        self,
+        model: Optional[str] = None,
+        endpoint: str = "generate",
+        options: Optional[dict] = None,
+        prepare: Optional[Callable[[Any], Any]] = None,
+        on_done: Optional[Callable[[NativeOllamaStream], None]] = None,
+        **extra
+    ) -> NativeOllamaStream:
+        """
+        Runnable-like native call for collect_stream(); read .stats afterwards
+        
+        Args:
+            model: Model name
+            endpoint: "generate" (input is a prompt) or "chat" (input is messages)
+            options: Ollama options
+            prepare: Optional input transform, e.g. template variables -> prompt
+            on_done: Called with the stream once the model finishes
+            **extra: Other request fields
+        """
+        return NativeOllamaStream(
+            self, endpoint, model or self.default_model,
+            prepare=prepare, on_done=on_done, options=options, **extra
+        )
+    
+    def get_native_stats(self) -> dict:
+        """Rolling TTFT and tokens/sec for native calls"""
+        calls = list(self._native_calls)
+        ttfts = [c.ttft_ms for c in calls if c.ttft_ms is not None]
+        speeds = [c.tokens_per_sec for c in calls if c.tokens_per_sec]
+        return {
+            "calls": len(calls),
+            "p50_ttft_ms": percentile(ttfts, 50),
+            "p95_ttft_ms": percentile(ttfts, 95),
+            "p50_tokens_per_sec": percentile(speeds, 50),
+            "last": calls[-1].to_dict() if calls else None
+        }
 
 
 # Global singleton instance
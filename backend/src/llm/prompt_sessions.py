@@ -0,0 +1,207 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+import logging
+import time
+
+from ..config import settings
+from .tier_selector import tier_selector
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PromptSession:
+    """Last completion sent for one document"""
+    key: str
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    prefix: str = ""  # Anchored prefix as sent
+    requests: int = 0
+    native_calls: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+
+class PromptSessionStore:
+    """
+    Per-document prompt state so consecutive completions hit Ollama's KV cache
+
+    Ollama keeps the evaluated prompt of each model slot and only evaluates
+    tokens after the first byte that differs from the previous prompt. This
+    store keeps that first differing byte as late as possible:
+
+    - affinity: a document's requests go to the model that served it last,
+      as long as it is still expected to meet the latency budget
+    - anchoring: editors send a sliding window of lines before the cursor,
+      which shifts the prompt start on every new line; lines that slid out
+      of the window are put back so the prompt start stays byte-identical
+
+    Prompt-eval time saved is estimated from the per-model prompt eval rate
+    measured on each session's first (cold) request.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = settings.PROMPT_SESSION_MAX,
+        ttl_seconds: int = settings.PROMPT_SESSION_TTL_SECONDS,
+        max_anchor_lines: int = settings.PROMPT_SESSION_MAX_ANCHOR_LINES
+    ):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_anchor_lines = max_anchor_lines
+        self._sessions: OrderedDict[str, PromptSession] = OrderedDict()
+        # model -> (ms per prompt token, chars per prompt token) from cold calls
+        self._cold_rates: dict[str, tuple[float, float]] = {}
+        self.requests = 0
+        self.affinity_hits = 0
+        self.affinity_over_budget = 0
+        self.anchored = 0
+        self.prompt_eval_ms_saved = 0.0
+        self.last_saved_ms: Optional[float] = None
+
+    def get(self, key: Optional[str]) -> Optional[PromptSession]:
+        """Live session for a document, None if missing or expired"""
+        if not key or not settings.ENABLE_PROMPT_SESSIONS:
+            return None
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        if time.time() - session.updated_at > self.ttl_seconds:
+            del self._sessions[key]
+            return None
+        self._sessions.move_to_end(key)
+        return session
+
+    def affinity(self, key: Optional[str], budget_ms: Optional[float] = None) -> Optional[tuple[str, str]]:
+        """
+        (provider, model) that served this document last, if it was local
+
+        Args:
+            key: Document key
+            budget_ms: Latency budget the model must be expected to meet; a
+                model without a latency estimate is not pinned, so budget-based
+                tier selection still decides
+
+        Returns:
+            (provider, model) to pin, None to route normally
+        """
+        session = self.get(key)
+        if session is None or session.provider != "ollama" or not session.model:
+            return None
+        if budget_ms is not None:
+            estimate = tier_selector.estimate(session.provider, session.model)
+            if estimate is None or estimate.total_ms > budget_ms:
+                self.affinity_over_budget += 1
+                return None
+        self.affinity_hits += 1
+        return session.provider, session.model
+
+    def anchor_prefix(self, key: Optional[str], prefix: str) -> str:
+        """
+        Re-attach leading lines the client's window dropped since the last request
+
+        If the new prefix starts with the previous prefix minus its first k
+        lines (and minus the partial cursor line), those k lines are put back
+        in front. Once more than max_anchor_lines extra lines would be kept,
+        the anchor resets to the client's prefix.
+
+        Args:
+            key: Document key
+            prefix: Code before the cursor as sent by the client
+
+        Returns:
+            Prefix to put in the prompt
+        """
+        session = self.get(key)
+        if session is None or not session.prefix:
+            return prefix
+
+        old_lines = session.prefix.splitlines(keepends=True)
+        complete_lines = old_lines[:-1]  # Last line is where the cursor was
+        if prefix.startswith("".join(complete_lines)):
+            return prefix  # Window start did not move
+        for k in range(1, min(len(complete_lines), self.max_anchor_lines) + 1):
+            overlap = "".join(complete_lines[k:])
+            if overlap and prefix.startswith(overlap):
+                self.anchored += 1
+                return "".join(old_lines[:k]) + prefix
+        return prefix
+
+    def record(
+        self,
+        key: Optional[str],
+        provider: str,
+        model: str,
+        prefix: str
+    ) -> Optional[PromptSession]:
+        """Remember which provider/model served a document and the prefix sent"""
+        if not key or not settings.ENABLE_PROMPT_SESSIONS:
+            return None
+        session = self.get(key)
+        if session is None or session.model != model:
+            session = PromptSession(key=key)
+            self._sessions[key] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+        session.provider = provider
+        session.model = model
+        session.prefix = prefix
+        session.requests += 1
+        session.updated_at = time.time()
+        self.requests += 1
+        return session
+
+    def record_native(self, key: Optional[str], prompt: str, stats):
+        """
+        Estimate prompt-eval time saved by a finished native call
+
+        Args:
+            key: Document key
+            prompt: Prompt sent
+            stats: NativeGenerationStats of the call
+        """
+        session = self.get(key)
+        if session is None or session.model != stats.model:
+            return
+
+        first_call = session.native_calls == 0
+        session.native_calls += 1
+
+        if not stats.prompt_tokens or stats.prompt_eval_ms is None:
+            return
+        if first_call:
+            self._cold_rates[stats.model] = (
+                stats.prompt_eval_ms / stats.prompt_tokens,
+                len(prompt) / stats.prompt_tokens
+            )
+            return
+
+        rates = self._cold_rates.get(stats.model)
+        if rates is None:
+            return
+        ms_per_token, chars_per_token = rates
+        # Ollama's prompt_eval_count only counts tokens it actually evaluated
+        expected_tokens = len(prompt) / chars_per_token
+        saved_ms = max(0.0, (expected_tokens - stats.prompt_tokens) * ms_per_token)
+        self.prompt_eval_ms_saved += saved_ms
+        self.last_saved_ms = round(saved_ms, 1)
+        logger.debug(
+            f"♻️ Prompt cache: {stats.prompt_tokens}/{expected_tokens:.0f} tokens evaluated, "
+            f"~{saved_ms:.0f}ms saved ({key})"
+        )
+
+    def get_stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "requests": self.requests,
+            "affinity_hits": self.affinity_hits,
+            "affinity_over_budget": self.affinity_over_budget,
+            "anchored_prefixes": self.anchored,
+            "prompt_eval_ms_saved": round(self.prompt_eval_ms_saved, 1),
+            "last_saved_ms": self.last_saved_ms
+        }
+
+
+# Global singleton
+prompt_sessions = PromptSessionStore()
@@ -0,0 +1,517 @@
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Literal, Optional
+import asyncio
+import functools
+import logging
+import time
+
+from ..config import settings, PROVIDER_MODELS
+from ..utils.deadline import current_deadline
+from ..utils.error_handler import (
+    DeadlineExceededError,
+    ProviderChainError,
+    RateLimitExceededError,
+    is_rate_limit_error,
+)
+from .circuit_breaker import CircuitBreaker, circuit_breakers
+from .context_sizing import count_tokens, fit_local_output
+from .generation import GenerationOutput
+from .health_prober import health_prober
+from .llm_manager import llm_manager, ProviderType
+from .metrics import provider_metrics
+from .rate_limiter import rate_limiter
+from .tier_selector import tier_selector
+
+logger = logging.getLogger(__name__)
+
+TaskKind = Literal["completion", "completion_upgrade", "chat", "agent"]
+TierType = Literal["fast", "balanced", "quality"]
+
+# Providers that never leave the machine
+LOCAL_PROVIDERS = ("ollama", "mock")
+
+
+@dataclass
+class ChainResult:
+    """Output of a provider chain run plus which hop served it"""
+    output: Any
+    provider: str
+    model: str
+    hop: int
+    latency_ms: int
+    attempts: list[dict] = field(default_factory=list)
+
+
+class ProviderChain:
+    """
+    Executes an LLM call against an ordered chain of providers
+
+    Order comes from USE_LOCAL_ONLY / USE_LOCAL_FIRST / ENABLE_CLOUD_FALLBACK
+    and PROVIDER_ORDER. Hops whose recent p95 latency or error rate break the
+    task's SLO, or whose concurrency limit is saturated, are skipped while a
+    later hop is still available. Each hop waits for a rate-limiter slot.
+    Hops with an open circuit breaker are always skipped.
+    """
+
+    def __init__(self):
+        self.served_by: dict[str, int] = {}
+        self.skipped: dict[str, int] = {}
+        self._probes: set[asyncio.Task] = set()
+
+    def get_provider_order(self, provider: Optional[str] = None) -> list[str]:
+        """
+        Resolve the ordered provider chain for a request
+
+        Args:
+            provider: Explicitly requested provider, always tried first
+
+        Returns:
+            Ordered list of provider names
+        """
+        available = llm_manager.list_available_providers()
+
+        if settings.DEFAULT_PROVIDER == "mock":
+            configured = ["mock"]  # Offline benchmarking: never leave the mock
+        elif settings.USE_LOCAL_ONLY:
+            configured = ["ollama"]
+        elif settings.USE_LOCAL_FIRST:
+            configured = ["ollama"] + [p for p in settings.PROVIDER_ORDER if p != "ollama"]
+        else:
+            configured = [settings.DEFAULT_PROVIDER] + [
+                p for p in settings.PROVIDER_ORDER if p != settings.DEFAULT_PROVIDER
+            ]
+
+        order = [provider] if provider else []
+        for candidate in configured:
+            if candidate not in order and available.get(candidate):
+                order.append(candidate)
+
+        if not settings.ENABLE_CLOUD_FALLBACK:
+            # An explicitly requested cloud provider is still tried, but
+            # nothing falls back to the cloud
+            order = order[:1] + [p for p in order[1:] if p in LOCAL_PROVIDERS]
+
+        return order
+
+    def _skip_reason(self, task: TaskKind, provider: str, model: str) -> Optional[str]:
+        """Why a hop should be skipped right now, or None if it is healthy"""
+        breaker = circuit_breakers.get(provider, model)
+        if not breaker.allow_request():
+            if breaker.probe_due():
+                self._start_probe(breaker)
+            return f"circuit {breaker.state}"
+
+        if health_prober.is_down(provider, model):
+            return "failing health probes"
+
+        stats = provider_metrics.get(provider, model)
+        if stats.sample_count() >= settings.METRICS_MIN_SAMPLES:
+            p95 = provider_metrics.p95_latency(provider, model)
+            slo_ms = settings.TASK_LATENCY_SLO_MS.get(task)
+            if slo_ms and p95 is not None and p95 > slo_ms:
+                return f"p95 {p95:.0f}ms > SLO {slo_ms}ms"
+            if stats.error_rate() > settings.PROVIDER_MAX_ERROR_RATE:
+                return f"error rate {stats.error_rate():.0%}"
+
+        limiter = rate_limiter.get(provider)
+        if limiter.is_saturated():
+            return f"overloaded ({limiter.in_flight} in flight)"
+
+        return None
+
+    def _start_probe(self, breaker: CircuitBreaker):
+        """Send a cheap 1-token request in the background to test an open breaker"""
+        breaker.start_probe()
+
+        async def probe():
+            try:
+                llm = llm_manager.get_llm(
+                    provider=breaker.provider,
+                    model=breaker.model,
+                    temperature=0.0,
+                    max_tokens=1
+                )
+                await asyncio.wait_for(llm.ainvoke("ping"), settings.BREAKER_PROBE_TIMEOUT_SECONDS)
+                breaker.record_success()
+            except Exception as e:
+                breaker.record_failure(f"probe: {e}")
+
+        task = asyncio.create_task(probe())
+        self._probes.add(task)
+        task.add_done_callback(self._probes.discard)
+
+    def _record_failure(self, provider: str, model: str, error: Exception):
+        """Feed a failed call into metrics and the circuit breaker"""
+        # Local backpressure says nothing about the provider's health
+        if isinstance(error, RateLimitExceededError):
+            return
+        provider_metrics.record_failure(provider, model, str(error))
+        # A blown request deadline is a latency signal, not a broken provider
+        if not isinstance(error, DeadlineExceededError):
+            circuit_breakers.get(provider, model).record_failure(str(error))
+
+    def _record_success(
+        self,
+        provider: str,
+        model: str,
+        latency_ms: int,
+        output: Any = None,
+        prompt_tokens: Optional[int] = None
+    ):
+        """Feed a successful call into metrics and the circuit breaker"""
+        text = getattr(output, "text", None)
+        provider_metrics.record_success(
+            provider,
+            model,
+            latency_ms,
+            ttft_ms=getattr(output, "ttft_ms", None),
+            output_tokens=count_tokens(text) if text else None,
+            prompt_tokens=prompt_tokens
+        )
+        circuit_breakers.get(provider, model).record_success()
+        self.served_by[provider] = self.served_by.get(provider, 0) + 1
+
+    @staticmethod
+    def _hop_kwargs(
+        provider: str,
+        model: str,
+        llm_kwargs: dict,
+        prompt_tokens: Optional[int],
+        size_hop: Optional[Callable[[str, str], dict]] = None
+    ) -> tuple[dict, Optional[int]]:
+        """
+        get_llm kwargs and prompt size for one hop
+
+        size_hop re-sizes the request for the prompt this hop is sent (e.g. a
+        FIM prompt instead of the instruction template). Ollama hops share
+        num_ctx between prompt and output, so their output budget shrinks to
+        what fits; cloud hops keep the task's full budget.
+
+        Returns:
+            (get_llm kwargs, prompt tokens)
+        """
+        if size_hop is not None:
+            sized = size_hop(provider, model)
+            prompt_tokens = sized["prompt_tokens"]
+            llm_kwargs = {**llm_kwargs, "num_ctx": sized["num_ctx"], "max_tokens": sized["max_tokens"]}
+        if provider != "ollama" or not prompt_tokens or not llm_kwargs.get("max_tokens"):
+            return llm_kwargs, prompt_tokens
+        num_ctx = llm_kwargs.get("num_ctx") or settings.MAX_LOCAL_CONTEXT
+        return {
+            **llm_kwargs,
+            "max_tokens": fit_local_output(prompt_tokens, llm_kwargs["max_tokens"], num_ctx)
+        }, prompt_tokens
+
+    @staticmethod
+    def _slot_tokens(llm_kwargs: dict, prompt_tokens: Optional[int]) -> int:
+        """tokens/min charge for a hop: providers count the prompt as well as the output"""
+        return (prompt_tokens or 0) + (llm_kwargs.get("max_tokens") or settings.MAX_TOKENS)
+
+    def _select_hops(
+        self,
+        task: TaskKind,
+        provider: Optional[str],
+        model: Optional[str],
+        tier: TierType,
+        latency_budget_ms: Optional[float] = None,
+        prompt_tokens: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+        """
+        Resolve (provider, model) hops and the subset healthy enough to try
+
+        With a latency budget (capped by the request deadline), each hop's
+        model is the best-quality one expected to meet it; otherwise the
+        tier's model.
+
+        Returns:
+            (all hops in chain order, candidate hops after skipping unhealthy ones)
+        """
+        order = self.get_provider_order(provider)
+        deadline = current_deadline()
+        if latency_budget_ms is not None and deadline is not None:
+            latency_budget_ms = min(latency_budget_ms, deadline.remaining() * 1000)
+        hops = []
+        for p in order:
+            if p == provider and model:
+                hops.append((p, model))
+            elif latency_budget_ms is not None:
+                hops.append((p, tier_selector.select_model(
+                    p, latency_budget_ms, prompt_tokens, max_tokens, default_tier=tier
+                )))
+            else:
+                hops.append((p, PROVIDER_MODELS[p][tier]))
+
+        # Skip unhealthy hops, but always keep at least one candidate
+        candidates = []
+        for hop_provider, hop_model in hops:
+            reason = self._skip_reason(task, hop_provider, hop_model)
+            if reason:
+                logger.info(f"Skipping {hop_provider}:{hop_model} for {task}: {reason}")
+                self.skipped[hop_provider] = self.skipped.get(hop_provider, 0) + 1
+            else:
+                candidates.append((hop_provider, hop_model))
+        if not candidates:
+            # Everything is slow or busy: still try the first hop whose circuit is closed
+            candidates = [
+                hop for hop in hops if circuit_breakers.get(*hop).allow_request()
+            ][:1]
+        if not candidates:
+            raise ProviderChainError(
+                f"All providers for {task} have open circuits: "
+                + ", ".join(f"{p}:{m}" for p, m in hops),
+                attempts=[
+                    {"provider": p, "model": m, "error": "circuit open"} for p, m in hops
+                ]
+            )
+
+        return hops, candidates
+
+    async def run(
+        self,
+        invoke: Callable[[Any], Awaitable[Any]],
+        task: TaskKind = "completion",
+        provider: Optional[ProviderType] = None,
+        model: Optional[str] = None,
+        tier: TierType = "fast",
+        latency_budget_ms: Optional[float] = None,
+        prompt_tokens: Optional[int] = None,
+        size_hop: Optional[Callable[[str, str], dict]] = None,
+        coalesced: bool = False,
+        **llm_kwargs
+    ) -> ChainResult:
+        """
+        Run invoke(llm) on the first healthy provider, falling through on errors
+
+        The current request deadline is enforced: no new hop starts after it
+        expires, and a hop still running shortly after it is cancelled. Use
+        collect_stream() inside invoke to get partial output instead.
+
+        Args:
+            invoke: Async callable that receives an LLM and returns the output
+            task: Task kind, selects the latency SLO
+            provider: Preferred provider (first hop)
+            model: Model for the preferred provider
+            tier: Tier used to pick models (default when a budget is given)
+            latency_budget_ms: Pick the best model expected to answer within this
+            prompt_tokens: Prompt size, for the budget estimate and metrics
+            size_hop: (provider, model) -> size_request() of the prompt that hop
+                is sent, when it differs per hop
+            coalesced: invoke is called as invoke(llm, acquire) and takes the
+                hop's rate-limit slot itself (singleflight.wrap(..., acquire=acquire)),
+                so a request joining an in-flight generation holds no slot
+            **llm_kwargs: Passed to llm_manager.get_llm (temperature, max_tokens, ...)
+
+        Returns:
+            ChainResult with output and the hop that served it
+
+        Raises:
+            ProviderChainError: If every hop failed
+            DeadlineExceededError: If the request deadline expired first
+        """
+        max_tokens = llm_kwargs.get("max_tokens") or settings.MAX_TOKENS
+        hops, candidates = self._select_hops(
+            task, provider, model, tier, latency_budget_ms, prompt_tokens, max_tokens
+        )
+        deadline = current_deadline()
+
+        attempts = []
+        for hop_provider, hop_model in candidates:
+            hop = hops.index((hop_provider, hop_model))
+            start_time = time.time()
+
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceededError(
+                    f"Deadline of {deadline.seconds}s expired after {len(attempts)} attempt(s)"
+                )
+            timeout = (
+                deadline.remaining() + settings.DEADLINE_GRACE_SECONDS
+                if deadline is not None else None
+            )
+
+            hop_kwargs, hop_prompt_tokens = self._hop_kwargs(
+                hop_provider, hop_model, llm_kwargs, prompt_tokens, size_hop
+            )
+            try:
+                async with asyncio.timeout(timeout):
+                    acquire = functools.partial(
+                        rate_limiter.slot, hop_provider,
+                        tokens=self._slot_tokens(hop_kwargs, hop_prompt_tokens)
+                    )
+                    llm = llm_manager.get_llm(provider=hop_provider, model=hop_model, **hop_kwargs)
+                    if coalesced:
+                        output = await invoke(llm, acquire)
+                    else:
+                        async with acquire():
+                            output = await invoke(llm)
+
+            except Exception as e:
+                if isinstance(e, TimeoutError) and deadline is not None and deadline.expired():
+                    # Cancelling invoke closed the HTTP stream, so the model slot is free again
+                    e = DeadlineExceededError(
+                        f"Deadline of {deadline.seconds}s expired on {hop_provider}:{hop_model}"
+                    )
+                if isinstance(e, DeadlineExceededError):
+                    self._record_failure(hop_provider, hop_model, e)
+                    raise e
+
+                latency_ms = int((time.time() - start_time) * 1000)
+                self._record_failure(hop_provider, hop_model, e)
+                attempts.append({
+                    "provider": hop_provider,
+                    "model": hop_model,
+                    "error": str(e),
+                    "latency_ms": latency_ms,
+                    "rate_limited": is_rate_limit_error(e)
+                })
+                logger.warning(f"Hop {hop} ({hop_provider}:{hop_model}) failed: {e}")
+                last_error = e
+                continue
+
+            latency_ms = int((time.time() - start_time) * 1000)
+            self._record_success(
+                hop_provider, hop_model, latency_ms, output=output, prompt_tokens=hop_prompt_tokens
+            )
+
+            if hop > 0:
+                logger.info(f"Served by fallback hop {hop}: {hop_provider}:{hop_model}")
+
+            return ChainResult(
+                output=output,
+                provider=hop_provider,
+                model=hop_model,
+                hop=hop,
+                latency_ms=latency_ms,
+                attempts=attempts
+            )
+
+        # Every hop was rate limited (locally or by the provider): surface a clear 429
+        if all(a["rate_limited"] for a in attempts):
+            if isinstance(last_error, RateLimitExceededError):
+                raise last_error
+            raise RateLimitExceededError(
+                f"All providers rate limited for {task}: {last_error}",
+                provider=attempts[-1]["provider"]
+            )
+
+        raise ProviderChainError(
+            f"All providers failed for {task}: "
+            + "; ".join(f"{a['provider']}: {a['error']}" for a in attempts),
+            attempts=attempts
+        )
+
+    async def run_hedged(
+        self,
+        build: Callable[[Any], Any],
+        inputs: Any,
+        task: TaskKind = "completion",
+        provider: Optional[ProviderType] = None,
+        model: Optional[str] = None,
+        tier: TierType = "fast",
+        latency_budget_ms: Optional[float] = None,
+        prompt_tokens: Optional[int] = None,
+        size_hop: Optional[Callable[[str, str], dict]] = None,
+        coalesced: bool = False,
+        **llm_kwargs
+    ) -> ChainResult:
+        """
+        Like run(), but hedges the first healthy hop with a backup request
+
+        The alternate is HEDGE_ALTERNATE if set, otherwise the next healthy
+        hop. Without an alternate this is a plain streamed call.
+
+        Args:
+            build: Callable that turns an LLM into a streamable runnable
+                (build(llm, acquire) if coalesced)
+            inputs: Runnable input
+            task, provider, model, tier, latency_budget_ms, prompt_tokens,
+            size_hop, coalesced, **llm_kwargs: As for run()
+
+        Returns:
+            ChainResult whose output is a GenerationOutput
+
+        Raises:
+            ProviderChainError: If both the primary and the alternate failed
+            DeadlineExceededError: If the deadline expired before any output
+        """
+        hops, candidates = self._select_hops(
+            task, provider, model, tier, latency_budget_ms, prompt_tokens,
+            llm_kwargs.get("max_tokens") or settings.MAX_TOKENS
+        )
+        primary = candidates[0]
+
+        if settings.HEDGE_ALTERNATE:
+            alt_provider, _, alt_model = settings.HEDGE_ALTERNATE.partition(":")
+            alternate = (alt_provider, alt_model or PROVIDER_MODELS[alt_provider][tier])
+        else:
+            alternate = candidates[1] if len(candidates) > 1 else None
+
+        sized = {
+            hop: self._hop_kwargs(*hop, llm_kwargs, prompt_tokens, size_hop)
+            for hop in (primary, alternate) if hop is not None
+        }
+        # Failures are recorded against the attempt that raised them, and a
+        # losing primary's TTFT still feeds the hedge delay
+        failed = []
+
+        def on_failure(hop_provider: str, hop_model: str, error: BaseException):
+            failed.append((hop_provider, hop_model, error))
+            self._record_failure(hop_provider, hop_model, error)
+
+        try:
+            result = await llm_manager.hedged_invoke(
+                build, inputs, primary, alternate,
+                alternate_kwargs=sized[alternate][0] if alternate else None,
+                slot_tokens={
+                    hop: self._slot_tokens(hop_kwargs, hop_prompt_tokens)
+                    for hop, (hop_kwargs, hop_prompt_tokens) in sized.items()
+                },
+                coalesced=coalesced,
+                on_ttft=provider_metrics.record_ttft,
+                on_failure=on_failure,
+                **sized[primary][0]
+            )
+        except DeadlineExceededError as e:
+            if not failed:
+                self._record_failure(primary[0], primary[1], e)
+            raise
+        except Exception as e:
+            if not failed:
+                # Raised before streaming started (e.g. building the primary LLM)
+                self._record_failure(primary[0], primary[1], e)
+                failed.append((*primary, e))
+            if is_rate_limit_error(e):
+                raise RateLimitExceededError(f"Hedged {task} rate limited: {e}", provider=failed[-1][0])
+            raise ProviderChainError(
+                f"Hedged {task} failed: {e}",
+                attempts=[
+                    {"provider": p, "model": m, "error": str(error)} for p, m, error in failed
+                ]
+            )
+
+        output = GenerationOutput(result.output, truncated=result.truncated, ttft_ms=result.ttft_ms)
+        served = (result.provider, result.model)
+        self._record_success(
+            result.provider, result.model, result.latency_ms, output=output,
+            prompt_tokens=sized[served][1] if served in sized else prompt_tokens
+        )
+
+        return ChainResult(
+            output=output,
+            provider=result.provider,
+            model=result.model,
+            hop=hops.index(served) if served in hops else len(hops),
+            latency_ms=result.latency_ms
+        )
+
+    def get_stats(self) -> dict:
+        """Returns chain order, per-provider serve/skip counts and in-flight load"""
+        return {
+            "order": self.get_provider_order(),
+            "served_by": dict(self.served_by),
+            "skipped": dict(self.skipped)
+        }
+
+
+# Global singleton
+provider_chain = ProviderChain()
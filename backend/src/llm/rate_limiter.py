@@ -0,0 +1,188 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+import asyncio
+import logging
+import time
+
+from ..config import settings
+from ..utils.error_handler import RateLimitExceededError
+from .metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_min"""
+
+    def __init__(self, rate_per_min: float):
+        self.capacity = rate_per_min
+        self.rate_per_sec = rate_per_min / 60
+        self.tokens = rate_per_min
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate_per_sec)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount tokens are available (0 if available now)"""
+        self._refill()
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate_per_sec
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class ProviderLimiter:
+    """
+    Concurrency semaphore plus requests/min and tokens/min buckets for one provider
+    Callers wait in a bounded queue until capacity frees up or their deadline passes
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        max_concurrent: int,
+        requests_per_min: Optional[int] = None,
+        tokens_per_min: Optional[int] = None,
+        max_queue: int = 20
+    ):
+        self.provider = provider
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._request_bucket = TokenBucket(requests_per_min) if requests_per_min else None
+        self._token_bucket = TokenBucket(tokens_per_min) if tokens_per_min else None
+        self.in_flight = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self._queue_times_ms: deque = deque(maxlen=settings.METRICS_WINDOW)
+
+    def is_saturated(self) -> bool:
+        """True if a new request would have to queue for a concurrency slot"""
+        return self.in_flight >= self.max_concurrent
+
+    def _bucket_wait(self, tokens: int) -> float:
+        wait = 0.0
+        if self._request_bucket:
+            wait = max(wait, self._request_bucket.wait_time(1))
+        if self._token_bucket:
+            wait = max(wait, self._token_bucket.wait_time(tokens))
+        return wait
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected += 1
+        raise RateLimitExceededError(
+            f"{self.provider} {reason}",
+            provider=self.provider,
+            retry_after=retry_after
+        )
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0, timeout_ms: Optional[int] = None) -> AsyncIterator[None]:
+        """
+        Hold one concurrency slot and consume rate-limit budget for a request
+
+        Args:
+            tokens: Estimated tokens the request will use (tokens/min budget)
+            timeout_ms: Max time to wait in the queue (RATE_LIMIT_QUEUE_TIMEOUT_MS)
+
+        Raises:
+            RateLimitExceededError: Queue full or deadline passed before capacity freed up
+        """
+        timeout_ms = timeout_ms if timeout_ms is not None else settings.RATE_LIMIT_QUEUE_TIMEOUT_MS
+        deadline = time.monotonic() + timeout_ms / 1000
+        start_time = time.monotonic()
+
+        if self.waiting >= self.max_queue:
+            self._reject(f"queue full ({self.waiting} waiting)", retry_after=timeout_ms / 1000)
+
+        self.waiting += 1
+        try:
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                self._reject(
+                    f"busy: no slot within {timeout_ms}ms ({self.in_flight} in flight)",
+                    retry_after=1.0
+                )
+
+            # Rate-limit buckets: sleep until budget refills, but not past the deadline
+            wait = self._bucket_wait(tokens)
+            if wait > 0:
+                if time.monotonic() + wait > deadline:
+                    self._semaphore.release()
+                    self._reject(f"rate limit: retry in {wait:.1f}s", retry_after=wait)
+                try:
+                    await asyncio.sleep(wait)
+                except BaseException:
+                    self._semaphore.release()  # Cancelled while holding the slot
+                    raise
+        finally:
+            self.waiting -= 1
+
+        if self._request_bucket:
+            self._request_bucket.consume(1)
+        if self._token_bucket:
+            self._token_bucket.consume(tokens)
+
+        self.acquired += 1
+        self._queue_times_ms.append((time.monotonic() - start_time) * 1000)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def get_stats(self) -> dict:
+        queue_times = list(self._queue_times_ms)
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "p50_queue_ms": percentile(queue_times, 50),
+            "p95_queue_ms": percentile(queue_times, 95)
+        }
+
+
+class RateLimiter:
+    """Registry of per-provider limiters built from settings on first use"""
+
+    def __init__(self):
+        self._limiters: dict[str, ProviderLimiter] = {}
+
+    def get(self, provider: str) -> ProviderLimiter:
+        """Returns the limiter for a provider"""
+        if provider not in self._limiters:
+            limits = settings.PROVIDER_RATE_LIMITS.get(provider, {})
+            self._limiters[provider] = ProviderLimiter(
+                provider,
+                max_concurrent=settings.PROVIDER_CONCURRENCY.get(
+                    provider, settings.MAX_CONCURRENT_REQUESTS
+                ),
+                requests_per_min=limits.get("rpm"),
+                tokens_per_min=limits.get("tpm"),
+                max_queue=settings.RATE_LIMIT_MAX_QUEUE
+            )
+        return self._limiters[provider]
+
+    def slot(self, provider: str, tokens: int = 0, timeout_ms: Optional[int] = None):
+        """Shortcut for get(provider).slot(...)"""
+        return self.get(provider).slot(tokens, timeout_ms)
+
+    def get_stats(self) -> dict:
+        return {provider: limiter.get_stats() for provider, limiter in self._limiters.items()}
+
+
+# Global singleton
+rate_limiter = RateLimiter()
@@ -0,0 +1,307 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Optional
+import asyncio
+import contextvars
+import logging
+import time
+
+import orjson
+import xxhash
+
+from ..config import settings
+
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+# Fixed per-entry overhead (OrderedDict node, tuple, timestamps) in bytes
+ENTRY_OVERHEAD_BYTES = 200
+# Bump when cached value shapes change, so replicas on different versions
+# don't read each other's entries
+KEY_VERSION = "v1"
+# First byte of a serialized value
+RAW_MARKER = b"j"
+ZSTD_MARKER = b"z"
+
+
+def cache_key(*parts: Any) -> str:
+    """Fast 128-bit hash of JSON-serializable parts"""
+    return xxhash.xxh3_128_hexdigest(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS))
+
+
+_zstd_compressor = None
+_zstd_decompressor = None
+
+
+def encode(value: Any) -> bytes:
+    """orjson bytes, zstd-compressed at CACHE_COMPRESS_MIN_BYTES and above"""
+    global _zstd_compressor
+    data = orjson.dumps(value)
+    if len(data) < settings.CACHE_COMPRESS_MIN_BYTES:
+        return RAW_MARKER + data
+    if _zstd_compressor is None:
+        import zstandard
+        _zstd_compressor = zstandard.ZstdCompressor(level=3)
+    return ZSTD_MARKER + _zstd_compressor.compress(data)
+
+
+def decode(blob: bytes) -> Any:
+    global _zstd_decompressor
+    marker, data = blob[:1], blob[1:]
+    if marker == ZSTD_MARKER:
+        if _zstd_decompressor is None:
+            import zstandard
+            _zstd_decompressor = zstandard.ZstdDecompressor()
+        data = _zstd_decompressor.decompress(data)
+    elif marker != RAW_MARKER:
+        raise ValueError(f"Unknown cache value marker {marker!r}")
+    return orjson.loads(data)
+
+
+class ByteLRUCache:
+    """
+    In-process LRU cache bounded by total bytes, with a TTL
+
+    Callers pass each value's size; the least recently used entries are
+    evicted once the total exceeds max_bytes. Expired entries are dropped
+    when read.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[Any, int, float]] = OrderedDict()  # key -> (value, size, expires_at)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bypassed = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, size, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any, size: int, ttl_seconds: Optional[float] = None):
+        """
+        Store value under key
+
+        Args:
+            key: Cache key
+            value: Value to store
+            size: Approximate size of value in bytes
+            ttl_seconds: Override the cache's TTL for this entry
+        """
+        size += len(key) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (value, size, time.monotonic() + ttl)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "bypassed": self.bypassed
+        }
+
+
+class L2Stats:
+    """Redis counters for one namespace"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+
+    def to_dict(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "errors": self.errors}
+
+
+class TwoTierCache:
+    """
+    In-process L1 in front of a Redis L2 shared by all replicas
+
+    Values are JSON-serializable (callers store model_dump() output). Each
+    namespace in CACHE_TTL_SECONDS has its own TTL and L1 byte budget:
+
+    - "completion": CompletionResponse for a normalized cursor context
+    - "agent": agent endpoint responses
+    - "routing": supervisor routing decisions made by the LLM
+
+    An L2 hit fills L1, so a completion computed on one replica is served
+    from the others after one Redis round trip. Writes go to L1 at once and
+    to Redis in the background, off the response path. Redis is optional:
+    without REDIS_URL, or for REDIS_RETRY_SECONDS after an error, only L1
+    is used.
+
+    Args:
+        redis: Client to use instead of connecting to REDIS_URL (tests)
+    """
+
+    def __init__(self, redis: Optional["Redis"] = None):
+        self._redis = redis
+        self._l1 = {
+            namespace: ByteLRUCache(settings.CACHE_L1_MAX_BYTES.get(namespace, 1024 * 1024), ttl)
+            for namespace, ttl in settings.CACHE_TTL_SECONDS.items()
+        }
+        self._l2_stats = {namespace: L2Stats() for namespace in self._l1}
+        self._redis_down_until = 0.0
+        self._writes: set[asyncio.Task] = set()
+
+    async def connect(self):
+        """Connect to REDIS_URL, if configured; on failure run L1-only"""
+        if self._redis is not None or not settings.REDIS_URL:
+            return
+        import redis.asyncio as aioredis
+        timeout = settings.REDIS_TIMEOUT_MS / 1000
+        client = aioredis.from_url(settings.REDIS_URL, socket_timeout=timeout, socket_connect_timeout=timeout)
+        try:
+            await client.ping()
+        except Exception as e:
+            logger.warning(f"⚠️ Redis unavailable, using the in-process cache only: {e}")
+            await client.aclose()
+            return
+        self._redis = client
+        logger.info("✓ Redis cache connected")
+
+    async def close(self):
+        """Finish pending writes and disconnect"""
+        await self.flush()
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def flush(self):
+        """Wait for background Redis writes"""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _l2_available(self) -> bool:
+        return self._redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _l2_failed(self, namespace: str, e: Exception):
+        self._l2_stats[namespace].errors += 1
+        self._redis_down_until = time.monotonic() + settings.REDIS_RETRY_SECONDS
+        logger.warning(f"⚠️ Redis cache error, L1 only for {settings.REDIS_RETRY_SECONDS}s: {e}")
+
+    @staticmethod
+    def _redis_key(namespace: str, key: str) -> str:
+        return f"loco:{KEY_VERSION}:{namespace}:{key}"
+
+    async def get(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        Cached value from L1, else from Redis
+
+        Returns:
+            The value, None on a miss
+        """
+        l1 = self._l1[namespace]
+        value = l1.get(key)
+        if value is not None or not self._l2_available():
+            return value
+
+        stats = self._l2_stats[namespace]
+        try:
+            blob = await self._redis.get(self._redis_key(namespace, key))
+        except Exception as e:
+            self._l2_failed(namespace, e)
+            return None
+        if blob is None:
+            stats.misses += 1
+            return None
+        try:
+            value = decode(blob)
+        except Exception as e:
+            logger.warning(f"⚠️ Undecodable {namespace} cache entry dropped: {e}")
+            stats.misses += 1
+            return None
+        stats.hits += 1
+        l1.put(key, value, size=len(blob))
+        return value
+
+    def set(self, namespace: str, key: str, value: Any):
+        """Store value in L1 now and in Redis in the background"""
+        blob = encode(value)
+        self._l1[namespace].put(key, value, size=len(blob))
+        if not self._l2_available():
+            return
+        # A fresh context: the write must not inherit the request's deadline
+        task = asyncio.create_task(self._write(namespace, key, blob), context=contextvars.Context())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, namespace: str, key: str, blob: bytes):
+        try:
+            await self._redis.set(self._redis_key(namespace, key), blob, ex=settings.CACHE_TTL_SECONDS[namespace])
+            self._l2_stats[namespace].writes += 1
+        except Exception as e:
+            self._l2_failed(namespace, e)
+
+    def bypass(self, namespace: str):
+        """Count a request that skipped the cache"""
+        self._l1[namespace].bypassed += 1
+
+    def clear(self):
+        """Drop all L1 entries (Redis entries expire on their own)"""
+        for l1 in self._l1.values():
+            l1.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "redis": (
+                "disabled" if self._redis is None
+                else "connected" if self._l2_available()
+                else "backing off"
+            ),
+            "namespaces": {
+                namespace: {
+                    "ttl_seconds": settings.CACHE_TTL_SECONDS[namespace],
+                    "l1": l1.get_stats(),
+                    "l2": self._l2_stats[namespace].to_dict()
+                }
+                for namespace, l1 in self._l1.items()
+            }
+        }
+
+
+# Global singleton
+shared_cache = TwoTierCache()
@@ -0,0 +1,204 @@
+from typing import Any, AsyncIterator, Callable, Optional
+import asyncio
+import logging
+
+import orjson
+import xxhash
+
+from ..config import settings
+from ..utils.cancellation import mark_attached
+
+logger = logging.getLogger(__name__)
+
+# LLM attributes that change the output for the same prompt
+SAMPLING_ATTRS = (
+    "temperature", "top_p", "top_k", "num_predict", "num_ctx",
+    "max_tokens", "max_output_tokens", "stop", "seed"
+)
+
+
+def flight_key(llm: Any, prompt: Any, **params) -> str:
+    """
+    Key identifying a generation: provider class, model, prompt, sampling params
+
+    Args:
+        llm: LangChain LLM the prompt is sent to
+        prompt: Prompt text, messages or template variables
+        **params: Anything else that changes the output
+    """
+    identity = {
+        "llm": type(llm).__name__,
+        "model": getattr(llm, "model", None) or getattr(llm, "model_name", None)
+    }
+    for attr in SAMPLING_ATTRS:
+        value = getattr(llm, attr, None)
+        if value is not None:
+            identity[attr] = value
+    identity.update(params)
+    payload = orjson.dumps([identity, prompt], option=orjson.OPT_SORT_KEYS, default=str)
+    return xxhash.xxh3_128_hexdigest(payload)
+
+
+class _Flight:
+    """One in-flight generation and the chunks it produced so far"""
+
+    def __init__(self):
+        self.chunks: list[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class Singleflight:
+    """
+    Shares one in-flight generation between identical concurrent requests
+
+    The first caller for a key starts the generation in its own task; later
+    callers with the same key replay the chunks produced so far and then
+    follow the live stream. The generation is cancelled once every caller
+    has gone away (deadline, disconnect), freeing the model slot. Finished
+    flights are dropped immediately: this coalesces, it does not cache.
+    """
+
+    def __init__(self):
+        self._flights: dict[str, _Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.shared_chunks = 0
+        self.cancelled = 0
+
+    async def _run(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[Any]]):
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                flight.notify()
+        except asyncio.CancelledError:
+            # Callers still following were not cancelled themselves: they get
+            # an ordinary failure (the chain falls back), never CancelledError
+            flight.error = RuntimeError("Shared generation was cancelled")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            flight.notify()
+            self._drop(key, flight)
+
+    def _drop(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Stream the generation for key, starting it only if none is in flight
+
+        Args:
+            key: flight_key() of the request
+            factory: Starts the generation (e.g. lambda: runnable.astream(inputs))
+
+        Yields:
+            Chunks of the shared generation
+        """
+        flight = self._flights.get(key)
+        if flight is not None and (flight.cancelled or flight.task.cancelling()):
+            self._drop(key, flight)  # Dying; never join it
+            flight = None
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+            self.leaders += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"🔗 Joined in-flight generation {key[:8]} ({len(flight.chunks)} chunks so far)")
+
+        flight.subscribers += 1
+        mark_attached()
+        index = 0
+        try:
+            while True:
+                while index < len(flight.chunks):
+                    chunk = flight.chunks[index]
+                    index += 1
+                    if not leader:
+                        self.shared_chunks += 1
+                    yield chunk
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Drop it in the same step, so the next caller starts afresh
+                flight.cancelled = True
+                self._drop(key, flight)
+                flight.task.cancel()
+                self.cancelled += 1
+
+    def wrap(self, runnable: Any, key: str, acquire: Optional[Callable[[], Any]] = None) -> Any:
+        """
+        Runnable-like view of runnable whose astream() is coalesced on key
+
+        Args:
+            runnable: Streamable runnable (prompt | llm | parser)
+            key: flight_key() of the request
+            acquire: Optional () -> async context manager holding a rate-limit
+                slot. Only the generation that actually runs takes it, so
+                callers joining a flight neither queue for nor hold a slot.
+        """
+        if acquire is not None:
+            runnable = SlottedRunnable(runnable, acquire)
+        if not settings.ENABLE_COALESCING:
+            return runnable
+        return CoalescedRunnable(self, runnable, key)
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "shared_chunks": self.shared_chunks,
+            "cancelled": self.cancelled
+        }
+
+
+class CoalescedRunnable:
+    """astream()-only wrapper that routes through a Singleflight"""
+
+    def __init__(self, flights: Singleflight, runnable: Any, key: str):
+        self._flights = flights
+        self._runnable = runnable
+        self.key = key
+
+    def astream(self, inputs: Any) -> AsyncIterator[Any]:
+        return self._flights.stream(self.key, lambda: self._runnable.astream(inputs))
+
+
+class SlottedRunnable:
+    """astream()-only wrapper that holds a rate-limit slot while streaming"""
+
+    def __init__(self, runnable: Any, acquire: Callable[[], Any]):
+        self._runnable = runnable
+        self._acquire = acquire
+
+    async def astream(self, inputs: Any) -> AsyncIterator[Any]:
+        async with self._acquire():
+            async for chunk in self._runnable.astream(inputs):
+                yield chunk
+
+
+# Global singleton
+singleflight = Singleflight()
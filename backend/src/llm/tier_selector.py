@@ -0,0 +1,162 @@
+from dataclasses import dataclass, asdict
+from typing import Literal, Optional
+import logging
+
+from ..config import settings, PROVIDER_MODELS
+from .circuit_breaker import circuit_breakers
+from .health_prober import health_prober
+from .metrics import provider_metrics, percentile
+
+logger = logging.getLogger(__name__)
+
+TierType = Literal["fast", "balanced", "quality"]
+
+# Best quality first
+TIER_PREFERENCE: tuple[TierType, ...] = ("quality", "balanced", "fast")
+
+
+@dataclass
+class LatencyEstimate:
+    """Predicted latency for one model from its rolling metrics"""
+    provider: str
+    model: str
+    tier: str
+    ttft_ms: float
+    decode_ms: float
+    total_ms: float
+    error_rate: float
+
+    def to_dict(self) -> dict:
+        return {key: round(value, 1) if isinstance(value, float) else value
+                for key, value in asdict(self).items()}
+
+
+class TierSelector:
+    """
+    Picks the best-quality model expected to answer within a latency budget
+
+    For each tier (quality, balanced, fast) of a provider the expected
+    latency is
+
+        TTFT (p90 ms per prompt token x prompt tokens, or p90 TTFT,
+              at least the fresh health-probe EWMA latency)
+        + output tokens (p90 observed, at most max_tokens) / p50 tokens/sec
+
+    Models without METRICS_MIN_SAMPLES recent samples, an open circuit,
+    failing health probes or too high an error rate are not chosen on a
+    guess; if no measured model fits, the caller's default tier is used.
+    """
+
+    def __init__(self):
+        self.decisions: dict[str, dict] = {}  # provider -> last decision
+        self.fallbacks = 0
+
+    def estimate(
+        self,
+        provider: str,
+        model: str,
+        prompt_tokens: Optional[int] = None,
+        max_tokens: Optional[int] = None
+    ) -> Optional[LatencyEstimate]:
+        """Expected latency of a request on provider/model, None without enough data"""
+        stats = provider_metrics.get(provider, model)
+        ttfts = stats.recent_ttfts()
+        throughputs = stats.recent_throughputs()
+        if stats.sample_count() < settings.METRICS_MIN_SAMPLES or not ttfts or not throughputs:
+            return None
+
+        ttft_ms = percentile(ttfts, 90)
+        prefill_rates = stats.recent_prefill_rates()
+        if prompt_tokens and prefill_rates:
+            # Never predict below the fastest TTFT seen (network / scheduling floor)
+            ttft_ms = max(min(ttfts), percentile(prefill_rates, 90) * prompt_tokens)
+        # Fresh probes show a provider that slowed down since its last real request
+        probe_ms = health_prober.latency_ms(provider, model)
+        if probe_ms is not None:
+            ttft_ms = max(ttft_ms, probe_ms)
+
+        output_tokens = percentile(stats.recent_output_tokens(), 90) or max_tokens or settings.MAX_TOKENS
+        if max_tokens:
+            output_tokens = min(output_tokens, max_tokens)
+        decode_ms = output_tokens / percentile(throughputs, 50) * 1000
+
+        return LatencyEstimate(
+            provider=provider,
+            model=model,
+            tier="",
+            ttft_ms=ttft_ms,
+            decode_ms=decode_ms,
+            total_ms=ttft_ms + decode_ms,
+            error_rate=stats.error_rate()
+        )
+
+    def select_model(
+        self,
+        provider: str,
+        budget_ms: float,
+        prompt_tokens: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        default_tier: TierType = "fast"
+    ) -> str:
+        """
+        Best-quality model of a provider expected to finish within budget_ms
+
+        Args:
+            provider: Provider to choose a model for
+            budget_ms: Latency budget, e.g. 800 for inline completion
+            prompt_tokens: Prompt size (see context_sizing.size_request)
+            max_tokens: Output budget
+            default_tier: Tier used when no measured model fits
+
+        Returns:
+            Model name
+        """
+        models = PROVIDER_MODELS[provider]
+        estimates = []
+        seen = set()
+        for tier in TIER_PREFERENCE:
+            model = models[tier]
+            if model in seen:
+                continue
+            seen.add(model)
+
+            if not circuit_breakers.get(provider, model).allow_request():
+                continue
+            if health_prober.is_down(provider, model):
+                continue
+            estimate = self.estimate(provider, model, prompt_tokens, max_tokens)
+            if estimate is None or estimate.error_rate > settings.PROVIDER_MAX_ERROR_RATE:
+                continue
+            estimate.tier = tier
+            estimates.append(estimate)
+            if estimate.total_ms <= budget_ms:
+                self._record(provider, budget_ms, estimate, estimates)
+                return model
+
+        self.fallbacks += 1
+        self._record(provider, budget_ms, None, estimates, default_tier)
+        return models[default_tier]
+
+    def _record(
+        self,
+        provider: str,
+        budget_ms: float,
+        chosen: Optional[LatencyEstimate],
+        estimates: list[LatencyEstimate],
+        default_tier: Optional[str] = None
+    ):
+        self.decisions[provider] = {
+            "budget_ms": budget_ms,
+            "model": chosen.model if chosen else PROVIDER_MODELS[provider][default_tier],
+            "reason": "estimate" if chosen else f"no measured model fits, default tier {default_tier}",
+            "estimates": [e.to_dict() for e in estimates]
+        }
+        if chosen is None:
+            logger.debug(f"No {provider} model expected within {budget_ms}ms, using {default_tier}")
+
+    def get_stats(self) -> dict:
+        return {"fallbacks": self.fallbacks, "last_decisions": self.decisions}
+
+
+# Global singleton
+tier_selector = TierSelector()
@@ -0,0 +1,197 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+import time
+
+from ..config import settings
+
+
+@dataclass
+class TypeaheadEntry:
+    """A completion returned for one cursor position"""
+    anchor: str  # Tail of the prefix it was generated for
+    suffix_head: str
+    completion: str
+    provider: Optional[str]  # As requested (None = routed)
+    model: Optional[str]
+    model_used: str
+    confidence: float
+    created_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class TypeaheadHit:
+    """Rest of an earlier completion the user is typing through"""
+    completion: str
+    model_used: str
+    confidence: float
+    typed_chars: int
+
+
+class TypeaheadIndex:
+    """
+    Per-document anchor index of recent completions, for type-ahead reuse
+
+    While the user types the characters of a suggestion that is on screen,
+    the editor requests a new completion on every keystroke. If the new
+    prefix is an earlier prefix plus text matching the start of the
+    completion returned for it, the rest of that completion is the answer;
+    no model call is needed.
+
+    Each entry is anchored on the last TYPEAHEAD_ANCHOR_LINES lines of its
+    prefix rather than the whole prefix: editors send a sliding window of
+    lines before the cursor, so the prefix start moves when the typed text
+    contains a newline. The suffix head must match too.
+    """
+
+    def __init__(
+        self,
+        max_documents: int = settings.TYPEAHEAD_MAX_DOCUMENTS,
+        entries_per_document: int = settings.TYPEAHEAD_ENTRIES_PER_DOCUMENT,
+        ttl_seconds: int = settings.TYPEAHEAD_TTL_SECONDS
+    ):
+        self.max_documents = max_documents
+        self.entries_per_document = entries_per_document
+        self.ttl_seconds = ttl_seconds
+        self._documents: OrderedDict[str, list[TypeaheadEntry]] = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+        self.typed_chars = 0
+
+    @staticmethod
+    def _anchor(prefix: str) -> str:
+        lines = prefix[-settings.TYPEAHEAD_ANCHOR_CHARS:].split("\n")
+        return "\n".join(lines[-settings.TYPEAHEAD_ANCHOR_LINES:])
+
+    @staticmethod
+    def _suffix_head(suffix: str) -> str:
+        return suffix[:settings.COMPLETION_CACHE_SUFFIX_CHARS].rstrip()
+
+    def record(
+        self,
+        document: Optional[str],
+        prefix: str,
+        suffix: str,
+        completion: str,
+        provider: Optional[str],
+        model: Optional[str],
+        model_used: str,
+        confidence: float
+    ):
+        """
+        Remember a completion returned for document at prefix
+
+        A newer completion for the same position replaces the older one.
+
+        Args:
+            document: Document key (None = not indexed)
+            prefix: Code before the cursor, as received
+            suffix: Code after the cursor
+            completion: Completion text returned
+            provider: Requested provider (None = routed)
+            model: Requested model (None = routed)
+            model_used: "provider:model" that generated it
+            confidence: Confidence returned with it
+        """
+        if not document or not prefix or not completion.strip() or not settings.ENABLE_TYPEAHEAD_REUSE:
+            return
+        entry = TypeaheadEntry(
+            anchor=self._anchor(prefix),
+            suffix_head=self._suffix_head(suffix),
+            completion=completion,
+            provider=provider,
+            model=model,
+            model_used=model_used,
+            confidence=confidence
+        )
+        entries = [
+            e for e in self._documents.pop(document, [])
+            if (e.anchor, e.suffix_head) != (entry.anchor, entry.suffix_head)
+        ]
+        self._documents[document] = [entry] + entries[:self.entries_per_document - 1]
+        while len(self._documents) > self.max_documents:
+            self._documents.popitem(last=False)
+
+    def replace(self, document: Optional[str], prefix: str, suffix: str, completion: str, model_used: str, confidence: float):
+        """Swap the completion recorded at prefix (a progressive upgrade replaced the draft)"""
+        anchor = self._anchor(prefix)
+        suffix_head = self._suffix_head(suffix)
+        for entry in self._documents.get(document or "", []):
+            if (entry.anchor, entry.suffix_head) == (anchor, suffix_head):
+                entry.completion = completion
+                entry.model_used = model_used
+                entry.confidence = confidence
+                entry.created_at = time.time()
+                return
+
+    def lookup(
+        self,
+        document: Optional[str],
+        prefix: str,
+        suffix: str,
+        provider: Optional[str],
+        model: Optional[str]
+    ) -> Optional[TypeaheadHit]:
+        """
+        Rest of a recent completion that prefix has typed into, if any
+
+        Returns:
+            The remaining completion, None if no entry matches
+        """
+        if not document or not settings.ENABLE_TYPEAHEAD_REUSE:
+            return None
+        entries = self._documents.get(document)
+        if not entries:
+            return None
+        self.lookups += 1
+        self._documents.move_to_end(document)
+
+        now = time.time()
+        suffix_head = self._suffix_head(suffix)
+        for entry in entries:
+            if now - entry.created_at > self.ttl_seconds:
+                continue
+            if (entry.provider, entry.model, entry.suffix_head) != (provider, model, suffix_head):
+                continue
+            typed = self._typed_into(entry, prefix)
+            if typed is None:
+                continue
+            rest = entry.completion[len(typed):]
+            if not rest.strip():
+                continue  # Typed through the whole suggestion
+            self.hits += 1
+            self.typed_chars += len(typed)
+            return TypeaheadHit(rest, entry.model_used, entry.confidence, len(typed))
+        return None
+
+    @staticmethod
+    def _typed_into(entry: TypeaheadEntry, prefix: str) -> Optional[str]:
+        """Text typed after entry's anchor if it starts entry's completion, else None"""
+        # The anchor must end within len(completion) - 1 chars of the cursor
+        window_start = max(0, len(prefix) - len(entry.anchor) - len(entry.completion) + 1)
+        end = len(prefix)
+        while True:
+            index = prefix.rfind(entry.anchor, window_start, end)
+            if index < 0:
+                return None
+            typed = prefix[index + len(entry.anchor):]
+            if typed and entry.completion.startswith(typed):
+                return typed
+            end = index + len(entry.anchor) - 1
+
+    def clear(self):
+        self._documents.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            "documents": len(self._documents),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 3) if self.lookups else None,
+            "llm_calls_avoided": self.hits,
+            "avg_typed_chars": round(self.typed_chars / self.hits, 1) if self.hits else None
+        }
+
+
+# Global singleton
+typeahead_index = TypeaheadIndex()
@@ -1,18 +1,42 @@
-from typing import Optional
-from fastapi import FastAPI, HTTPException, Body
+from typing import TYPE_CHECKING, Literal, Optional
+from .utils.startup import startup_report
+from fastapi import FastAPI, HTTPException, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 import logging
+import orjson
 import time
 from .config import settings, PROVIDER_MODELS
-from .models.schemas import CompletionRequest, CompletionResponse, HealthResponse
+from .models.schemas import CompletionRequest, CompletionResponse, CompletionUpgradeResponse, HealthResponse
 from .llm.ollama_client import ollama_client
 from .llm.llm_manager import llm_manager
+from .llm.provider_chain import provider_chain
+from .llm.metrics import provider_metrics
+from .llm.rate_limiter import rate_limiter
+from .llm.circuit_breaker import circuit_breakers
+from .llm.prompt_sessions import prompt_sessions
+from .llm.tier_selector import tier_selector
+from .llm.singleflight import singleflight
+from .llm.completion_upgrades import completion_upgrades
+from .llm.shared_cache import cache_key, shared_cache
+from .llm.typeahead import typeahead_index
+from .llm.early_stop import early_stop_stats
+from .llm.health_prober import health_prober
 from .agents.code_completion_agent import completion_agent
-from .utils.error_handler import global_exception_handler
+from .utils.error_handler import global_exception_handler, LocoException, is_rate_limit_error
+from .utils.cancellation import document_requests
+from .utils.deadline import endpoint_deadline
+from .llm.generation import collect_stream
+from .llm.context_sizing import size_request
 from pydantic import BaseModel
-from src.agents.graph import agent_graph, AgentState
 from langchain_core.messages import HumanMessage
 
+if TYPE_CHECKING:
+    # LangGraph and the non-completion agents load on the first agent request
+    from src.agents.graph import AgentState
+
+startup_report.mark("imports")
+
 class ChatRequest(BaseModel):
     message: str
     code: Optional[str] = None
@@ -48,6 +72,7 @@ app.add_middleware(
 )
 
 # Global error handler
+app.add_exception_handler(LocoException, global_exception_handler)
 app.add_exception_handler(Exception, global_exception_handler)
 
 @app.get("/")
@@ -62,33 +87,67 @@ async def root():
 
 @app.get("/health", response_model=HealthResponse)
 async def health():
-    """Health check endpoint"""
-    try:
-        # Check Ollama if it's the default provider
-        if settings.DEFAULT_PROVIDER == "ollama":
-            await ollama_client.verify_connection()
-            models = ollama_client.get_available_models()
-        else:
-            models = []
-        
+    """
+    Health check endpoint
+    Reads the cached Ollama inventory, so it never waits on Ollama
+    """
+    if settings.DEFAULT_PROVIDER != "ollama":
         return HealthResponse(
             status="ok",
-            ollama_available=bool(models),
-            models_loaded=models
-        )
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        return HealthResponse(
-            status="degraded",
             ollama_available=False,
             models_loaded=[]
         )
+    
+    snapshot = ollama_client.get_inventory_snapshot()
+    ollama_ok = snapshot["reachable"] and not snapshot["stale"]
+    
+    return HealthResponse(
+        status="ok" if ollama_ok else "degraded",
+        ollama_available=ollama_ok and bool(snapshot["models"]),
+        models_loaded=snapshot["models"],
+        inventory_age_seconds=snapshot["age_seconds"],
+        inventory_stale=snapshot["stale"]
+    )
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe - the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe - does a live Ollama round trip and checks the default model
+    Returns 503 until the backend can actually serve completions
+    """
+    checks = {"providers": llm_manager.list_available_providers()}
+    ready = True
+    
+    if settings.DEFAULT_PROVIDER == "ollama":
+        try:
+            await ollama_client.verify_connection()
+            checks["ollama"] = "ok"
+            checks["default_model"] = ollama_client.is_model_available(
+                settings.OLLAMA_DEFAULT_MODEL
+            )
+            ready = checks["default_model"]
+        except Exception as e:
+            checks["ollama"] = str(e)
+            ready = False
+    
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
 
 @app.post("/api/v1/complete", response_model=CompletionResponse)
-async def complete_code(request: CompletionRequest):
+async def complete_code(request: CompletionRequest, http_request: Request):
     """
     Main code completion endpoint
     Uses LangChain agent with configurable providers
+    
+    A newer request with the same document_key cancels this one (409), and
+    so does the client disconnecting.
     """
     logger.info(
         f"Completion request: {request.language} at "
@@ -97,15 +156,21 @@ async def complete_code(request: CompletionRequest):
     
     try:
         # Use completion agent (respects config provider)
-        result = await completion_agent.complete(request)
+        with endpoint_deadline("complete"):
+            result = await document_requests.run(
+                request.document_key,
+                completion_agent.complete(request),
+                is_disconnected=http_request.is_disconnected
+            )
         return result
         
+    except LocoException:
+        raise  # Mapped to 429/503 by global_exception_handler
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Completion failed: {error_msg}")
         
-        # Check for rate limit errors
-        if "rate_limit_exceeded" in error_msg or "429" in error_msg:
+        if is_rate_limit_error(e):
             raise HTTPException(
                 status_code=429,
                 detail=f"Rate limit exceeded. Please wait a moment and try again. {error_msg}"
@@ -116,10 +181,54 @@ async def complete_code(request: CompletionRequest):
             detail=f"Completion error: {error_msg}"
         )
 
+@app.post("/api/v1/complete/stream")
+async def complete_code_stream(request: CompletionRequest, format: Literal["sse", "ndjson"] = "sse"):
+    """
+    Streaming code completion
+    
+    Emits frames as the model generates: "delta" (text to append),
+    "reset" (a fallback hop restarted; drop the text so far), then "done"
+    with the final completion, latency_ms, model_used, confidence and
+    ttft_ms, or "error". Disconnecting cancels the generation, and so
+    does a newer request with the same document_key.
+    
+    Query params:
+        format: "sse" (text/event-stream) or "ndjson" (one JSON object per line)
+    """
+    logger.info(f"Streaming completion request: {request.language} at {request.filepath}:{request.cursor_line}")
+    
+    def encode(frame: dict) -> bytes:
+        if format == "ndjson":
+            return orjson.dumps(frame) + b"\n"
+        return b"event: " + frame["type"].encode() + b"\ndata: " + orjson.dumps(frame) + b"\n\n"
+    
+    async def frames():
+        # Runs after the endpoint returns, so the deadline is set here
+        with endpoint_deadline("complete"):
+            try:
+                async for frame in completion_agent.stream(request):
+                    yield encode(frame)
+            except Exception as e:
+                # Headers are already sent: report the status the JSON endpoint would use in the frame
+                error_response = await global_exception_handler(None, e)
+                yield encode({
+                    "type": "error",
+                    "status_code": error_response.status_code,
+                    **orjson.loads(error_response.body)
+                })
+    
+    return StreamingResponse(
+        frames(),
+        media_type="application/x-ndjson" if format == "ndjson" else "text/event-stream",
+        # No proxy buffering: the point is to show the first token early
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/v1/complete/{provider}")
 async def complete_with_provider(
     provider: str,
-    request: CompletionRequest
+    request: CompletionRequest,
+    http_request: Request
 ):
     """
     Complete code using specific provider
@@ -136,15 +245,21 @@ async def complete_with_provider(
         )
     
     try:
-        result = await completion_agent.complete(request, provider=provider)
+        with endpoint_deadline("complete"):
+            result = await document_requests.run(
+                request.document_key,
+                completion_agent.complete(request, provider=provider),
+                is_disconnected=http_request.is_disconnected
+            )
         return result
         
+    except LocoException:
+        raise  # Mapped to 429/503 by global_exception_handler
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Completion failed: {error_msg}")
         
-        # Check for rate limit errors
-        if "rate_limit_exceeded" in error_msg or "429" in error_msg:
+        if is_rate_limit_error(e):
             raise HTTPException(
                 status_code=429,
                 detail=f"Rate limit exceeded. Please wait a moment and try again. {error_msg}"
@@ -155,12 +270,30 @@ async def complete_with_provider(
             detail=f"Completion error: {error_msg}"
         )
 
+@app.get("/api/v1/complete/upgrade/{request_id}", response_model=CompletionUpgradeResponse)
+async def get_completion_upgrade(request_id: str, wait_ms: int = 0):
+    """
+    Quality upgrade of a progressive completion
+    
+    Query params:
+        wait_ms: Long-poll up to this long while the upgrade is pending
+            (capped at PROGRESSIVE_UPGRADE_TIMEOUT_SECONDS)
+    """
+    wait_ms = max(0, min(wait_ms, int(settings.PROGRESSIVE_UPGRADE_TIMEOUT_SECONDS * 1000)))
+    slot = await completion_upgrades.fetch(request_id, wait_ms=wait_ms)
+    if slot is None:
+        raise HTTPException(status_code=404, detail=f"No upgrade for request {request_id}")
+    return slot.to_dict()
+
 @app.get("/api/v1/providers")
 async def list_providers():
     """List available LLM providers and their status"""
     return {
         "default_provider": settings.DEFAULT_PROVIDER,
         "available_providers": llm_manager.list_available_providers(),
+        "provider_chain": provider_chain.get_provider_order(),
+        "circuit_breakers": circuit_breakers.get_stats(),
+        "health": health_prober.get_stats(),
         "models": {
             "ollama": list(PROVIDER_MODELS.get("ollama", {}).values()),
             "groq": list(PROVIDER_MODELS.get("groq", {}).values()),
@@ -169,6 +302,28 @@ async def list_providers():
         }
     }
 
+@app.get("/api/v1/metrics")
+async def metrics():
+    """Runtime performance counters for the LLM layer"""
+    return {
+        "llm_pool": llm_manager.get_pool_stats(),
+        "hedging": llm_manager.get_hedge_stats(),
+        "rate_limits": rate_limiter.get_stats(),
+        "ollama_warmup": ollama_client.get_warmup_stats(),
+        "ollama_native": ollama_client.get_native_stats(),
+        "prompt_sessions": prompt_sessions.get_stats(),
+        "tier_selector": tier_selector.get_stats(),
+        "coalescing": singleflight.get_stats(),
+        "cache": shared_cache.get_stats(),
+        "typeahead": typeahead_index.get_stats(),
+        "progressive_upgrades": completion_upgrades.get_stats(),
+        "cancellation": document_requests.get_stats(),
+        "early_stop": early_stop_stats.get_stats(),
+        "startup": startup_report.to_dict(),
+        "provider_chain": provider_chain.get_stats(),
+        "providers": provider_metrics.get_stats()
+    }
+
 @app.on_event("startup")
 async def startup_event():
     """Run on startup"""
@@ -176,13 +331,28 @@ async def startup_event():
     logger.info(f"Default provider: {settings.DEFAULT_PROVIDER}")
     logger.info(f"Available providers: {llm_manager.list_available_providers()}")
     
-    # Verify Ollama if it's being used
-    if settings.DEFAULT_PROVIDER == "ollama":
-        try:
-            await ollama_client.verify_connection()
-            logger.info("✓ Ollama connection verified")
-        except Exception as e:
-            logger.warning(f"⚠ Ollama not available: {e}")
+    # Shared keep-alive connection pool for all Ollama traffic
+    await ollama_client.start()
+    
+    # Model inventory (first load logs whether Ollama is up), only when
+    # requests can be routed to Ollama
+    if "ollama" in provider_chain.get_provider_order():
+        await ollama_client.start_inventory_refresh()
+        
+        # Preload tier models in the background so startup isn't blocked
+        # (waits for Ollama if it isn't up yet)
+        if settings.DEFAULT_PROVIDER == "ollama" and settings.OLLAMA_WARMUP_ON_STARTUP:
+            await ollama_client.start_keep_warm()
+    
+    # Shared L2 cache (in-process only if REDIS_URL is unset or unreachable)
+    await shared_cache.connect()
+    
+    # Background health probes (after the inventory is known, so only pulled models are probed)
+    if settings.DEFAULT_PROVIDER != "mock":
+        await health_prober.start()
+    
+    startup_report.mark("startup")
+    logger.info(f"⏱ Startup: {startup_report.to_dict()}")
 
 @app.post("/api/v1/configure")
 async def configure_settings(settings_update: dict = Body(...)):
@@ -250,12 +420,6 @@ async def chat(
         logger.info(f"Using model: {model}")
         temperature = request.get("temperature", 0.3)
 
-        llm = llm_manager.get_llm(
-            provider=provider,
-            model=model,
-            temperature=temperature,
-            max_tokens=2048
-        )
 
         # Extract messages and files
         messages = request.get("messages", []) or []
@@ -285,32 +449,63 @@ async def chat(
         if file_context:
             conversation = file_context + "\n" + conversation
         
-        # Generate response
+        # Generate response (requested provider first, then the fallback chain)
         start_time = time.time()
-        llm_response = await llm.ainvoke(conversation + "\nASSISTANT:")
+        with endpoint_deadline("chat"):
+            result = await provider_chain.run(
+                lambda llm: collect_stream(llm, conversation + "\nASSISTANT:"),
+                task="chat",
+                provider=provider,
+                model=model,
+                tier="balanced",
+                latency_budget_ms=settings.LATENCY_BUDGETS_MS.get("chat"),
+                temperature=temperature,
+                **size_request(conversation, "chat")
+            )
         latency_ms = int((time.time() - start_time) * 1000)
         
-        # Handle different response types
-        # ChatModels (Groq, OpenAI, Gemini) return AIMessage objects
-        # OllamaLLM returns strings directly
-        if hasattr(llm_response, 'content'):
-            response_text = llm_response.content
-        elif isinstance(llm_response, str):
-            response_text = llm_response
-        else:
-            # Fallback: try to convert to string
-            response_text = str(llm_response)
+        # collect_stream normalizes ChatModel message chunks and OllamaLLM strings
+        response_text = result.output.text
         
         return {
             "message": response_text,
-            "model_used": f"{provider}:{model or 'default'}",
-            "latency_ms": latency_ms
+            "model_used": f"{result.provider}:{result.model}",
+            "latency_ms": latency_ms,
+            "truncated": result.output.truncated
         }
         
+    except LocoException:
+        raise
     except Exception as e:
         logger.error(f"Chat failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _cached_agent_response(endpoint: str, request: dict, run) -> dict:
+    """
+    Agent endpoint response from the shared cache, or computed and cached
+    
+    Args:
+        endpoint: Endpoint name (part of the key)
+        request: Request body; "bypass_cache": true skips the lookup
+        run: Coroutine function computing the response dict
+    """
+    if not settings.ENABLE_CACHE:
+        return await run()
+    
+    key = cache_key(endpoint, {k: v for k, v in request.items() if k != "bypass_cache"})
+    if request.get("bypass_cache"):
+        shared_cache.bypass("agent")
+    else:
+        cached = await shared_cache.get("agent", key)
+        if cached is not None:
+            return {**cached, "cached": True}
+    
+    response = await run()
+    # Timeouts and workflow errors come back with zero confidence
+    if not response.get("truncated") and response.get("confidence", 0.0) > 0:
+        shared_cache.set("agent", key, response)
+    return response
+
 @app.post("/api/v1/agent/process")
 async def process_with_agent(request: dict):
     """
@@ -343,14 +538,22 @@ async def process_with_agent(request: dict):
         }
         
         # Run agent graph
-        final_state = await agent_graph.run(initial_state)
+        from src.agents.graph import agent_graph
         
-        return {
-            "response": final_state.get("response", ""),
-            "agent_used": final_state.get("next_agent", "unknown"),
-            "confidence": final_state.get("confidence", 0.0),
-            "routing_reason": final_state.get("routing_reason", "")
-        }
+        async def run() -> dict:
+            final_state = await agent_graph.run(
+                initial_state,
+                timeout_seconds=settings.ENDPOINT_DEADLINES.get("agent", settings.TIMEOUT_SECONDS)
+            )
+            return {
+                "response": final_state.get("response", ""),
+                "agent_used": final_state.get("next_agent", "unknown"),
+                "confidence": final_state.get("confidence", 0.0),
+                "routing_reason": final_state.get("routing_reason", ""),
+                "truncated": final_state.get("truncated", False)
+            }
+        
+        return await _cached_agent_response("process", request, run)
         
     except Exception as e:
         logger.error(f"Agent processing failed: {e}")
@@ -386,12 +589,17 @@ async def debug_code_endpoint(request: dict):
         }
         
         from src.agents.debug_agent import debug_agent
-        final_state = await debug_agent.debug(initial_state)
         
-        return {
-            "response": final_state.get("response", ""),
-            "confidence": final_state.get("confidence", 0.0)
-        }
+        async def run() -> dict:
+            with endpoint_deadline("debug"):
+                final_state = await debug_agent.debug(initial_state)
+            return {
+                "response": final_state.get("response", ""),
+                "confidence": final_state.get("confidence", 0.0),
+                "truncated": final_state.get("truncated", False)
+            }
+        
+        return await _cached_agent_response("debug", request, run)
         
     except Exception as e:
         logger.error(f"Debug failed: {e}")
@@ -427,12 +635,17 @@ async def explain_code_endpoint(request: dict):
         }
         
         from src.agents.explain_agent import explain_agent
-        final_state = await explain_agent.explain(initial_state)
         
-        return {
-            "response": final_state.get("response", ""),
-            "confidence": final_state.get("confidence", 0.0)
-        }
+        async def run() -> dict:
+            with endpoint_deadline("explain"):
+                final_state = await explain_agent.explain(initial_state)
+            return {
+                "response": final_state.get("response", ""),
+                "confidence": final_state.get("confidence", 0.0),
+                "truncated": final_state.get("truncated", False)
+            }
+        
+        return await _cached_agent_response("explain", request, run)
         
     except Exception as e:
         logger.error(f"Explain failed: {e}")
@@ -468,12 +681,17 @@ async def refactor_code_endpoint(request: dict):
         }
         
         from src.agents.refactor_agent import refactor_agent
-        final_state = await refactor_agent.refactor(initial_state)
         
-        return {
-            "response": final_state.get("response", ""),
-            "confidence": final_state.get("confidence", 0.0)
-        }
+        async def run() -> dict:
+            with endpoint_deadline("refactor"):
+                final_state = await refactor_agent.refactor(initial_state)
+            return {
+                "response": final_state.get("response", ""),
+                "confidence": final_state.get("confidence", 0.0),
+                "truncated": final_state.get("truncated", False)
+            }
+        
+        return await _cached_agent_response("refactor", request, run)
         
     except Exception as e:
         logger.error(f"Refactor failed: {e}")
@@ -509,12 +727,17 @@ async def document_code_endpoint(request: dict):
         }
         
         from src.agents.documentation_agent import documentation_agent
-        final_state = await documentation_agent.generate_documentation(initial_state)
         
-        return {
-            "response": final_state.get("response", ""),
-            "confidence": final_state.get("confidence", 0.0)
-        }
+        async def run() -> dict:
+            with endpoint_deadline("documentation"):
+                final_state = await documentation_agent.generate_documentation(initial_state)
+            return {
+                "response": final_state.get("response", ""),
+                "confidence": final_state.get("confidence", 0.0),
+                "truncated": final_state.get("truncated", False)
+            }
+        
+        return await _cached_agent_response("documentation", request, run)
         
     except Exception as e:
         logger.error(f"Documentation failed: {e}")
@@ -524,6 +747,12 @@ async def document_code_endpoint(request: dict):
 async def shutdown_event():
     """Run on shutdown"""
     logger.info("👋 Loco backend shutting down...")
+    
+    # Pooled OllamaLLM instances hold the shared transport; drop them with it
+    await health_prober.stop()
+    await shared_cache.close()
+    llm_manager.pool.clear()
+    await ollama_client.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -10,6 +10,10 @@ class CompletionRequest(BaseModel):
     cursor_line: int
     cursor_column: int
     additional_context: Optional[List[str]] = None
+    progressive: Optional[bool] = None  # Fast draft + background upgrade (default ENABLE_PROGRESSIVE_COMPLETION)
+    request_id: Optional[str] = None  # Generated for progressive requests if missing
+    bypass_cache: bool = False  # Always generate (and refresh the cached entry)
+    document_key: Optional[str] = None  # Editor document/session; a newer request for it cancels this one
 
 class CompletionResponse(BaseModel):
     """Response model for code completion"""
@@ -17,12 +21,28 @@ class CompletionResponse(BaseModel):
     confidence: float  # 0.0 - 1.0
     model_used: str  # Which LLM generated it
     latency_ms: int
+    truncated: bool = False  # Request deadline cut generation short
+    request_id: Optional[str] = None
+    upgrade_pending: bool = False  # A quality upgrade can be fetched with request_id
+    cached: bool = False  # Served from the completion cache
+
+class CompletionUpgradeResponse(BaseModel):
+    """Background quality upgrade of a progressive completion"""
+    request_id: str
+    status: str  # pending, ready, unchanged, failed, superseded
+    completion: Optional[str] = None  # Set when ready/unchanged
+    model_used: Optional[str] = None
+    draft_model: str
+    arrival_ms: Optional[int] = None  # Draft returned -> upgrade ready
+    error: Optional[str] = None
 
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str
     ollama_available: bool
     models_loaded: List[str]
+    inventory_age_seconds: Optional[float] = None
+    inventory_stale: bool = False
 
 class LocoSettings(BaseModel):
     default_provider: str
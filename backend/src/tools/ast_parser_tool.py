@@ -1,8 +1,18 @@
+from __future__ import annotations
+
 from langchain_core.tools import tool
-import tree_sitter_python as tspython
-import tree_sitter_javascript as tsjavascript
-from tree_sitter import Language, Parser, Node
-from typing import Literal
+from typing import TYPE_CHECKING, Literal, Optional
+import importlib
+
+if TYPE_CHECKING:
+    from tree_sitter import Node, Parser
+
+# Grammar module per language; loaded on first parse of that language
+GRAMMAR_MODULES = {
+    'python': 'tree_sitter_python',
+    'javascript': 'tree_sitter_javascript',
+    'typescript': 'tree_sitter_javascript',
+}
 
 class ASTParserTool:
     """
@@ -11,19 +21,26 @@ class ASTParserTool:
     """
     
     def __init__(self):
-        # Initialize parsers for different languages
-        self.parsers = {
-            'python': self._init_parser(tspython.language()),
-            'javascript': self._init_parser(tsjavascript.language()),
-            'typescript': self._init_parser(tsjavascript.language()),
-        }
+        # Parsers are built lazily so importing an agent doesn't load tree-sitter
+        self.parsers: dict[str, Parser] = {}
     
     def _init_parser(self, language_func) -> Parser:
         """Initialize parser for a language"""
+        from tree_sitter import Language, Parser
         lang = Language(language_func)
         parser = Parser(lang)
         return parser
     
+    def get_parser(self, language: str) -> Optional[Parser]:
+        """Parser for a language, built on first use (None if unsupported)"""
+        if language not in self.parsers:
+            module_name = GRAMMAR_MODULES.get(language)
+            if module_name is None:
+                return None
+            grammar = importlib.import_module(module_name)
+            self.parsers[language] = self._init_parser(grammar.language())
+        return self.parsers[language]
+    
     @tool
     def parse_code(
         self, 
@@ -40,7 +57,7 @@ class ASTParserTool:
         Returns:
             Structured AST information
         """
-        parser = self.parsers.get(language)
+        parser = self.get_parser(language)
         if not parser:
             return {"error": f"Language {language} not supported"}
         
@@ -0,0 +1,154 @@
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional, TypeVar
+import asyncio
+import logging
+
+from ..config import settings
+from .error_handler import ClientDisconnectedError, RequestSupersededError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Set once the current request is subscribed to its generation (see mark_attached)
+_attached: ContextVar[Optional[asyncio.Event]] = ContextVar("request_attached", default=None)
+
+
+def mark_attached():
+    """
+    Signal that the current request has subscribed to its generation
+
+    Called by Singleflight once a caller has started or joined a flight. A
+    superseding request waits for this before cancelling the older one, so
+    an identical prompt joins the generation already running instead of
+    cancelling it and starting over.
+    """
+    attached = _attached.get()
+    if attached is not None:
+        attached.set()
+
+
+class DocumentRequests:
+    """
+    Cancels work nobody will read: superseded and abandoned requests
+
+    Requests that carry a document key run as a task registered under that
+    key. A newer request for the same key cancels the older one, whose
+    caller gets RequestSupersededError. With an is_disconnected check, the
+    task is also cancelled when the HTTP client goes away.
+
+    Cancelling the task unwinds the provider chain: the rate-limiter slot is
+    released and the model stream is closed, which makes Ollama stop
+    generating (a coalesced generation stops once its last caller is gone).
+    The newer request subscribes to its own generation first, so a retyped
+    identical prompt keeps the generation that is already running.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._superseded: set[asyncio.Task] = set()
+        self.requests = 0
+        self.superseded = 0
+        self.disconnected = 0
+
+    def supersede(self, document: Optional[str]):
+        """Cancel the in-flight request for document, if any"""
+        if document:
+            self._cancel(document, self._tasks.get(document))
+
+    def _cancel(self, document: str, previous: Optional[asyncio.Task]):
+        if not settings.ENABLE_SUPERSESSION or previous is None or previous.done():
+            return
+        self._superseded.add(previous)
+        previous.cancel()
+        self.superseded += 1
+        logger.debug(f"✂️ Superseded in-flight completion for {document}")
+
+    async def run(
+        self,
+        document: Optional[str],
+        work: Awaitable[T],
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> T:
+        """
+        Run work, cancelling it if superseded or if the client disconnects
+
+        Args:
+            document: Document key (None = never superseded)
+            work: Coroutine to run (in a task that inherits the current deadline)
+            is_disconnected: Async check for a client disconnect (Request.is_disconnected)
+
+        Returns:
+            Result of work
+
+        Raises:
+            RequestSupersededError: A newer request for document cancelled this one
+            ClientDisconnectedError: The client went away first
+        """
+        self.requests += 1
+        previous = self._tasks.get(document) if document else None
+        attached = asyncio.Event()
+        token = _attached.set(attached)
+        try:
+            task = asyncio.ensure_future(work)  # Copies the context, attached included
+        finally:
+            _attached.reset(token)
+        if document:
+            self._tasks[document] = task
+        watcher = asyncio.create_task(self._watch(is_disconnected)) if is_disconnected else None
+        try:
+            if previous is not None and not previous.done() and settings.ENABLE_SUPERSESSION:
+                # Subscribe to our generation first: with an identical prompt
+                # we join the older request's flight before it is cancelled
+                attach = asyncio.create_task(attached.wait())
+                try:
+                    await asyncio.wait(
+                        {task, attach},
+                        timeout=settings.SUPERSEDE_ATTACH_TIMEOUT_MS / 1000,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    attach.cancel()
+                self._cancel(document, previous)
+            if watcher is not None:
+                await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if not task.done():
+                    task.cancel()
+                    self.disconnected += 1
+                    raise ClientDisconnectedError("Client disconnected before the completion finished")
+            try:
+                return await task
+            except asyncio.CancelledError:
+                if task in self._superseded:
+                    raise RequestSupersededError(f"Superseded by a newer request for {document}")
+                if not asyncio.current_task().cancelling():
+                    # Cancelled by something other than us or a newer request;
+                    # a CancelledError would escape the app with no response
+                    raise RuntimeError(f"Completion for {document} was cancelled unexpectedly")
+                raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            if not task.done():
+                task.cancel()  # We were cancelled ourselves
+            self._superseded.discard(task)
+            if document and self._tasks.get(document) is task:
+                del self._tasks[document]
+
+    @staticmethod
+    async def _watch(is_disconnected: Callable[[], Awaitable[bool]]):
+        """Return once the client has disconnected"""
+        while not await is_disconnected():
+            await asyncio.sleep(settings.DISCONNECT_POLL_INTERVAL_MS / 1000)
+
+    def get_stats(self) -> dict:
+        return {
+            "in_flight": sum(not task.done() for task in self._tasks.values()),
+            "requests": self.requests,
+            "superseded": self.superseded,
+            "disconnected": self.disconnected
+        }
+
+
+# Global singleton
+document_requests = DocumentRequests()
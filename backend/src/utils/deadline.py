@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+import time
+
+from ..config import settings
+
+
+class Deadline:
+    """Absolute request deadline on the monotonic clock"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("loco_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the request being handled, if any"""
+    return _current_deadline.get()
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left on the current deadline, None if there is no deadline"""
+    deadline = current_deadline()
+    return deadline.remaining() if deadline else None
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[Deadline]]:
+    """
+    Set the request deadline for everything awaited inside the block
+
+    The deadline travels with the asyncio context, so graph nodes, agents and
+    LLM calls started from here all see it. A nested scope can only shorten
+    the deadline, never extend it.
+
+    Args:
+        seconds: Time budget, None to keep the current deadline
+    """
+    outer = current_deadline()
+    if seconds is None:
+        yield outer
+        return
+
+    deadline = Deadline(seconds)
+    if outer is not None and outer.expires_at < deadline.expires_at:
+        deadline = outer
+
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+
+def endpoint_deadline(endpoint: str):
+    """deadline_scope for an endpoint from ENDPOINT_DEADLINES (default TIMEOUT_SECONDS)"""
+    return deadline_scope(settings.ENDPOINT_DEADLINES.get(endpoint, settings.TIMEOUT_SECONDS))
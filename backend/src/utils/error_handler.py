@@ -12,10 +12,57 @@ class OllamaConnectionError(LocoException):
     """Ollama server not responding"""
     pass
 
+class OllamaGenerationError(LocoException):
+    """Ollama reported an error in the middle of a generation"""
+    pass
+
+class MockProviderError(LocoException):
+    """Failure injected by the mock provider (MOCK_ERROR_RATE)"""
+    pass
+
 class ModelNotFoundError(LocoException):
     """Requested model not available"""
     pass
 
+class RateLimitExceededError(LocoException):
+    """Provider has no capacity left within the caller's queue deadline"""
+    
+    def __init__(self, message: str, provider: str = "", retry_after: float = 1.0):
+        super().__init__(message)
+        self.provider = provider
+        self.retry_after = retry_after
+
+class DeadlineExceededError(LocoException):
+    """Request deadline expired before any output was produced"""
+    pass
+
+class RequestSupersededError(LocoException):
+    """A newer request for the same document cancelled this one"""
+    pass
+
+class ClientDisconnectedError(LocoException):
+    """The HTTP client went away before the response was ready"""
+    pass
+
+class ProviderChainError(LocoException):
+    """Every provider in the fallback chain failed"""
+    
+    def __init__(self, message: str, attempts: list = None):
+        super().__init__(message)
+        self.attempts = attempts or []
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    """True if an exception is a provider 429 / rate limit (Groq, OpenAI, Gemini, httpx)"""
+    if isinstance(exc, RateLimitExceededError):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status == 429:
+        return True
+    name = type(exc).__name__
+    return "RateLimit" in name or name == "ResourceExhausted"
+
 async def global_exception_handler(request: Request, exc: Exception):
     """Global error handler for all exceptions"""
     
@@ -39,6 +86,59 @@ async def global_exception_handler(request: Request, exc: Exception):
             }
         )
     
+    if isinstance(exc, RateLimitExceededError):
+        logger.warning(f"Rate limited: {exc}")
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+            content={
+                "error": "Rate limit exceeded",
+                "message": str(exc),
+                "retry_after": exc.retry_after,
+            }
+        )
+    
+    if isinstance(exc, DeadlineExceededError):
+        logger.warning(f"Deadline exceeded: {exc}")
+        return JSONResponse(
+            status_code=504,
+            content={
+                "error": "Deadline exceeded",
+                "message": str(exc),
+            }
+        )
+    
+    if isinstance(exc, RequestSupersededError):
+        logger.info(f"Superseded: {exc}")
+        return JSONResponse(
+            status_code=409,
+            content={
+                "error": "Request superseded",
+                "message": str(exc),
+            }
+        )
+    
+    if isinstance(exc, ClientDisconnectedError):
+        logger.info(f"Client disconnected: {exc}")
+        return JSONResponse(
+            status_code=499,  # Client Closed Request; nobody reads it
+            content={
+                "error": "Client disconnected",
+                "message": str(exc),
+            }
+        )
+    
+    if isinstance(exc, ProviderChainError):
+        logger.error(f"Provider chain exhausted: {exc}")
+        return JSONResponse(
+            status_code=503,
+            content={
+                "error": "No provider available",
+                "message": str(exc),
+                "attempts": exc.attempts,
+            }
+        )
+    
     # Generic error
     logger.exception("Unexpected error")
     return JSONResponse(
@@ -0,0 +1,60 @@
+from typing import Optional
+import sys
+import time
+
+# Modules that dominate cold start; these should only load on first use
+HEAVY_MODULES = (
+    "langchain_ollama",
+    "langchain_groq",
+    "langchain_google_genai",
+    "langchain_openai",
+    "langgraph",
+    "tree_sitter"
+)
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of this process in MB (peak RSS where /proc is missing)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kB on Linux, bytes on macOS
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        return None
+
+
+class StartupReport:
+    """
+    Time and memory at each startup phase, measured from the first import of
+    this module (src.main imports it before anything else)
+    """
+
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self.phases: dict[str, dict] = {}
+
+    def mark(self, phase: str):
+        """Record elapsed ms and RSS for a finished phase"""
+        self.phases[phase] = {
+            "elapsed_ms": round((time.perf_counter() - self._t0) * 1000, 1),
+            "rss_mb": current_rss_mb()
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "phases": self.phases,
+            "rss_mb": current_rss_mb(),
+            "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules]
+        }
+
+
+# Global singleton
+startup_report = StartupReport()
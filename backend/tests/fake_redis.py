@@ -0,0 +1,43 @@
+import time
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for redis.asyncio.Redis (the subset the cache uses)
+
+    One instance shared by several TwoTierCache objects behaves like one
+    Redis server shared by several replicas.
+    """
+
+    def __init__(self):
+        self.data: dict[str, tuple[bytes, float | None]] = {}  # key -> (value, expires_at)
+        self.fail = False
+        self.gets = 0
+
+    def _check(self):
+        if self.fail:
+            raise ConnectionError("fake redis is down")
+
+    async def ping(self) -> bool:
+        self._check()
+        return True
+
+    async def get(self, name: str):
+        self._check()
+        self.gets += 1
+        entry = self.data.get(name)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self.data[name]
+            return None
+        return value
+
+    async def set(self, name: str, value: bytes, ex: int | None = None) -> bool:
+        self._check()
+        self.data[name] = (value, time.monotonic() + ex if ex is not None else None)
+        return True
+
+    async def aclose(self):
+        pass
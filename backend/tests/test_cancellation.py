@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from src.config import settings
+from src.llm.generation import collect_stream
+from src.llm.singleflight import Singleflight
+from src.utils.cancellation import DocumentRequests
+from src.utils.error_handler import ClientDisconnectedError, RequestSupersededError
+
+
+class Generation:
+    """Stand-in for a completion that runs until cancelled or done"""
+
+    def __init__(self, seconds: float, result: str):
+        self.seconds = seconds
+        self.result = result
+        self.cancelled = False
+
+    async def run(self) -> str:
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_newer_request_supersedes_older_one():
+    """The older generation for a document is cancelled; the newer one completes"""
+    requests = DocumentRequests()
+    old, new = Generation(10, "old"), Generation(0.01, "new")
+
+    old_request = asyncio.create_task(requests.run("file:///a.py", old.run()))
+    await asyncio.sleep(0.01)
+
+    assert await requests.run("file:///a.py", new.run()) == "new"
+    with pytest.raises(RequestSupersededError):
+        await old_request
+    assert old.cancelled
+    assert requests.get_stats()["superseded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_superseding_request_with_identical_prompt_joins_generation():
+    """The newer request joins the older one's generation before cancelling it"""
+    requests = DocumentRequests()
+    flights = Singleflight()
+
+    class Tokens:
+        started = 0
+
+        async def astream(self, inputs):
+            self.started += 1
+            for token in ["return ", "a + b"]:
+                await asyncio.sleep(0.02)
+                yield token
+
+    runnable = Tokens()
+
+    def complete():
+        return collect_stream(flights.wrap(runnable, "same prompt"), None)
+
+    old_request = asyncio.create_task(requests.run("file:///a.py", complete()))
+    await asyncio.sleep(0.03)
+
+    output = await requests.run("file:///a.py", complete())
+    with pytest.raises(RequestSupersededError):
+        await old_request
+    assert output.text == "return a + b"
+    assert runnable.started == 1
+    assert flights.get_stats()["coalesced"] == 1
+
+
+@pytest.mark.asyncio
+async def test_other_documents_are_not_superseded():
+    """Requests for different documents, or without a key, run side by side"""
+    requests = DocumentRequests()
+
+    results = await asyncio.gather(
+        requests.run("file:///a.py", Generation(0.01, "a").run()),
+        requests.run("file:///b.py", Generation(0.01, "b").run()),
+        requests.run(None, Generation(0.01, "c").run()),
+        requests.run(None, Generation(0.01, "d").run())
+    )
+
+    assert results == ["a", "b", "c", "d"]
+    assert requests.get_stats()["superseded"] == 0
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_generation(monkeypatch):
+    """A client that went away stops the generation at the next poll"""
+    monkeypatch.setattr(settings, "DISCONNECT_POLL_INTERVAL_MS", 5)
+    requests = DocumentRequests()
+    generation = Generation(10, "never read")
+    polls = []
+
+    async def is_disconnected() -> bool:
+        polls.append(1)
+        return len(polls) >= 3
+
+    with pytest.raises(ClientDisconnectedError):
+        await asyncio.wait_for(requests.run("file:///a.py", generation.run(), is_disconnected), 1)
+    await asyncio.sleep(0)
+
+    assert generation.cancelled
+    assert requests.get_stats() == {"in_flight": 0, "requests": 1, "superseded": 0, "disconnected": 1}
@@ -0,0 +1,32 @@
+from src.llm.circuit_breaker import CircuitBreaker
+
+
+def test_opens_after_threshold():
+    """Consecutive failures open the breaker and block traffic"""
+    breaker = CircuitBreaker("ollama", "qwen2.5-coder:7b", failure_threshold=2, recovery_seconds=30)
+    
+    breaker.record_failure("connection refused")
+    assert breaker.allow_request()
+    
+    breaker.record_failure("connection refused")
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+    assert not breaker.probe_due()
+
+
+def test_half_open_probe_closes_or_reopens():
+    """A successful probe closes the breaker; a failed one re-opens it"""
+    breaker = CircuitBreaker("groq", "llama-3.1-8b-instant", failure_threshold=1, recovery_seconds=0)
+    breaker.record_failure("429")
+    assert breaker.probe_due()
+    
+    breaker.start_probe()
+    assert breaker.state == "half_open"
+    assert not breaker.allow_request()
+    breaker.record_failure("probe: 429")
+    assert breaker.state == "open"
+    
+    breaker.start_probe()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow_request()
@@ -0,0 +1,20 @@
+from src.llm.completion_cache import completion_cache_key
+
+
+def _key(prefix: str, suffix: str = "\nprint(x)\n") -> str:
+    return completion_cache_key("python", "ollama", "qwen2.5-coder:1.5b", prefix, suffix)
+
+
+def test_key_normalizes_line_endings_and_trailing_whitespace():
+    """CRLF files and trailing spaces on finished lines hit the same entry"""
+    assert _key("def f():  \r\n    return ") == _key("def f():\n    return ")
+    # Whitespace on the cursor line changes what comes next
+    assert _key("x =") != _key("x = ")
+
+
+def test_key_uses_only_text_near_the_cursor():
+    """Edits far above the cursor keep the key; the suffix head changes it"""
+    tail = "\n" + "y = 1\n" * 400 + "z = "
+
+    assert _key("import os" + tail) == _key("import sys" + tail)
+    assert _key("z = ", "\nreturn z\n") != _key("z = ", "\nprint(z)\n")
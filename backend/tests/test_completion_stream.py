@@ -0,0 +1,51 @@
+import pytest
+
+from src.agents.code_completion_agent import CodeCompletionAgent
+from src.llm.fim_templates import QWEN_FIM
+from src.llm.generation import IncrementalText
+from src.models.schemas import CompletionRequest, CompletionResponse
+
+
+def test_fim_stream_holds_back_partial_special_tokens():
+    """A tail that may become a FIM token is released only once it is code"""
+    view = IncrementalText(lambda raw: QWEN_FIM.clean(raw).rstrip(), markers=QWEN_FIM.stop)
+
+    assert view.feed("return a") == "return a"
+    assert view.feed(" + b  ") == " + b"
+    assert view.feed("<|endof") == ""
+    assert view.feed("text|>") == ""
+    assert view.released == "return a + b"
+
+
+def test_instruction_stream_waits_for_first_line():
+    """A preamble line is only recognizable (and dropped) once it is complete"""
+    agent = CodeCompletionAgent()
+    view = IncrementalText(lambda raw: agent._clean_completion(raw, "x = "), markers=("```",), hold_first_line=True)
+
+    assert view.feed("Here's the code:") == ""
+    assert view.feed("\ncompute(1, 2)\n``") == "compute(1, 2)"
+    assert view.feed("`") == ""
+
+
+@pytest.mark.asyncio
+async def test_stream_resets_when_fallback_hop_restarts(monkeypatch):
+    """Text from a failed hop is withdrawn before the next hop's text"""
+    agent = CodeCompletionAgent()
+
+    async def complete(request, provider=None, model=None, on_text=None):
+        on_text(0, "ret")
+        on_text(1, "return a")
+        on_text(1, " + b")
+        return CompletionResponse(completion="return a + b", confidence=0.85, model_used="mock:fast", latency_ms=3)
+
+    monkeypatch.setattr(agent, "complete", complete)
+    request = CompletionRequest(
+        prefix="def add(a, b):\n    ", suffix="", language="python",
+        filepath="add.py", cursor_line=1, cursor_column=4
+    )
+
+    frames = [frame async for frame in agent.stream(request)]
+
+    assert [frame["type"] for frame in frames] == ["delta", "reset", "delta", "delta", "done"]
+    assert frames[-1]["completion"] == "return a + b"
+    assert frames[-1]["ttft_ms"] is not None
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from src.config import settings
+from src.llm.completion_upgrades import CompletionUpgradeStore
+
+
+@pytest.mark.asyncio
+async def test_fetch_waits_for_pending_upgrade():
+    """A long-polling client gets the upgrade as soon as it lands"""
+    store = CompletionUpgradeStore()
+    store.create("r1", "a.py", "return a", "ollama:qwen2.5-coder:7b")
+
+    asyncio.get_running_loop().call_later(0.05, store.resolve, "r1", "return a + b", "ollama:deepseek-coder-v2:16b")
+    slot = await store.fetch("r1", wait_ms=1000)
+
+    assert slot.status == "ready"
+    assert slot.completion == "return a + b"
+    assert slot.arrival_ms is not None
+    assert store.get_stats()["replacement_rate"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_identical_upgrade_is_not_a_replacement():
+    """An upgrade equal to the draft is reported as unchanged"""
+    store = CompletionUpgradeStore()
+    store.create("r1", "a.py", "return a + b", "ollama:qwen2.5-coder:7b")
+    store.resolve("r1", "return a + b\n", "ollama:deepseek-coder-v2:16b")
+
+    slot = await store.fetch("r1")
+
+    assert slot.status == "unchanged"
+    assert store.get_stats()["replacement_rate"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_newer_request_supersedes_pending_upgrade():
+    """Typing on in the same document cancels the older upgrade"""
+    store = CompletionUpgradeStore()
+    first = store.create("r1", "a.py", "x", "ollama:fast")
+    first.task = asyncio.create_task(asyncio.sleep(10))
+    store.create("r2", "a.py", "y", "ollama:fast")
+    await asyncio.sleep(0)
+
+    assert first.status == "superseded"
+    assert first.task.cancelled()
+    store.resolve("r1", "late", "ollama:quality")
+    assert first.completion is None
+    assert (await store.fetch("r2")).status == "pending"
+
+
+def test_capacity_limits_pending_upgrades():
+    """No new upgrade starts while max_pending are running"""
+    store = CompletionUpgradeStore(max_pending=1)
+    assert store.has_capacity()
+    store.create("r1", "a.py", "x", "ollama:fast")
+
+    assert not store.has_capacity()
+    assert store.get_stats()["skipped_at_capacity"] == 1
+
+
+def test_pending_upgrades_leave_drafts_a_provider_slot(monkeypatch):
+    """Upgrades never hold every concurrency slot of the provider they run on"""
+    monkeypatch.setattr(settings, "PROVIDER_CONCURRENCY", {"ollama": 2})
+    store = CompletionUpgradeStore(max_pending=4)
+    store.create("r1", "a.py", "x", "ollama:fast")
+
+    assert not store.has_capacity("ollama")
+    assert store.has_capacity("groq")  # MAX_CONCURRENT_REQUESTS
@@ -0,0 +1,42 @@
+from src.config import settings
+from src.llm import context_sizing
+from src.llm.context_sizing import choose_num_ctx, completion_budget_kind, fit_local_output, size_request
+
+
+def test_budget_kind_from_cursor_position():
+    """Mid-line and end-of-statement cursors get a single-line budget"""
+    assert completion_budget_kind("x = foo(", ")\n") == "line"
+    assert completion_budget_kind("total = price *", "\n") == "line"
+    assert completion_budget_kind("def add(a, b):", "\n") == "block"
+    assert completion_budget_kind("def add(a, b):\n    ", "") == "block"
+
+
+def test_num_ctx_buckets_capped(monkeypatch):
+    """num_ctx snaps to a bucket and never exceeds MAX_LOCAL_CONTEXT"""
+    monkeypatch.setattr(settings, "MAX_LOCAL_CONTEXT", 8192)
+    
+    assert choose_num_ctx(300) == 2048
+    assert choose_num_ctx(2049) == 4096
+    assert choose_num_ctx(50000) == 8192
+
+
+def test_size_request_keeps_task_output_budget(monkeypatch):
+    """num_ctx fits prompt + output; the output budget is the task's full one"""
+    monkeypatch.setattr(settings, "MAX_LOCAL_CONTEXT", 4096)
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_MARGIN", 1.0)
+    monkeypatch.setattr(context_sizing, "count_tokens", lambda text: len(text))
+    
+    assert size_request("x" * 100, "line") == {"num_ctx": 2048, "max_tokens": 64, "prompt_tokens": 100}
+    
+    sized = size_request("x" * 5000, "explain")
+    assert sized["num_ctx"] == 4096
+    assert sized["max_tokens"] == settings.OUTPUT_TOKEN_BUDGETS["explain"]
+
+
+def test_local_output_shrinks_to_fit(monkeypatch):
+    """An oversized prompt keeps its context and gets a smaller output budget on Ollama"""
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_MARGIN", 1.0)
+    
+    assert fit_local_output(100, 64, 2048) == 64
+    assert fit_local_output(3000, 2048, 4096) == 1096
+    assert fit_local_output(5000, 512, 4096) == settings.MIN_OUTPUT_TOKENS
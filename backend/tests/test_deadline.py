@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from src.llm.generation import collect_stream
+from src.utils.deadline import current_deadline, deadline_scope
+from src.utils.error_handler import DeadlineExceededError
+
+
+class SlowStream:
+    """Runnable stand-in that emits one token every `interval` seconds"""
+    
+    def __init__(self, tokens: list[str], interval: float, first_delay: float = 0.0):
+        self.tokens = tokens
+        self.interval = interval
+        self.first_delay = first_delay
+    
+    async def astream(self, inputs):
+        await asyncio.sleep(self.first_delay)
+        for token in self.tokens:
+            yield token
+            await asyncio.sleep(self.interval)
+
+
+def test_nested_scope_only_shortens():
+    """An inner scope can't extend the outer deadline"""
+    with deadline_scope(1.0) as outer:
+        with deadline_scope(60) as inner:
+            assert inner is outer
+        with deadline_scope(0.5) as shorter:
+            assert shorter.remaining() <= 0.5
+    assert current_deadline() is None
+
+
+@pytest.mark.asyncio
+async def test_collect_stream_returns_partial_on_deadline():
+    """Deadline expiry returns the tokens produced so far, marked truncated"""
+    with deadline_scope(0.12):
+        output = await collect_stream(SlowStream(["a", "b", "c", "d", "e"], 0.05), {})
+    
+    assert output.truncated
+    assert 0 < len(output.text) < 5
+
+
+@pytest.mark.asyncio
+async def test_collect_stream_without_output_raises():
+    """Deadline expiry before the first token is an error"""
+    with deadline_scope(0.05):
+        with pytest.raises(DeadlineExceededError):
+            await collect_stream(SlowStream(["a"], 0.0, first_delay=1.0), {})
@@ -0,0 +1,90 @@
+import pytest
+
+from src.llm.early_stop import StructuralStop
+
+
+def _python_body(kind: str = "block", raw: bool = True) -> StructuralStop:
+    return StructuralStop("def add(a, b):\n    ", "\n\nprint(add(1, 2))\n", "python", kind, raw)
+
+
+def test_block_ends_at_dedent():
+    """A Python body ends before the next top-level statement"""
+    text = "total = a + b\n    return total\n\ndef sub(a, b):\n    return a - b\n"
+
+    assert _python_body().trim(text).rstrip() == "total = a + b\n    return total"
+
+
+def test_brackets_keep_statement_open():
+    """A multi-line call is one statement; the line ends when its brackets close"""
+    structure = StructuralStop("result = ", "\n", "python", "line", raw=True)
+
+    assert structure.trim("compute(1,\n    2)\nother = 3\n") == "compute(1,\n    2)"
+
+
+def test_block_opened_by_completion_ends_at_its_closing_brace():
+    """A function the completion opens ends with its own closing brace"""
+    structure = StructuralStop("function scale(a) {", "\n", "typescript", "block", raw=True)
+    text = "\n  if (a) {\n    return a * 2;\n  }\n  return 0;\n}\nconst unrelated = 1;\n"
+
+    assert structure.trim(text) == "\n  if (a) {\n    return a * 2;\n  }\n  return 0;\n}"
+
+
+def test_else_continues_python_header():
+    """else: at the header's indent belongs to the same block"""
+    structure = StructuralStop("def sign(x):", "\n", "python", "block", raw=True)
+    text = "\n    if x < 0:\n        return -1\n    else:\n        return 1\nvalue = 2\n"
+
+    assert structure.trim(text).endswith("return 1\n")
+
+
+def test_strings_and_comments_do_not_count_brackets():
+    """Brackets inside strings and comments leave the depth untouched"""
+    structure = StructuralStop("msg = ", "\n", "python", "line", raw=True)
+
+    assert structure.trim("'(' + x  # )\nmore = 1\n") == "'(' + x  # )"
+
+
+def test_line_does_not_end_inside_open_docstring():
+    """A docstring opened on the cursor line runs to its closing quotes"""
+    structure = StructuralStop('def add(a, b):\n    """', "\n", "python", "line", raw=True)
+    text = 'Add two numbers.\n\n    Returns the sum.\n    """\n    return a + b\n'
+
+    assert structure.trim(text) == 'Add two numbers.\n\n    Returns the sum.\n    """'
+
+
+def test_instruction_output_skips_fences():
+    """An instruction model's opening fence is not the end; the closing one is"""
+    structure = _python_body(raw=False)
+
+    assert structure.trim("```python\nreturn a + b\n```\nThis adds.") == "```python\nreturn a + b\n"
+
+
+def test_stop_sequences():
+    """Suffix repetition always stops; raw blocks also stop at two blank lines"""
+    assert _python_body().stop_sequences() == ["\nprint(add(1, 2))", "\n\n\n"]
+    assert _python_body(raw=False).stop_sequences() == ["\nprint(add(1, 2))", "\n```"]
+    assert StructuralStop("x = ", "", "python", "line", raw=True).stop_sequences() == []
+
+
+class _CountingStream:
+    """Streams fixed chunks and counts how many were pulled"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pulled = 0
+
+    async def astream(self, inputs):
+        for chunk in self.chunks:
+            self.pulled += 1
+            yield chunk
+
+
+@pytest.mark.asyncio
+async def test_stream_closes_once_block_is_complete():
+    """Generation stops at the first chunk past the block end"""
+    stream = _CountingStream(["return a", " + b\n", "\n", "def ", "sub(a, b):\n", "    pass\n"])
+
+    parts = [chunk async for chunk in _python_body().wrap(stream).astream({})]
+
+    assert stream.pulled == 5
+    assert _python_body().trim("".join(parts)).rstrip() == "return a + b"
@@ -0,0 +1,39 @@
+from src.config import settings
+from src.llm.fim_templates import get_fim_format
+
+
+def test_fim_format_lookup():
+    """Known Ollama code models get native FIM, cloud models do not"""
+    assert get_fim_format("ollama", "qwen2.5-coder:7b").name == "qwen"
+    assert get_fim_format("ollama", "deepseek-coder-v2:16b").name == "deepseek"
+    assert get_fim_format("ollama", "codestral:22b").name == "codestral"
+    assert get_fim_format("ollama", "llama3.1:8b") is None
+    assert get_fim_format("groq", "qwen2.5-coder:7b") is None
+
+
+def test_fim_render_keeps_braces():
+    """Prompts are built without str.format so code braces survive"""
+    fim = get_fim_format("ollama", "qwen2.5-coder:7b")
+    prompt = fim.render("const a = {", "};")
+    
+    assert prompt == "<|fim_prefix|>const a = {<|fim_suffix|>};<|fim_middle|>"
+    assert fim.request_fields("const a = {", "};") == {"raw": True}
+
+
+def test_fim_codestral_puts_suffix_first():
+    """Codestral expects [SUFFIX] before [PREFIX]"""
+    fim = get_fim_format("ollama", "codestral:22b")
+    assert fim.render("def f():\n    ", "\nf()") == "[SUFFIX]\nf()[PREFIX]def f():\n    "
+
+
+def test_fim_override(monkeypatch):
+    """Overrides pick a format per model or disable FIM"""
+    monkeypatch.setattr(settings, "FIM_FORMAT_OVERRIDES", {
+        "qwen2.5-coder:7b": "instruction",
+        "starcoder2:3b": "ollama_suffix"
+    })
+    
+    assert get_fim_format("ollama", "qwen2.5-coder:7b") is None
+    fim = get_fim_format("ollama", "starcoder2:3b")
+    assert fim.render("x = ", "\n") == "x = "
+    assert fim.request_fields("x = ", "\n") == {"suffix": "\n"}
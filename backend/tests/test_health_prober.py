@@ -0,0 +1,75 @@
+import pytest
+
+from src.config import PROVIDER_MODELS, settings
+from src.llm import health_prober as health_prober_module
+from src.llm.health_prober import HealthProber
+from src.llm.llm_manager import llm_manager
+from src.llm.metrics import ProviderMetrics
+from src.llm.ollama_client import ollama_client
+
+
+class _ProbeLLM:
+    def __init__(self, fail: bool):
+        self.fail = fail
+
+    async def ainvoke(self, prompt):
+        if self.fail:
+            raise RuntimeError("connection refused")
+        return "p"
+
+
+@pytest.fixture
+def groq_only(monkeypatch):
+    """Probe targets: groq's fast model only, with fresh metrics"""
+    monkeypatch.setattr(health_prober_module, "provider_metrics", ProviderMetrics())
+    monkeypatch.setattr(settings, "HEALTH_PROBE_TIERS", ["fast"])
+    monkeypatch.setattr(llm_manager, "list_available_providers", lambda: {
+        "ollama": False, "groq": True, "gemini": False, "openai": False, "mock": True
+    })
+
+
+@pytest.mark.asyncio
+async def test_failing_probes_mark_model_down(groq_only, monkeypatch):
+    """Consecutive failed probes take a model out of routing until it recovers"""
+    prober = HealthProber()
+    model = PROVIDER_MODELS["groq"]["fast"]
+    monkeypatch.setattr(llm_manager, "get_llm", lambda **kwargs: _ProbeLLM(fail=True))
+
+    await prober.probe("groq", model)
+    await prober.probe("groq", model)
+    assert prober.is_down("groq", model)
+
+    monkeypatch.setattr(llm_manager, "get_llm", lambda **kwargs: _ProbeLLM(fail=False))
+    await prober.probe("groq", model)
+    assert not prober.is_down("groq", model)
+    assert prober.latency_ms("groq", model) is not None
+
+
+@pytest.mark.asyncio
+async def test_probes_back_off_under_traffic(groq_only, monkeypatch):
+    """A model that just served a real request is not probed"""
+    prober = HealthProber()
+    probed = []
+    monkeypatch.setattr(llm_manager, "get_llm", lambda **kwargs: probed.append(kwargs["model"]) or _ProbeLLM(False))
+
+    health_prober_module.provider_metrics.record_success("groq", PROVIDER_MODELS["groq"]["fast"], 120)
+    await prober.probe_all()
+
+    assert probed == []
+    assert prober.backed_off == 1
+
+
+@pytest.mark.asyncio
+async def test_ollama_probe_keeps_the_traffic_num_ctx(monkeypatch):
+    """Probing with another num_ctx would make Ollama reload the model"""
+    prober = HealthProber()
+    model = PROVIDER_MODELS["ollama"]["fast"]
+    contexts = []
+    monkeypatch.setattr(llm_manager, "get_llm", lambda **kwargs: contexts.append(kwargs.get("num_ctx")) or _ProbeLLM(False))
+    monkeypatch.setattr(ollama_client, "_last_num_ctx", {})
+
+    await prober.probe("ollama", model)
+    ollama_client.mark_used(model, num_ctx=8192)
+    await prober.probe("ollama", model)
+
+    assert contexts == [min(settings.NUM_CTX_BUCKETS), 8192]
@@ -0,0 +1,123 @@
+import asyncio
+import pytest
+from src.llm.hedging import HedgeStats, hedged_stream
+from src.utils.error_handler import ModelNotFoundError
+
+
+class FakeStream:
+    """Runnable stand-in that streams tokens after an initial delay"""
+    
+    def __init__(self, tokens: list[str], delay: float):
+        self.tokens = tokens
+        self.delay = delay
+    
+    async def astream(self, inputs):
+        await asyncio.sleep(self.delay)
+        for token in self.tokens:
+            yield token
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    """Primary producing a token before the threshold wins alone"""
+    stats = HedgeStats()
+    result = await hedged_stream(
+        (FakeStream(["a", "b"], 0.0), "ollama", "fast"),
+        (lambda: FakeStream(["x"], 0.0), "groq", "fast"),
+        {},
+        threshold_ms=200,
+        stats=stats
+    )
+    
+    assert result.output == "ab"
+    assert result.hedged is False
+    assert stats.get_stats()["hedged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_stalled_primary_is_hedged_and_cancelled():
+    """Alternate wins when the primary stalls past the threshold"""
+    stats = HedgeStats()
+    result = await hedged_stream(
+        (FakeStream(["slow"], 5.0), "ollama", "fast"),
+        (lambda: FakeStream(["fast"], 0.0), "groq", "fast"),
+        {},
+        threshold_ms=50,
+        stats=stats
+    )
+    
+    assert result.output == "fast"
+    assert result.provider == "groq"
+    assert stats.get_stats()["hedge_rate"] == 1.0
+    assert stats.get_stats()["win_rate"] == 1.0
+
+
+@pytest.mark.asyncio
+async def test_unavailable_alternate_falls_back_to_primary():
+    """An alternate without credentials leaves the request unhedged"""
+    def missing_key():
+        raise ModelNotFoundError("GROQ_API_KEY not configured")
+    
+    stats = HedgeStats()
+    result = await hedged_stream(
+        (FakeStream(["slow"], 0.1), "ollama", "fast"),
+        (missing_key, "groq", "fast"),
+        {},
+        threshold_ms=20,
+        stats=stats
+    )
+    
+    assert result.output == "slow"
+    assert result.hedged is False
+    assert stats.get_stats()["hedged"] == 0
+
+
+class FailingStream:
+    """Runnable stand-in that fails after an initial delay"""
+    
+    def __init__(self, delay: float):
+        self.delay = delay
+    
+    async def astream(self, inputs):
+        await asyncio.sleep(self.delay)
+        raise RuntimeError("model crashed")
+        yield
+
+
+@pytest.mark.asyncio
+async def test_losing_primary_still_reports_ttft():
+    """A stalled primary that lost reports at least the time it waited"""
+    ttfts = []
+    result = await hedged_stream(
+        (FakeStream(["slow"], 5.0), "ollama", "fast"),
+        (lambda: FakeStream(["fast"], 0.0), "groq", "fast"),
+        {},
+        threshold_ms=50,
+        stats=HedgeStats(),
+        on_ttft=lambda provider, model, ttft_ms: ttfts.append((provider, ttft_ms))
+    )
+    
+    assert result.provider == "groq"
+    assert [provider for provider, _ in ttfts] == ["ollama"]
+    assert ttfts[0][1] >= 50
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("primary, alternate, culprit", [
+    (FailingStream(0.0), FakeStream(["ok"], 0.0), "ollama"),
+    (FakeStream(["ok"], 0.1), FailingStream(0.0), "groq"),
+])
+async def test_failures_attributed_to_their_attempt(primary, alternate, culprit):
+    """Only the attempt that raised is recorded as failed"""
+    failures = []
+    result = await hedged_stream(
+        (primary, "ollama", "fast"),
+        (lambda: alternate, "groq", "fast"),
+        {},
+        threshold_ms=20,
+        stats=HedgeStats(),
+        on_failure=lambda provider, model, error: failures.append(provider)
+    )
+    
+    assert result.output == "ok"
+    assert failures == [culprit]
@@ -0,0 +1,30 @@
+from src.llm.llm_pool import LLMPool, make_pool_key
+
+
+def test_pool_reuses_instances():
+    """Same configuration returns the same pooled instance"""
+    pool = LLMPool(max_size=4)
+    key = make_pool_key("ollama", "qwen2.5-coder:7b", 0.1, 512, stop=["\n\n"])
+    
+    first = pool.get_or_create(key, object)
+    second = pool.get_or_create(key, object)
+    
+    assert first is second
+    assert pool.get_stats()["hits"] == 1
+    assert pool.get_stats()["misses"] == 1
+
+
+def test_pool_evicts_least_recently_used():
+    """Pool stays bounded and evicts the oldest entry"""
+    pool = LLMPool(max_size=2)
+    keys = [make_pool_key("groq", f"model-{i}", 0.1, 512) for i in range(3)]
+    
+    a = pool.get_or_create(keys[0], object)
+    pool.get_or_create(keys[1], object)
+    pool.get_or_create(keys[0], object)  # Touch a so b is LRU
+    pool.get_or_create(keys[2], object)
+    
+    stats = pool.get_stats()
+    assert stats["size"] == 2
+    assert stats["evictions"] == 1
+    assert pool.get_or_create(keys[0], object) is a
@@ -0,0 +1,50 @@
+import time
+
+import pytest
+
+from src.llm.generation import collect_stream
+from src.llm.mock_llm import MockLLM
+from src.utils.error_handler import MockProviderError
+
+
+@pytest.mark.asyncio
+async def test_mock_streams_canned_completion():
+    """Completion prompts get a canned code answer, streamed token by token"""
+    llm = MockLLM(ttft_ms=0, tokens_per_sec=0, jitter=0)
+    
+    output = await collect_stream(llm, "CODE BEFORE CURSOR:\ndef add(a, b):\n<CURSOR>")
+    
+    assert output.text == "return a + b"
+    assert output.chunks == 4  # "return", " a", " +", " b"
+
+
+@pytest.mark.asyncio
+async def test_mock_timing():
+    """TTFT and tokens/sec follow the configuration"""
+    llm = MockLLM(ttft_ms=50, tokens_per_sec=100, jitter=0, response="a b c d e f")
+    
+    start_time = time.perf_counter()
+    output = await collect_stream(llm, "hi")
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    
+    assert output.ttft_ms >= 45
+    assert elapsed_ms >= 50 + 5 * 10 - 5  # TTFT + 5 inter-token gaps
+
+
+@pytest.mark.asyncio
+async def test_mock_error_injection_is_deterministic():
+    """Seeded failures repeat across runs"""
+    async def failures(seed: int) -> list[bool]:
+        llm = MockLLM(ttft_ms=0, tokens_per_sec=0, error_rate=0.5, seed=seed)
+        outcomes = []
+        for _ in range(10):
+            try:
+                await collect_stream(llm, "explain this")
+                outcomes.append(False)
+            except MockProviderError:
+                outcomes.append(True)
+        return outcomes
+    
+    first = await failures(7)
+    assert first == await failures(7)
+    assert any(first) and not all(first)
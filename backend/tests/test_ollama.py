@@ -1,6 +1,14 @@
+import asyncio
+import json
+import logging
+import time
+
+import httpx
 import pytest
+from src.config import settings
+from src.llm.generation import collect_stream
 from src.llm.ollama_client import OllamaClient
-from src.utils.error_handler import OllamaConnectionError
+from src.utils.error_handler import OllamaConnectionError, OllamaGenerationError
 
 @pytest.mark.asyncio
 async def test_ollama_connection():
@@ -35,3 +43,177 @@ async def test_model_not_found():
     
     with pytest.raises(Exception):
         client.get_llm(model="nonexistent-model:latest")
+
+
+def _mock_ollama(lines: list[bytes]) -> OllamaClient:
+    """OllamaClient whose shared HTTP client replays NDJSON lines"""
+    def handler(request):
+        return httpx.Response(200, content=b"\n".join(lines))
+    
+    client = OllamaClient()
+    client._http_client = httpx.AsyncClient(
+        base_url="http://ollama.test", transport=httpx.MockTransport(handler)
+    )
+    return client
+
+@pytest.mark.asyncio
+async def test_native_generate_stats():
+    """Native client yields tokens and fills stats from the final chunk"""
+    client = _mock_ollama([
+        b'{"response": "return ", "done": false}',
+        b'{"response": "a + b", "done": false}',
+        b'{"response": "", "done": true, "done_reason": "stop", "eval_count": 4, '
+        b'"eval_duration": 200000000, "prompt_eval_count": 12, "context": [1, 2, 3]}',
+    ])
+    
+    stream = client.native(model="qwen2.5-coder:1.5b")
+    output = await collect_stream(stream, "def add(a, b):\n    ")
+    
+    assert output.text == "return a + b"
+    assert stream.stats.output_tokens == 4
+    assert stream.stats.tokens_per_sec == 20.0
+    assert stream.stats.context == [1, 2, 3]
+    assert client.get_native_stats()["calls"] == 1
+
+@pytest.mark.asyncio
+async def test_native_generate_error():
+    """An error object in the stream raises OllamaGenerationError"""
+    client = _mock_ollama([b'{"error": "model requires more system memory"}'])
+    
+    with pytest.raises(OllamaGenerationError):
+        async for _ in client.stream_generate("x"):
+            pass
+
+
+def _mock_tags(handler) -> OllamaClient:
+    """OllamaClient whose shared HTTP client answers /api/tags with handler"""
+    client = OllamaClient()
+    client._http_client = httpx.AsyncClient(
+        base_url="http://ollama.test", transport=httpx.MockTransport(handler)
+    )
+    return client
+
+def _tags(*names: str):
+    return lambda request: httpx.Response(200, json={"models": [{"name": name} for name in names]})
+
+def _refused(request):
+    raise httpx.ConnectError("connection refused", request=request)
+
+@pytest.mark.asyncio
+async def test_inventory_snapshot_and_staleness():
+    """The snapshot reflects the last refresh and goes stale after two TTLs"""
+    client = _mock_tags(_tags("qwen2.5-coder:1.5b"))
+    assert client.get_inventory_snapshot()["stale"]
+    
+    assert await client.refresh_inventory()
+    snapshot = client.get_inventory_snapshot()
+    assert snapshot["models"] == ["qwen2.5-coder:1.5b"]
+    assert snapshot["reachable"] and not snapshot["stale"]
+    
+    client._inventory_refreshed_at -= 2 * settings.OLLAMA_INVENTORY_TTL_SECONDS + 1
+    assert client.get_inventory_snapshot()["stale"]
+    
+    client._http_client = _mock_tags(_refused)._http_client
+    assert not await client.refresh_inventory()
+    snapshot = client.get_inventory_snapshot()
+    assert not snapshot["reachable"]
+    assert snapshot["models"] == ["qwen2.5-coder:1.5b"]  # Last known list is kept
+
+@pytest.mark.asyncio
+async def test_inventory_refresh_logs_only_state_changes(caplog):
+    """Repeated refreshes in the same state stay quiet"""
+    client = _mock_tags(_tags("qwen2.5-coder:1.5b"))
+    caplog.set_level(logging.INFO, logger="src.llm.ollama_client")
+    
+    for _ in range(3):
+        await client.refresh_inventory()
+    client._http_client = _mock_tags(_refused)._http_client
+    for _ in range(3):
+        await client.refresh_inventory()
+    
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 2
+    assert "connected" in messages[0] and "unreachable" in messages[1]
+    assert not any(record.levelno >= logging.ERROR for record in caplog.records)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("handler", [_refused, _tags("some-other-model:7b")])
+async def test_readiness_503_until_default_model_served(handler, monkeypatch):
+    """/health/ready is 503 when Ollama is down or lacks the default model"""
+    from src.main import app
+    from src.llm.ollama_client import ollama_client
+    
+    monkeypatch.setattr(settings, "DEFAULT_PROVIDER", "ollama")
+    for attr in ("_available_models", "_inventory_refreshed_at", "_inventory_error"):
+        monkeypatch.setattr(ollama_client, attr, getattr(ollama_client, attr))  # Restored afterwards
+    monkeypatch.setattr(ollama_client, "_http_client", _mock_tags(handler)._http_client)
+    
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        response = await http.get("/health/ready")
+    
+    assert response.status_code == 503
+    assert response.json()["status"] == "not_ready"
+    
+    monkeypatch.setattr(ollama_client, "_http_client", _mock_tags(_tags(settings.OLLAMA_DEFAULT_MODEL))._http_client)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        assert (await http.get("/health/ready")).status_code == 200
+
+@pytest.mark.asyncio
+async def test_warm_model_records_load_time_and_failures():
+    """A successful warm-up records the load time; a failed one is kept for retry"""
+    client = _mock_tags(lambda request: httpx.Response(200, json={"load_duration": 250_000_000}))
+    result = await client.warm_model("qwen2.5-coder:1.5b")
+    assert result["ok"] and result["load_ms"] == 250
+    
+    client._http_client = _mock_tags(lambda request: httpx.Response(500, json={"error": "out of memory"}))._http_client
+    result = await client.warm_model("qwen2.5-coder:7b")
+    assert not result["ok"]
+    assert set(client.get_warmup_stats()["models"]) == {"qwen2.5-coder:1.5b", "qwen2.5-coder:7b"}
+
+@pytest.mark.asyncio
+async def test_keep_warm_waits_for_ollama(monkeypatch):
+    """Keep-warm started before `ollama serve` warms models once Ollama answers"""
+    monkeypatch.setattr(settings, "OLLAMA_INVENTORY_TTL_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "OLLAMA_REWARM_INTERVAL_SECONDS", 0)
+    up = False
+    warmed = []
+    
+    def handler(request):
+        if not up:
+            _refused(request)
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": name} for name in client.get_warmup_models()]})
+        warmed.append(json.loads(request.content)["model"])
+        return httpx.Response(200, json={"load_duration": 0})
+    
+    client = _mock_tags(handler)
+    await client.start_keep_warm()
+    await asyncio.sleep(0.05)
+    assert warmed == []
+    
+    up = True
+    await asyncio.wait_for(client._rewarm_task, timeout=1.0)
+    assert warmed == client.get_warmup_models()
+
+@pytest.mark.asyncio
+async def test_recent_traffic_skips_rewarm():
+    """mark_used counts as activity; idle and failed models are re-pinged"""
+    pinged = []
+    
+    def handler(request):
+        pinged.append(json.loads(request.content)["model"])
+        return httpx.Response(200, json={"load_duration": 0})
+    
+    client = _mock_tags(handler)
+    stale = time.time() - 120
+    client._warm_models = {
+        "used": {"ok": True, "warmed_at": stale},
+        "idle": {"ok": True, "warmed_at": stale},
+        "failed": {"ok": False, "warmed_at": time.time()},
+    }
+    client.mark_used("used", num_ctx=4096)
+    
+    await client._rewarm_idle(60)
+    
+    assert pinged == ["idle", "failed"]
+    assert client.last_num_ctx("used") == 4096
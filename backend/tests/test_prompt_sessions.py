@@ -0,0 +1,84 @@
+from src.llm import prompt_sessions as prompt_sessions_module
+from src.llm.ollama_client import NativeGenerationStats
+from src.llm.prompt_sessions import PromptSessionStore
+from src.llm.tier_selector import LatencyEstimate
+
+
+def _window(lines: list[str], cursor: int, size: int) -> str:
+    """Client-style prefix: `size` lines before the cursor line plus the cursor line"""
+    start = max(0, cursor - size)
+    return "".join(lines[start:cursor]) + "    "
+
+
+def test_anchor_keeps_prompt_start_stable():
+    """Lines that slid out of the client window are put back in front"""
+    store = PromptSessionStore(max_anchor_lines=4)
+    lines = [f"line_{i} = {i}\n" for i in range(20)]
+    
+    first = _window(lines, 10, 3)
+    store.record("a.py", "ollama", "qwen2.5-coder:7b", first)
+    
+    second = store.anchor_prefix("a.py", _window(lines, 11, 3))
+    assert second.startswith(first[:-4])
+    assert second.endswith(_window(lines, 11, 3))
+    store.record("a.py", "ollama", "qwen2.5-coder:7b", second)
+    
+    # Past max_anchor_lines the anchor resets to the client window
+    far = _window(lines, 18, 3)
+    assert store.anchor_prefix("a.py", far) == far
+
+
+def test_anchor_ignores_unrelated_prefix():
+    """A jump elsewhere in the file (or another file) is left untouched"""
+    store = PromptSessionStore()
+    store.record("a.py", "ollama", "qwen2.5-coder:7b", "def f():\n    return 1\n    ")
+    
+    assert store.anchor_prefix("a.py", "class C:\n    ") == "class C:\n    "
+    assert store.anchor_prefix("b.py", "x = 1\n") == "x = 1\n"
+
+
+def test_affinity_only_for_local_models():
+    """Documents stick to the Ollama model that served them"""
+    store = PromptSessionStore()
+    store.record("a.py", "ollama", "qwen2.5-coder:7b", "x")
+    store.record("b.py", "groq", "llama-3.1-8b-instant", "y")
+    
+    assert store.affinity("a.py") == ("ollama", "qwen2.5-coder:7b")
+    assert store.affinity("b.py") is None
+    assert store.affinity(None) is None
+
+
+def test_affinity_yields_to_latency_budget(monkeypatch):
+    """A pinned model must be expected to meet the budget, or tier selection decides"""
+    store = PromptSessionStore()
+    store.record("a.py", "ollama", "qwen2.5-coder:7b", "x")
+    estimates = {}
+    
+    class Estimates:
+        def estimate(self, provider, model):
+            return estimates.get(model)
+    
+    monkeypatch.setattr(prompt_sessions_module, "tier_selector", Estimates())
+    
+    assert store.affinity("a.py", budget_ms=800) is None  # Not measured yet
+    estimates["qwen2.5-coder:7b"] = LatencyEstimate("ollama", "qwen2.5-coder:7b", "balanced", 300, 1200, 1500, 0.0)
+    assert store.affinity("a.py", budget_ms=800) is None
+    assert store.affinity("a.py", budget_ms=2000) == ("ollama", "qwen2.5-coder:7b")
+    assert store.get_stats()["affinity_over_budget"] == 2
+
+
+def test_prompt_eval_savings():
+    """Savings are estimated from the session's cold prompt-eval rate"""
+    store = PromptSessionStore()
+    model = "qwen2.5-coder:7b"
+    prompt = "x" * 400
+    
+    store.record("a.py", "ollama", model, prompt)
+    store.record_native("a.py", prompt, NativeGenerationStats(model, prompt_tokens=100, prompt_eval_ms=200))
+    
+    # Second call: Ollama only evaluated the 10 tokens after the cached prefix
+    prompt += "y" * 40
+    store.record("a.py", "ollama", model, prompt)
+    store.record_native("a.py", prompt, NativeGenerationStats(model, prompt_tokens=10, prompt_eval_ms=20))
+    
+    assert store.get_stats()["last_saved_ms"] == 200.0
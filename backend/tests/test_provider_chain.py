@@ -0,0 +1,146 @@
+import pytest
+from src.config import settings
+from src.llm import provider_chain as provider_chain_module
+from src.llm import tier_selector as tier_selector_module
+from src.llm.circuit_breaker import CircuitBreakerRegistry
+from src.llm.health_prober import HealthProber
+from src.llm.llm_manager import llm_manager
+from src.llm.metrics import ProviderMetrics
+from src.llm.provider_chain import ProviderChain
+from src.llm.rate_limiter import RateLimiter
+from src.utils.error_handler import ProviderChainError
+
+
+@pytest.fixture
+def cloud_fallback(monkeypatch):
+    """Local-first chain with groq as the cloud fallback"""
+    monkeypatch.setattr(settings, "USE_LOCAL_ONLY", False)
+    monkeypatch.setattr(settings, "USE_LOCAL_FIRST", True)
+    monkeypatch.setattr(settings, "ENABLE_CLOUD_FALLBACK", True)
+    monkeypatch.setattr(llm_manager, "list_available_providers", lambda: {
+        "ollama": True, "groq": True, "gemini": False, "openai": False
+    })
+    monkeypatch.setattr(llm_manager, "get_llm", lambda provider, model, **kwargs: provider)
+    # Breakers, probes and error rates recorded by earlier tests would skip hops
+    for module in (provider_chain_module, tier_selector_module):
+        monkeypatch.setattr(module, "circuit_breakers", CircuitBreakerRegistry())
+        monkeypatch.setattr(module, "health_prober", HealthProber())
+        monkeypatch.setattr(module, "provider_metrics", ProviderMetrics())
+    monkeypatch.setattr(provider_chain_module, "rate_limiter", RateLimiter())
+
+
+def test_provider_order_local_only(monkeypatch):
+    """USE_LOCAL_ONLY keeps the chain on ollama"""
+    monkeypatch.setattr(settings, "USE_LOCAL_ONLY", True)
+    monkeypatch.setattr(settings, "ENABLE_CLOUD_FALLBACK", True)
+    
+    assert ProviderChain().get_provider_order() == ["ollama"]
+
+
+def test_provider_order_local_first(cloud_fallback):
+    """Local first, then configured cloud providers that have keys"""
+    assert ProviderChain().get_provider_order() == ["ollama", "groq"]
+
+
+def test_explicit_cloud_provider_keeps_local_fallback(cloud_fallback, monkeypatch):
+    """Without cloud fallback, a requested cloud provider still falls back to ollama"""
+    monkeypatch.setattr(settings, "ENABLE_CLOUD_FALLBACK", False)
+    
+    assert ProviderChain().get_provider_order("groq") == ["groq", "ollama"]
+    assert ProviderChain().get_provider_order() == ["ollama"]
+
+
+@pytest.mark.asyncio
+async def test_falls_through_to_next_hop(cloud_fallback):
+    """A failing hop moves the request to the next provider"""
+    async def invoke(llm):
+        if llm == "ollama":
+            raise RuntimeError("model overloaded")
+        return "ok"
+    
+    result = await ProviderChain().run(invoke, task="completion")
+    
+    assert result.output == "ok"
+    assert result.provider == "groq"
+    assert result.hop == 1
+    assert result.attempts[0]["provider"] == "ollama"
+
+
+@pytest.mark.asyncio
+async def test_all_hops_fail(cloud_fallback):
+    """Exhausting the chain raises ProviderChainError with every attempt"""
+    async def invoke(llm):
+        raise RuntimeError("down")
+    
+    with pytest.raises(ProviderChainError) as exc_info:
+        await ProviderChain().run(invoke, task="completion")
+    
+    assert len(exc_info.value.attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_only_ollama_hops_fit_output_to_num_ctx(cloud_fallback, monkeypatch):
+    """A cloud hop keeps the task's full output budget; Ollama shares num_ctx with the prompt"""
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_MARGIN", 1.0)
+    budgets = {}
+    
+    def get_llm(provider, model, **kwargs):
+        budgets[provider] = kwargs["max_tokens"]
+        return provider
+    
+    monkeypatch.setattr(llm_manager, "get_llm", get_llm)
+    
+    async def invoke(llm):
+        if llm == "ollama":
+            raise RuntimeError("model overloaded")
+        return "ok"
+    
+    await ProviderChain().run(invoke, task="explain", prompt_tokens=3800, num_ctx=4096, max_tokens=1024)
+    
+    assert budgets == {"ollama": 296, "groq": 1024}
+
+
+@pytest.mark.asyncio
+async def test_hops_sized_from_the_prompt_they_are_sent(cloud_fallback, monkeypatch):
+    """size_hop re-sizes each hop, e.g. a short FIM prompt on Ollama"""
+    contexts = {}
+    
+    def get_llm(provider, model, **kwargs):
+        contexts[provider] = kwargs["num_ctx"]
+        return provider
+    
+    monkeypatch.setattr(llm_manager, "get_llm", get_llm)
+    
+    async def invoke(llm):
+        if llm == "ollama":
+            raise RuntimeError("model overloaded")
+        return "ok"
+    
+    sizes = {
+        "ollama": {"num_ctx": 2048, "max_tokens": 64, "prompt_tokens": 300},
+        "groq": {"num_ctx": 8192, "max_tokens": 64, "prompt_tokens": 3000}
+    }
+    result = await ProviderChain().run(
+        invoke, prompt_tokens=3000, num_ctx=8192, max_tokens=64,
+        size_hop=lambda provider, model: sizes[provider]
+    )
+    
+    assert result.output == "ok"
+    assert contexts == {"ollama": 2048, "groq": 8192}
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_charges_prompt_and_output(cloud_fallback, monkeypatch):
+    """The tokens/min bucket is charged prompt tokens plus the output budget"""
+    charged = []
+    limiter = provider_chain_module.rate_limiter
+    monkeypatch.setattr(limiter, "slot", lambda provider, tokens=0, timeout_ms=None: (
+        charged.append((provider, tokens)) or RateLimiter().slot(provider, tokens, timeout_ms)
+    ))
+    
+    async def invoke(llm):
+        return "ok"
+    
+    await ProviderChain().run(invoke, task="explain", prompt_tokens=500, num_ctx=4096, max_tokens=1024)
+    
+    assert charged == [("ollama", 1524)]
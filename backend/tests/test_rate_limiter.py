@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from src.llm.rate_limiter import ProviderLimiter, TokenBucket
+from src.utils.error_handler import RateLimitExceededError
+
+
+def test_token_bucket_wait_time():
+    """Empty bucket reports how long until budget refills"""
+    bucket = TokenBucket(rate_per_min=60)  # 1 token/sec
+    bucket.consume(60)
+    
+    assert bucket.wait_time(1) == pytest.approx(1.0, abs=0.05)
+
+
+@pytest.mark.asyncio
+async def test_waits_for_free_slot():
+    """Second request queues briefly until the first releases its slot"""
+    limiter = ProviderLimiter("ollama", max_concurrent=1)
+    
+    async def hold():
+        async with limiter.slot(timeout_ms=1000):
+            await asyncio.sleep(0.05)
+    
+    await asyncio.gather(hold(), hold())
+    
+    stats = limiter.get_stats()
+    assert stats["acquired"] == 2
+    assert stats["rejected"] == 0
+    assert stats["p95_queue_ms"] >= 40
+
+
+@pytest.mark.asyncio
+async def test_fails_fast_after_queue_deadline():
+    """Requests that can't get a slot before the deadline are rejected"""
+    limiter = ProviderLimiter("ollama", max_concurrent=1)
+    
+    async with limiter.slot():
+        with pytest.raises(RateLimitExceededError):
+            async with limiter.slot(timeout_ms=20):
+                pass
+    
+    assert limiter.get_stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_request_bucket_rejects_past_deadline():
+    """Exhausted requests/min budget fails fast instead of sleeping a minute"""
+    limiter = ProviderLimiter("groq", max_concurrent=5, requests_per_min=1)
+    
+    async with limiter.slot():
+        pass
+    
+    with pytest.raises(RateLimitExceededError) as exc_info:
+        async with limiter.slot(timeout_ms=100):
+            pass
+    assert exc_info.value.retry_after > 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_while_waiting_for_budget_frees_slot():
+    """A request cancelled while sleeping on the token bucket gives its slot back"""
+    limiter = ProviderLimiter("groq", max_concurrent=1, tokens_per_min=600)
+    
+    async with limiter.slot(tokens=600):
+        pass
+    
+    async def waiter():
+        async with limiter.slot(tokens=600, timeout_ms=120000):
+            pass
+    
+    task = asyncio.create_task(waiter())
+    await asyncio.sleep(0.01)  # Holds the slot, sleeping until the bucket refills
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    
+    async with limiter.slot(timeout_ms=100):
+        pass
+    assert limiter.get_stats()["rejected"] == 0
@@ -0,0 +1,101 @@
+import pytest
+
+from src.config import settings
+from src.llm import shared_cache as shared_cache_module
+from src.llm.shared_cache import ENTRY_OVERHEAD_BYTES, ByteLRUCache, TwoTierCache, decode, encode
+from tests.fake_redis import FakeRedis
+
+
+def test_lru_eviction_is_bounded_by_bytes():
+    """The least recently used entry goes once the byte budget is exceeded"""
+    cache = ByteLRUCache(max_bytes=3 * (100 + 1 + ENTRY_OVERHEAD_BYTES), ttl_seconds=60)
+    for key in "abc":
+        cache.put(key, key.upper(), size=100)
+    cache.get("a")  # a is now more recent than b
+
+    cache.put("d", "D", size=100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.evictions == 1
+    assert cache.bytes <= cache.max_bytes
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    """An entry past its TTL is a miss and is dropped"""
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache_module.time, "monotonic", lambda: now[0])
+    cache = ByteLRUCache(max_bytes=10_000, ttl_seconds=5)
+    cache.put("k", "v", size=1)
+
+    now[0] += 4
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["entries"]) == (1, 1, 1, 0)
+
+
+def test_large_payloads_are_compressed():
+    """Small values stay plain orjson; large ones shrink with zstd and round-trip"""
+    small = {"completion": "return a + b"}
+    large = {"response": "def f():\n    return 1\n" * 500}
+
+    assert encode(small)[:1] == b"j"
+    assert encode(large)[:1] == b"z"
+    assert len(encode(large)) < settings.CACHE_COMPRESS_MIN_BYTES
+    assert decode(encode(small)) == small
+    assert decode(encode(large)) == large
+
+
+@pytest.mark.asyncio
+async def test_value_computed_on_one_replica_is_served_on_another():
+    """A write on replica A reaches Redis; replica B serves it, then from its own L1"""
+    redis = FakeRedis()
+    replica_a, replica_b = TwoTierCache(redis), TwoTierCache(redis)
+
+    replica_a.set("completion", "k", {"completion": "x + 1"})
+    await replica_a.flush()
+
+    assert await replica_b.get("completion", "k") == {"completion": "x + 1"}
+    assert await replica_b.get("completion", "k") == {"completion": "x + 1"}
+    assert redis.gets == 1
+    stats = replica_b.get_stats()["namespaces"]["completion"]
+    assert (stats["l1"]["hits"], stats["l2"]["hits"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_fall_back_to_l1():
+    """A failing Redis is a miss, not an error, and is skipped while backing off"""
+    redis = FakeRedis()
+    cache = TwoTierCache(redis)
+    cache.set("agent", "local", {"response": "ok"})
+    await cache.flush()
+    redis.fail = True
+
+    assert await cache.get("agent", "other") is None
+    assert await cache.get("agent", "local") == {"response": "ok"}
+    assert cache.get_stats()["redis"] == "backing off"
+
+    redis.fail = False
+    gets = redis.gets
+    assert await cache.get("agent", "other") is None
+    assert redis.gets == gets
+
+
+@pytest.mark.asyncio
+async def test_namespaces_use_their_own_ttl():
+    """Each namespace writes to Redis with its configured TTL"""
+    redis = FakeRedis()
+    cache = TwoTierCache(redis)
+
+    cache.set("routing", "k", "debug")
+    await cache.flush()
+
+    (name,) = redis.data
+    _, expires_at = redis.data[name]
+    assert ":routing:" in name
+    assert expires_at - shared_cache_module.time.monotonic() == pytest.approx(
+        settings.CACHE_TTL_SECONDS["routing"], abs=1
+    )
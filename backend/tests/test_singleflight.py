@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+from src.llm.generation import collect_stream
+from src.llm.rate_limiter import ProviderLimiter
+from src.llm.singleflight import Singleflight, flight_key
+
+
+class FakeStream:
+    """Runnable that streams tokens slowly and counts generations"""
+    
+    def __init__(self, tokens: list[str], delay: float = 0.01, error: Exception = None):
+        self.tokens = tokens
+        self.delay = delay
+        self.error = error
+        self.started = 0
+        self.cancelled = False
+    
+    async def astream(self, inputs):
+        self.started += 1
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                yield token
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error:
+            raise self.error
+
+
+@pytest.mark.asyncio
+async def test_identical_requests_share_generation():
+    """Concurrent callers with the same key get the same tokens from one generation"""
+    flights = Singleflight()
+    runnable = FakeStream(["def ", "add", "(a, b)"])
+    
+    async def late_joiner():
+        await asyncio.sleep(0.015)  # Joins after the first token
+        return await collect_stream(flights.wrap(runnable, "k"), None)
+    
+    first, second = await asyncio.gather(
+        collect_stream(flights.wrap(runnable, "k"), None),
+        late_joiner()
+    )
+    
+    assert first.text == second.text == "def add(a, b)"
+    assert runnable.started == 1
+    stats = flights.get_stats()
+    assert stats["coalesced"] == 1
+    assert stats["shared_chunks"] == 3
+    assert stats["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_generation_cancelled_when_all_callers_leave():
+    """The model slot is freed once nobody is waiting for the output"""
+    flights = Singleflight()
+    runnable = FakeStream(["x"] * 100)
+    
+    async def consume():
+        async for _ in flights.wrap(runnable, "k").astream(None):
+            pass
+    
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.03)
+    task.cancel()
+    await asyncio.sleep(0.01)
+    
+    assert runnable.cancelled
+    assert flights.get_stats()["cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_caller():
+    """A failed generation fails all coalesced callers"""
+    flights = Singleflight()
+    runnable = FakeStream(["a"], error=RuntimeError("model crashed"))
+    
+    results = await asyncio.gather(
+        collect_stream(flights.wrap(runnable, "k"), None),
+        collect_stream(flights.wrap(runnable, "k"), None),
+        return_exceptions=True
+    )
+    
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert runnable.started == 1
+
+
+def test_flight_key_includes_sampling_params():
+    """Different sampling settings never share a generation"""
+    class FakeLLM:
+        model = "qwen2.5-coder:7b"
+        temperature = 0.1
+    
+    cold = FakeLLM()
+    hot = FakeLLM()
+    hot.temperature = 0.9
+    
+    assert flight_key(cold, "prompt") == flight_key(FakeLLM(), "prompt")
+    assert flight_key(cold, "prompt") != flight_key(hot, "prompt")
+    assert flight_key(cold, "prompt") != flight_key(cold, "prompt", task="explain")
+
+
+@pytest.mark.asyncio
+async def test_caller_after_cancellation_starts_fresh_generation():
+    """A cancelled flight is never joined; its cancellation reaches nobody else"""
+    flights = Singleflight()
+    runnable = FakeStream(["a", "b", "c"])
+    
+    async def consume():
+        async for _ in flights.wrap(runnable, "k").astream(None):
+            pass
+    
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(0.015)
+    task.cancel()
+    await asyncio.sleep(0)  # Last caller left; the generation is still unwinding
+    output = await collect_stream(flights.wrap(runnable, "k"), None)
+    
+    assert output.text == "abc"
+    assert runnable.started == 2
+    assert flights.get_stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_followers_hold_no_rate_limit_slot():
+    """Only the generation that runs takes a slot; joiners don't queue behind it"""
+    flights = Singleflight()
+    runnable = FakeStream(["a", "b", "c"])
+    limiter = ProviderLimiter("ollama", max_concurrent=1, tokens_per_min=1000)
+    acquire = lambda: limiter.slot(tokens=100, timeout_ms=10)
+    
+    async def late_joiner():
+        await asyncio.sleep(0.015)
+        return await collect_stream(flights.wrap(runnable, "k", acquire=acquire), None)
+    
+    first, second = await asyncio.gather(
+        collect_stream(flights.wrap(runnable, "k", acquire=acquire), None),
+        late_joiner()
+    )
+    
+    assert first.text == second.text == "abc"
+    assert limiter.acquired == 1
+    assert limiter.rejected == 0
+    assert limiter.in_flight == 0
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+
+from src.tools.ast_parser_tool import ASTParserTool
+from src.utils.startup import StartupReport
+
+
+def test_startup_report_phases():
+    """Each marked phase records elapsed time, in order"""
+    report = StartupReport()
+    report.mark("imports")
+    report.mark("startup")
+
+    phases = report.to_dict()["phases"]
+    assert list(phases) == ["imports", "startup"]
+    assert phases["imports"]["elapsed_ms"] <= phases["startup"]["elapsed_ms"]
+
+
+def test_ast_parser_builds_parsers_on_demand():
+    """No grammar is loaded until a language is parsed"""
+    tool = ASTParserTool()
+
+    assert tool.parsers == {}
+    assert tool.get_parser("cobol") is None
+
+
+def test_completion_agent_import_is_light():
+    """Importing the completion agent does not load the other agents, LangGraph or tree-sitter"""
+    probe = (
+        "import sys; import src.agents.code_completion_agent; "
+        "print(','.join(m for m in ('src.agents.debug_agent', 'langgraph', 'tree_sitter') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == ""
@@ -0,0 +1,60 @@
+import pytest
+
+from src.config import PROVIDER_MODELS
+from src.llm import provider_chain as provider_chain_module
+from src.llm import tier_selector as tier_selector_module
+from src.llm.circuit_breaker import CircuitBreakerRegistry
+from src.llm.metrics import ProviderMetrics
+from src.llm.tier_selector import TierSelector
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    """Fresh metrics, breakers and probe health so state does not leak between tests"""
+    fresh = ProviderMetrics()
+    monkeypatch.setattr(tier_selector_module, "provider_metrics", fresh)
+    for module in (tier_selector_module, provider_chain_module):
+        monkeypatch.setattr(module, "circuit_breakers", CircuitBreakerRegistry())
+        if hasattr(module, "health_prober"):  # Background probing is optional here
+            monkeypatch.setattr(module, "health_prober", type(module.health_prober)())
+    return fresh
+
+
+def _observe(metrics, tier: str, ttft_ms: float, tokens_per_sec: float, samples: int = 10):
+    """Record samples of 50 output tokens for an Ollama tier model"""
+    model = PROVIDER_MODELS["ollama"][tier]
+    latency_ms = ttft_ms + 49 / tokens_per_sec * 1000
+    for _ in range(samples):
+        metrics.record_success("ollama", model, latency_ms, ttft_ms=ttft_ms, output_tokens=50)
+
+
+def test_picks_best_model_within_budget(metrics):
+    """The highest tier whose estimate fits the budget wins"""
+    _observe(metrics, "quality", ttft_ms=900, tokens_per_sec=8)
+    _observe(metrics, "balanced", ttft_ms=300, tokens_per_sec=40)
+    _observe(metrics, "fast", ttft_ms=100, tokens_per_sec=120)
+    selector = TierSelector()
+    
+    assert selector.select_model("ollama", 800) == PROVIDER_MODELS["ollama"]["fast"]
+    assert selector.select_model("ollama", 2000) == PROVIDER_MODELS["ollama"]["balanced"]
+    assert selector.select_model("ollama", 20000) == PROVIDER_MODELS["ollama"]["quality"]
+
+
+def test_unmeasured_models_use_default_tier(metrics):
+    """Without samples nothing is guessed; the caller's tier is used"""
+    selector = TierSelector()
+    
+    assert selector.select_model("ollama", 800, default_tier="balanced") == PROVIDER_MODELS["ollama"]["balanced"]
+    assert selector.get_stats()["fallbacks"] == 1
+
+
+def test_prompt_size_raises_estimate(metrics):
+    """TTFT scales with prompt tokens once prefill rates are known"""
+    model = PROVIDER_MODELS["ollama"]["fast"]
+    for _ in range(10):
+        metrics.record_success("ollama", model, 600, ttft_ms=100, output_tokens=50, prompt_tokens=500)
+    selector = TierSelector()
+    
+    small = selector.estimate("ollama", model, prompt_tokens=500)
+    large = selector.estimate("ollama", model, prompt_tokens=5000)
+    assert large.ttft_ms == pytest.approx(10 * small.ttft_ms)
@@ -0,0 +1,56 @@
+from src.llm.typeahead import TypeaheadIndex
+
+
+PREFIX = "import math\n\ndef area(r):\n    return "
+SUFFIX = "\n\nprint(area(2))\n"
+
+
+def _index() -> TypeaheadIndex:
+    index = TypeaheadIndex()
+    index.record("a.py", PREFIX, SUFFIX, "math.pi * r ** 2", None, None, "ollama:qwen", 0.9)
+    return index
+
+
+def test_typing_through_suggestion_returns_the_rest():
+    """Each keystroke matching the suggestion is answered without a model call"""
+    index = _index()
+
+    assert index.lookup("a.py", PREFIX + "m", SUFFIX, None, None).completion == "ath.pi * r ** 2"
+    hit = index.lookup("a.py", PREFIX + "math.pi ", SUFFIX, None, None)
+
+    assert hit.completion == "* r ** 2"
+    assert hit.typed_chars == 8
+    assert index.get_stats()["llm_calls_avoided"] == 2
+
+
+def test_diverging_text_is_a_miss():
+    """Typing something else, or at another spot, needs a new completion"""
+    index = _index()
+
+    assert index.lookup("a.py", PREFIX + "3.14", SUFFIX, None, None) is None
+    assert index.lookup("a.py", PREFIX + "math.pi * r ** 2", SUFFIX, None, None) is None
+    assert index.lookup("a.py", PREFIX + "m", "\n", None, None) is None
+    assert index.lookup("b.py", PREFIX + "m", SUFFIX, None, None) is None
+    assert index.lookup("a.py", PREFIX + "m", SUFFIX, "groq", None) is None
+    assert index.get_stats()["hit_rate"] == 0.0
+
+
+def test_sliding_prefix_window_still_matches():
+    """The editor dropping leading lines from the window does not break reuse"""
+    header = "".join(f"CONST_{i} = {i}\n" for i in range(20))
+    index = TypeaheadIndex()
+    index.record("a.py", header + PREFIX, SUFFIX, "(\n        math.pi * r ** 2\n    )", None, None, "ollama:qwen", 0.9)
+
+    windowed = header.split("\n", 1)[1] + PREFIX + "(\n        "
+
+    assert index.lookup("a.py", windowed, SUFFIX, None, None).completion == "math.pi * r ** 2\n    )"
+
+
+def test_upgrade_replaces_recorded_completion():
+    """After a progressive upgrade, typing through the upgraded text is reused"""
+    index = _index()
+    index.replace("a.py", PREFIX, SUFFIX, "r * r * math.pi", "ollama:codestral", 0.95)
+
+    hit = index.lookup("a.py", PREFIX + "r * ", SUFFIX, None, None)
+
+    assert (hit.completion, hit.model_used) == ("r * math.pi", "ollama:codestral")
@@ -72,7 +72,7 @@ export class BackendClient {
         }
     }
 
-    async complete(request: CompletionRequest): Promise<CompletionResponse | null> {
+    async complete(request: CompletionRequest, signal?: AbortSignal): Promise<CompletionResponse | null> {
         const provider = this.getConfig<string>('providers.defaultProvider');
         
         // Get provider-specific model or fall back to general completions.model
@@ -85,10 +85,15 @@ export class BackendClient {
                 {
                     ...request,
                     model
-                }
+                },
+                { signal }
             );
             return response.data;
         } catch (error) {
+            // Aborted by us, or superseded by a newer request for the same document
+            if (axios.isCancel(error) || (axios.isAxiosError(error) && error.response?.status === 409)) {
+                return null;
+            }
             this.handleError(error);
             return null;
         }
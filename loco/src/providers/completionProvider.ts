@@ -35,8 +35,9 @@ export class InlineCompletionProvider implements vscode.InlineCompletionItemProv
             return null;
         }
 
-        // Don't trigger too frequently
-        if (now - this.lastRequestTime < 2000) {  // At least 2 seconds between requests
+        // Don't trigger too frequently; the backend cancels a document's
+        // older request when a newer one arrives, so this can be short
+        if (now - this.lastRequestTime < 300) {
             return null;
         }
 
@@ -63,13 +64,21 @@ export class InlineCompletionProvider implements vscode.InlineCompletionItemProv
             language: document.languageId,
             filepath: document.fileName,
             cursor_line: position.line,
-            cursor_column: position.character
+            cursor_column: position.character,
+            document_key: `${vscode.env.sessionId}:${document.uri.toString()}`
         };
 
+        // Abort the previous request (closing the connection stops its
+        // generation) and this one when VS Code cancels it
+        this.abortController?.abort();
+        const abortController = new AbortController();
+        this.abortController = abortController;
+        const cancellation = token.onCancellationRequested(() => abortController.abort());
+
         // Call backend
         try {
             this.lastRequestTime = now;
-            const response = await this.backend.complete(request);
+            const response = await this.backend.complete(request, abortController.signal);
 
             if (!response || token.isCancellationRequested) {
                 return null;
@@ -97,6 +106,11 @@ export class InlineCompletionProvider implements vscode.InlineCompletionItemProv
             }
             console.error('Completion error:', error);
             return null;
+        } finally {
+            cancellation.dispose();
+            if (this.abortController === abortController) {
+                this.abortController = undefined;
+            }
         }
     }
 
@@ -10,6 +10,7 @@ export interface CompletionRequest {
     filepath: string;
     cursor_line: number;
     cursor_column: number;
+    document_key?: string;  // A newer request with the same key cancels this one on the backend
 }
 
 export interface CompletionResponse {